@@ -4,25 +4,183 @@
 __all__ = [
     'MqttServiceClient',
     'ModeledClass',
+    'SubscriptionStats',
+    'aio',
+    'codec',
+    'connection_pool',
     'iotjobs',
+    'job_documents',
+    'job_runner',
     'iotshadow',
+    'provisioning',
+    'shadow_cache',
+    'shadow_requests',
+    'shadow_updates',
     'greengrass_discovery',
+    'greengrass_publisher',
     'mqtt_connection_builder',
     'mqtt5_client_builder',
+    'mqtt5_router',
+    'mqtt5_topic_alias',
+    'tls_context_cache',
 ]
 
-from awscrt import mqtt, mqtt5
+from awsiot.codec import DEFAULT_CODEC, PayloadCodec
+import collections
+import concurrent.futures
 from concurrent.futures import Future
-import json
-from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+import importlib
+import sys
+import threading
+import traceback
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, TypeVar, Union
+
+if TYPE_CHECKING:
+    from awscrt import mqtt, mqtt5
+    from awsiot.mqtt5_router import PublishRouter
+    from awsiot.mqtt5_topic_alias import TopicAliasManager
 
 __version__ = '1.0.0-dev'
 
+# imported when first used, see __getattr__()
+_SUBMODULES = frozenset(name for name in __all__ if name.islower()) | {
+    'eventstreamrpc', 'greengrasscoreipc', 'iotidentity'}
+
+
+def __getattr__(name: str):
+    # "import awsiot" only loads what every service client needs, so programs
+    # pay for the submodules they use: awsiot.iotshadow works without "import awsiot.iotshadow"
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    # awscrt.mqtt and awscrt.mqtt5 are imported by the first service client rather than
+    # by every program importing awsiot, Greengrass components included
+    if name in ('mqtt', 'mqtt5'):
+        return importlib.import_module('awscrt.' + name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def _sdk_version() -> str:
+    """Version of the awsiotsdk distribution, sent with CONNECT by the builders"""
+    try:
+        # Python 3.8+, pkg_resources takes a second or more to import on small devices
+        from importlib import metadata
+    except ImportError:
+        import pkg_resources
+        try:
+            return pkg_resources.get_distribution("awsiotsdk").version
+        except pkg_resources.DistributionNotFound:
+            return "dev"
+    try:
+        return metadata.version("awsiotsdk")
+    except metadata.PackageNotFoundError:
+        return "dev"
+
+
 T = TypeVar('T')
 
 PayloadObj = Dict[str, Any]
 PayloadToClassFn = Callable[[PayloadObj], T]
 
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+
+class SubscriptionStats:
+    """
+    Callback queue metrics of one subscription, see
+    :attr:`MqttServiceClient.subscription_stats`.
+
+    Attributes:
+        received (int): Messages received.
+        delivered (int): Messages whose callback has run.
+        dropped (int): Messages discarded because the queue was full.
+        pending (int): Messages waiting for their callback.
+        max_pending (int): Highest number of messages that were waiting at once.
+    """
+
+    __slots__ = ['received', 'delivered', 'dropped', 'pending', 'max_pending']
+
+    def __init__(self):
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.pending = 0
+        self.max_pending = 0
+
+    def __repr__(self):
+        return 'SubscriptionStats({})'.format(
+            ', '.join('{}={}'.format(slot, getattr(self, slot)) for slot in self.__slots__))
+
+
+class _CallbackQueue:
+    """
+    Bounded queue running the callbacks of one subscription in an executor,
+    one at a time and in the order the messages arrived.
+    """
+
+    # messages handled per executor task, so busy subscriptions take turns
+    _BATCH = 64
+
+    def __init__(self, client: 'MqttServiceClient', on_message: Callable, maxlen: int, drop_policy: str):
+        self._client = client
+        self._on_message = on_message
+        self._maxlen = maxlen
+        self._drop_policy = drop_policy
+        self._items = collections.deque()  # type: collections.deque
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self.stats = SubscriptionStats()
+
+    def __call__(self, **kwargs):
+        stats = self.stats
+        items = self._items
+        with self._lock:
+            stats.received += 1
+            if len(items) >= self._maxlen:
+                stats.dropped += 1
+                if self._drop_policy == DROP_NEWEST:
+                    return
+                items.popleft()
+            items.append(kwargs)
+            stats.pending = len(items)
+            if stats.pending > stats.max_pending:
+                stats.max_pending = stats.pending
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule()
+
+    def _schedule(self):
+        # runs in the networking thread or an executor thread, where raising would go unnoticed
+        try:
+            self._client._executor.submit(self._drain)
+        except Exception:
+            # executor shut down, nothing will run the queued callbacks
+            with self._lock:
+                self.stats.dropped += len(self._items)
+                self.stats.pending = 0
+                self._items.clear()
+                self._scheduled = False
+            if not self._client._ignore_executor_exceptions:
+                traceback.print_exc(file=sys.stderr)
+
+    def _drain(self):
+        stats = self.stats
+        items = self._items
+        for _ in range(self._BATCH):
+            with self._lock:
+                if not items:
+                    self._scheduled = False
+                    return
+                kwargs = items.popleft()
+                stats.pending = len(items)
+            try:
+                self._on_message(**kwargs)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            stats.delivered += 1
+        self._schedule()
+
 
 class MqttServiceClient:
     """
@@ -30,24 +188,145 @@ class MqttServiceClient:
 
     Args:
         mqtt_connection: MQTT connection to use
+        codec: (Optional) :class:`awsiot.codec.PayloadCodec` used to encode
+            and decode message payloads. Defaults to JSON.
+        executor: (Optional) Executor used to decode messages and run
+            subscription callbacks, so a slow callback can't block the
+            networking thread. Pass True to have a ThreadPoolExecutor created,
+            which :meth:`shutdown` shuts down. By default callbacks run in the
+            networking thread.
+        max_pending: Maximum number of messages of one subscription waiting
+            for the executor. Only used with an executor.
+        drop_policy: What to do with a message arriving when its subscription
+            already has `max_pending` messages waiting: ``"drop_oldest"``
+            (default) discards the oldest waiting message, ``"drop_newest"``
+            discards the arriving one. Drops are counted in
+            :attr:`subscription_stats`.
+
+    With an executor, the callbacks of one subscription still run one at a
+    time, in the order the messages arrived. Different subscriptions run
+    concurrently.
+
+    Given an MQTT 5 client with a :class:`~awsiot.mqtt5_router.PublishRouter`,
+    the service client sends its own packets, and shares subscriptions with
+    the other service clients of that MQTT 5 client. Responses are still
+    matched to requests by the ``clientToken`` of their payload, as the AWS
+    IoT services do, not by MQTT 5 correlation data or response topic.
     """
 
-    def __init__(self, mqtt_connection: mqtt.Connection or mqtt5.Client):
+    # Segments preceding the payload format in topics that let the client pick one (Fleet Provisioning)
+    _FORMAT_TOPIC_SEGMENTS = ('create', 'create-from-csr', 'provision')
+
+    def __init__(self,
+                 mqtt_connection: 'Union[mqtt.Connection, mqtt5.Client]',
+                 codec: Optional[PayloadCodec] = None,
+                 executor: Union[concurrent.futures.Executor, bool, None] = None,
+                 max_pending: int = 1024,
+                 drop_policy: str = DROP_OLDEST):
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError("drop_policy must be 'drop_oldest' or 'drop_newest'")
+        self._codec = codec if codec is not None else DEFAULT_CODEC
+        if executor is True:
+            executor = concurrent.futures.ThreadPoolExecutor()
+        elif executor is False:
+            executor = None
+        self._executor = executor  # type: Optional[concurrent.futures.Executor]
+        self._ignore_executor_exceptions = False
+        self._max_pending = max_pending
+        self._drop_policy = drop_policy
+        self._callback_queues = {}  # type: Dict[str, _CallbackQueue]
+        from awscrt import mqtt, mqtt5
+        self._mqtt5_client = None  # type: Optional[mqtt5.Client]
+        # routes the messages of an MQTT 5 client driven natively
+        self._mqtt5_router = None  # type: Optional[PublishRouter]
+        self._topic_aliases = None  # type: Optional[TopicAliasManager]
         if isinstance(mqtt_connection, mqtt.Connection):
-            self._mqtt_connection = mqtt_connection  # type: mqtt.Connection
+            self._mqtt_connection = mqtt_connection  # type: Optional[mqtt.Connection]
         elif isinstance(mqtt_connection, mqtt5.Client):
-            self._mqtt_connection = mqtt_connection.new_connection()
+            from awsiot.mqtt5_router import PublishRouter
+            from awsiot.mqtt5_topic_alias import TopicAliasManager
             self._mqtt5_client = mqtt_connection
+            self._mqtt5_router = PublishRouter.of(mqtt_connection)
+            self._topic_aliases = TopicAliasManager.of(mqtt_connection)
+            if self._mqtt5_router is None:
+                self._mqtt_connection = mqtt_connection.new_connection()
+            else:
+                self._mqtt_connection = None
         else:
             raise TypeError("The service client could only take mqtt.Connection and mqtt5.Client as argument")
 
     @property
-    def mqtt_connection(self) -> mqtt.Connection:
+    def mqtt_connection(self) -> 'mqtt.Connection':
         """
-        MQTT connection used by this client
+        MQTT connection used by this client. For an MQTT 5 client driven
+        natively (see :mod:`awsiot.mqtt5_router`), the service client itself
+        doesn't use one: an MQTT 3 adapter of the client is created on first
+        access, only for callers of this property.
         """
+        if self._mqtt_connection is None:
+            self._mqtt_connection = self._mqtt5_client.new_connection()
         return self._mqtt_connection
 
+    @property
+    def mqtt5_client(self) -> 'Optional[mqtt5.Client]':
+        """
+        MQTT 5 client used by this client, None if it was given an MQTT 3 connection.
+        Requests sent over it carry no correlation data or response topic,
+        responses being matched by ``clientToken``.
+        """
+        return self._mqtt5_client
+
+    @property
+    def codec(self) -> PayloadCodec:
+        """
+        Codec used to encode and decode message payloads
+        """
+        return self._codec
+
+    @property
+    def executor(self) -> Optional[concurrent.futures.Executor]:
+        """
+        Executor running subscription callbacks, None if they run in the networking thread
+        """
+        return self._executor
+
+    @property
+    def subscription_stats(self) -> Dict[str, SubscriptionStats]:
+        """
+        :class:`SubscriptionStats` of every subscribed topic, by topic.
+        Only available when the client has an executor.
+        """
+        return {topic: queue.stats for topic, queue in self._callback_queues.items()}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shut down the executor (if any). Messages received afterwards are dropped.
+
+        Args:
+            wait: If true (default), block until the callbacks already
+                queued have run.
+        """
+        self._ignore_executor_exceptions = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _topic_for_codec(self, topic: str) -> str:
+        """
+        Switch topics that carry the payload format (e.g. `$aws/certificates/create/json`)
+        to the format of the codec.
+        """
+        topic_format = self._codec.topic_format
+        if topic_format is None or topic_format == 'json' or not topic.startswith('$aws/'):
+            return topic
+        parts = topic.split('/')
+        for i in range(1, len(parts)):
+            if parts[i] == 'json' and parts[i - 1] in self._FORMAT_TOPIC_SEGMENTS:
+                parts[i] = topic_format
+                return '/'.join(parts)
+        return topic
+
     def unsubscribe(self, topic: str) -> Future:
         """
         Tell the MQTT server to stop sending messages to this topic.
@@ -67,8 +346,18 @@ class MqttServiceClient:
                 else:
                     future.set_result(None)
 
-            unsub_future, _ = self.mqtt_connection.unsubscribe(topic)
+            if self._mqtt5_router is not None:
+                if self._mqtt5_router.remove(topic, self):
+                    from awscrt import mqtt5
+                    unsub_future = self._mqtt5_client.unsubscribe(mqtt5.UnsubscribePacket(topic_filters=[topic]))
+                else:
+                    # other service clients of the MQTT 5 client still need the subscription
+                    unsub_future = Future()
+                    unsub_future.set_result(None)
+            else:
+                unsub_future, _ = self.mqtt_connection.unsubscribe(topic)
             unsub_future.add_done_callback(on_unsuback)
+            self._callback_queues.pop(topic, None)
 
         except Exception as e:
             future.set_exception(e)
@@ -82,8 +371,8 @@ class MqttServiceClient:
         Parameters:
         topic - The topic to publish this message to.
         qos   - The Quality of Service guarantee of this message
-        payload - (Optional) If set, the message will be a string of JSON, built from this object.
-                If unset, an empty message is sent.
+        payload - (Optional) If set, the message will be built from this object
+                by the client's codec (JSON by default). If unset, an empty message is sent.
 
         Returns a `Future` which will contain a result of `None` when the
         server has acknowledged the message, or an exception if the
@@ -98,13 +387,16 @@ class MqttServiceClient:
                     future.set_result(None)
 
             if payload is None:
-                payload_str = ""
+                payload_bytes = b""
             else:
-                payload_str = json.dumps(payload)
+                payload_bytes = self._codec.encode(payload)
+
+            if self._mqtt5_router is not None:
+                return self._publish_mqtt5(self._topic_for_codec(topic), qos, payload_bytes, future)
 
             pub_future, _ = self.mqtt_connection.publish(
-                topic=topic,
-                payload=payload_str,
+                topic=self._topic_for_codec(topic),
+                payload=payload_bytes,
                 qos=qos,
             )
             pub_future.add_done_callback(on_puback)
@@ -121,9 +413,9 @@ class MqttServiceClient:
                              payload_to_class_fn: PayloadToClassFn) -> Tuple[Future, str]:
         """
         Performs a 'Subscribe' style operation for an MQTT service.
-        Messages received from this topic are processed as JSON,
-        converted to the desired class by `payload_to_class_fn`,
-        then passed to `callback`.
+        Messages received from this topic are decoded by the client's codec
+        (JSON by default) straight from the received buffer, converted to the desired class by
+        `payload_to_class_fn`, then passed to `callback`.
 
         Parameters:
         topic - The topic to subscribe to.
@@ -134,8 +426,8 @@ class MqttServiceClient:
                 is not expected to return a value.
         payload_to_class_fn - A function which takes one argument,
                 a dict, and returns a class of the type expected by
-                `callback`. The dict comes from parsing the received
-                message as JSON.
+                `callback`. The dict comes from decoding the received
+                message with the client's codec.
 
         Returns two values. The first is a `Future` whose result will be the
         `awscrt.mqtt.QoS` granted by the server, or an exception if the
@@ -144,7 +436,52 @@ class MqttServiceClient:
         Note that messages may arrive before the subscription is acknowledged.
         """
 
+        decode = self._codec.decode
+
+        def callback_wrapper(topic, payload, dup, qos, retain, **kwargs):
+            try:
+                payload_obj = decode(payload)
+                event = payload_to_class_fn(payload_obj)
+            except BaseException:
+                # can't deliver payload, invoke callback with None
+                event = None
+            callback(event)
+
+        return self._subscribe(self._topic_for_codec(topic), qos, callback_wrapper)
+
+    def subscribe_raw(self,
+                      topic: str,
+                      qos: int,
+                      callback: Callable[[str, bytes], None]) -> Tuple[Future, str]:
+        """
+        Subscribe to a topic and receive its messages without decoding them.
+
+        Meant for high-rate topics whose messages are only forwarded,
+        the payload is passed on exactly as received from awscrt.
+
+        Args:
+            topic: Topic to subscribe to. Unlike the typed `subscribe_to_*`
+                operations it is used as is, whatever the client's codec.
+            qos: The Quality of Service guarantee of this subscription
+            callback: Callback invoked with the topic and payload of each
+                received message. The callback is not expected to return
+                a value.
+
+        Returns:
+            Tuple with a `Future` whose result will be the `awscrt.mqtt.QoS`
+            granted by the server, and the topic which may be passed to
+            `unsubscribe()` to stop receiving messages.
+        """
+        def callback_wrapper(topic, payload, dup, qos, retain, **kwargs):
+            callback(topic, payload)
+
+        return self._subscribe(topic, qos, callback_wrapper)
+
+    def _subscribe(self, topic: str, qos: int, on_message: Callable) -> Tuple[Future, str]:
         future = Future()  # type: Future
+        if self._executor is not None:
+            on_message = _CallbackQueue(self, on_message, self._max_pending, self._drop_policy)
+            self._callback_queues[topic] = on_message
         try:
             def on_suback(suback_future):
                 try:
@@ -153,19 +490,13 @@ class MqttServiceClient:
                 except Exception as e:
                     future.set_exception(e)
 
-            def callback_wrapper(topic, payload, dup, qos, retain, **kwargs):
-                try:
-                    payload_obj = json.loads(payload.decode())
-                    event = payload_to_class_fn(payload_obj)
-                except BaseException:
-                    # can't deliver payload, invoke callback with None
-                    event = None
-                callback(event)
+            if self._mqtt5_router is not None:
+                return self._subscribe_mqtt5(topic, qos, on_message, future), topic
 
             sub_future, _ = self.mqtt_connection.subscribe(
                 topic=topic,
                 qos=qos,
-                callback=callback_wrapper,
+                callback=on_message,
             )
             sub_future.add_done_callback(on_suback)
 
@@ -174,6 +505,47 @@ class MqttServiceClient:
 
         return future, topic
 
+    def _publish_mqtt5(self, topic: str, qos: int, payload: bytes, future: Future) -> Future:
+        from awscrt import mqtt5
+
+        def on_puback(puback_future):
+            try:
+                puback = puback_future.result().puback
+                if puback is not None and puback.reason_code is not None and puback.reason_code >= 0x80:
+                    raise RuntimeError("Publish to {} failed: {}".format(topic, puback.reason_code.name))
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+
+        packet = mqtt5.PublishPacket(topic=topic, payload=payload, qos=mqtt5.QoS(qos))
+        if self._topic_aliases is not None:
+            packet.topic_alias = self._topic_aliases.alias(topic)
+        self._mqtt5_client.publish(packet).add_done_callback(on_puback)
+        return future
+
+    def _subscribe_mqtt5(self, topic: str, qos: int, on_message: Callable, future: Future) -> Future:
+        from awscrt import mqtt, mqtt5
+
+        # the keyword arguments of MQTT 3 message callbacks, and the packet
+        def on_publish(packet):
+            on_message(topic=packet.topic, payload=packet.payload, dup=False, qos=packet.qos,
+                       retain=packet.retain, publish_packet=packet)
+
+        def on_suback(suback_future):
+            try:
+                reason_code = suback_future.result().reason_codes[0]
+                if reason_code >= 0x80:
+                    raise RuntimeError("Subscription to {} failed: {}".format(topic, reason_code.name))
+                future.set_result(mqtt.QoS(int(reason_code)))
+            except Exception as e:
+                self._mqtt5_router.remove(topic, self)
+                future.set_exception(e)
+
+        self._mqtt5_router.add(topic, on_publish, self)
+        packet = mqtt5.SubscribePacket(subscriptions=[mqtt5.Subscription(topic_filter=topic, qos=mqtt5.QoS(qos))])
+        self._mqtt5_client.subscribe(packet).add_done_callback(on_suback)
+        return future
+
 
 class ModeledClass:
     """
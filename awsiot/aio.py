@@ -0,0 +1,213 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+asyncio versions of the MQTT service clients.
+
+Every ``publish_*`` operation of the wrapped client becomes a coroutine, and
+every ``subscribe_to_*`` operation a coroutine returning a
+:class:`Subscription`, an async iterator over the received events::
+
+    shadow = AsyncIotShadowClient(mqtt_connection)
+    async with await shadow.subscribe_to_shadow_delta_updated_events(
+            iotshadow.ShadowDeltaUpdatedSubscriptionRequest(thing_name='meter'),
+            mqtt.QoS.AT_LEAST_ONCE) as deltas:
+        async for delta in deltas:
+            await shadow.publish_update_shadow(..., mqtt.QoS.AT_LEAST_ONCE)
+
+Completions and messages arriving on the networking thread are handed to the
+event loop with ``call_soon_threadsafe()``, no thread waits on their behalf.
+"""
+
+__all__ = [
+    'AsyncServiceClient',
+    'AsyncIotShadowClient',
+    'AsyncIotJobsClient',
+    'AsyncIotIdentityClient',
+    'Subscription',
+]
+
+import asyncio
+import collections
+from awsiot import MqttServiceClient, iotidentity, iotjobs, iotshadow
+from typing import Any, Deque, Optional
+
+_CLOSED = object()
+
+
+class Subscription:
+    """
+    Async iterator over the events received by one subscription, returned
+    by the ``subscribe_to_*`` operations of an :class:`AsyncServiceClient`.
+
+    Iteration ends once :meth:`unsubscribe` is called. Used as an async
+    context manager, the subscription unsubscribes on exit.
+
+    Args:
+        client: Client that made the subscription.
+        max_pending: Maximum number of events waiting to be iterated over.
+            When full, the oldest waiting event is dropped.
+
+    Attributes:
+        topic (str): Subscribed topic.
+        dropped (int): Events dropped because `max_pending` were waiting, or
+            because they arrived once the event loop was closed.
+        invalid (int): Messages skipped because they could not be decoded.
+    """
+
+    def __init__(self, client: 'AsyncServiceClient', max_pending: int = 1024):
+        self.topic = None  # type: Optional[str]
+        self.dropped = 0
+        self.invalid = 0
+        self._client = client
+        self._max_pending = max_pending
+        self._events = collections.deque()  # type: Deque[Any]
+        self._waiter = None  # type: Optional[asyncio.Future]
+        self._closed = False
+        self._loop = asyncio.get_running_loop()
+
+    def _on_event(self, event):
+        # networking (or executor) thread
+        try:
+            self._loop.call_soon_threadsafe(self._push, event)
+        except RuntimeError:
+            # the event loop is closed, messages can still arrive until unsubscribed
+            self.dropped += 1
+
+    def _push(self, event):
+        if self._closed:
+            return
+        if event is None:
+            self.invalid += 1
+            return
+        if len(self._events) >= self._max_pending:
+            self._events.popleft()
+            self.dropped += 1
+        self._events.append(event)
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._events:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = self._loop.create_future()
+            await self._waiter
+        event = self._events.popleft()
+        if event is _CLOSED:
+            raise StopAsyncIteration
+        return event
+
+    async def unsubscribe(self):
+        """
+        Unsubscribe from the topic. Events already received can still be
+        iterated over, then iteration ends.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._events.append(_CLOSED)
+        self._wake()
+        await self._client.unsubscribe(self.topic)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.unsubscribe()
+
+
+def _publish(name, sync_method):
+    async def publish(self, *args, **kwargs):
+        return await asyncio.wrap_future(getattr(self.client, name)(*args, **kwargs))
+
+    publish.__doc__ = "Coroutine version of :meth:`{}.{}`.".format(
+        sync_method.__module__, sync_method.__qualname__)
+    return publish
+
+
+def _subscribe(name, sync_method):
+    async def subscribe(self, request, qos, max_pending=1024):
+        subscription = Subscription(self, max_pending)
+        future, subscription.topic = getattr(self.client, name)(request, qos, subscription._on_event)
+        await asyncio.wrap_future(future)
+        return subscription
+
+    subscribe.__doc__ = (
+        "Coroutine version of :meth:`{}.{}`, returning a :class:`Subscription` "
+        "once the server has acknowledged the subscription.").format(
+        sync_method.__module__, sync_method.__qualname__)
+    return subscribe
+
+
+class AsyncServiceClient:
+    """
+    Base class for the asyncio service clients.
+
+    Args:
+        client: Service client to wrap, or an MQTT connection to create one
+            with. Remaining keyword arguments are passed to the service
+            client's constructor.
+    """
+
+    _client_class = MqttServiceClient
+
+    def __init__(self, client, **kwargs):
+        if not isinstance(client, self._client_class):
+            client = self._client_class(client, **kwargs)
+        self.client = client
+
+    @classmethod
+    def _add_operations(cls):
+        for name in dir(cls._client_class):
+            if name.startswith('publish_'):
+                method = _publish(name, getattr(cls._client_class, name))
+            elif name.startswith('subscribe_to_'):
+                method = _subscribe(name, getattr(cls._client_class, name))
+            else:
+                continue
+            method.__name__ = name
+            method.__qualname__ = '{}.{}'.format(cls.__name__, name)
+            setattr(cls, name, method)
+
+    async def unsubscribe(self, topic: str):
+        """
+        Tell the MQTT server to stop sending messages to this topic, and wait
+        for it to acknowledge.
+        """
+        await asyncio.wrap_future(self.client.unsubscribe(topic))
+
+
+class AsyncIotShadowClient(AsyncServiceClient):
+    """
+    asyncio version of :class:`awsiot.iotshadow.IotShadowClient`.
+    """
+
+    _client_class = iotshadow.IotShadowClient
+
+
+class AsyncIotJobsClient(AsyncServiceClient):
+    """
+    asyncio version of :class:`awsiot.iotjobs.IotJobsClient`.
+    """
+
+    _client_class = iotjobs.IotJobsClient
+
+
+class AsyncIotIdentityClient(AsyncServiceClient):
+    """
+    asyncio version of :class:`awsiot.iotidentity.IotIdentityClient`.
+    """
+
+    _client_class = iotidentity.IotIdentityClient
+
+
+AsyncIotShadowClient._add_operations()
+AsyncIotJobsClient._add_operations()
+AsyncIotIdentityClient._add_operations()
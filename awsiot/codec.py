@@ -0,0 +1,170 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Payload codecs for :class:`awsiot.MqttServiceClient`.
+
+A codec turns the dict produced by a request's ``to_payload()`` into the bytes
+sent over MQTT, and parses received bytes back into a dict for
+``from_payload()``. Codecs take the ``bytes``, ``bytearray`` or
+``memoryview`` handed over by awscrt as it is. Only orjson parses it
+without an intermediate ``str``: the standard library's ``json.loads()``
+decodes bytes to a ``str`` internally. Pass one to any service client
+constructor::
+
+    shadow_client = iotshadow.IotShadowClient(mqtt_connection, codec=awsiot.codec.JsonCodec())
+
+JSON is the default. When the `orjson <https://pypi.org/project/orjson/>`_
+package is installed it is used automatically, falling back to the standard
+library for anything orjson can't handle.
+
+:class:`CborCodec` and :class:`MsgPackCodec` produce smaller payloads but
+need the optional ``cbor2`` and ``msgpack`` packages. Note that AWS IoT Core's
+reserved topics only accept JSON, except for Fleet Provisioning
+(:mod:`awsiot.iotidentity`), which also accepts CBOR. When a client uses
+:class:`CborCodec`, Fleet Provisioning topics are switched from their
+``/json`` variant to the ``/cbor`` variant automatically.
+"""
+
+__all__ = [
+    'PayloadCodec',
+    'JsonCodec',
+    'CborCodec',
+    'MsgPackCodec',
+    'DEFAULT_CODEC',
+]
+
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+PayloadObj = Dict[str, Any]
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class PayloadCodec:
+    """
+    Base class for payload codecs.
+
+    Attributes:
+        topic_format (Optional[str]): Name of the payload format used in
+            the topics of services that let the client pick one, such as
+            ``"cbor"`` for Fleet Provisioning. None if the codec is not
+            supported by any AWS IoT service topic.
+    """
+
+    topic_format = None  # type: Optional[str]
+
+    def encode(self, payload: PayloadObj) -> bytes:
+        """
+        Encode a payload dict into the bytes of an MQTT message.
+        """
+        raise NotImplementedError()
+
+    def decode(self, payload: Buffer) -> PayloadObj:
+        """
+        Decode the bytes of an MQTT message into a payload dict.
+        """
+        raise NotImplementedError()
+
+
+class JsonCodec(PayloadCodec):
+    """
+    JSON codec.
+
+    Args:
+        backend: ``"auto"`` (default) uses orjson when it is installed and the
+            standard library otherwise. ``"orjson"`` requires orjson and
+            ``"json"`` always uses the standard library.
+    """
+
+    topic_format = 'json'
+
+    def __init__(self, backend: str = 'auto'):
+        if backend == 'auto':
+            backend = 'orjson' if _orjson is not None else 'json'
+        if backend == 'orjson':
+            if _orjson is None:
+                raise ImportError("JsonCodec backend 'orjson' requires the orjson package")
+        elif backend != 'json':
+            raise ValueError("backend must be 'auto', 'orjson' or 'json'")
+        self.backend = backend
+
+        if backend == 'orjson':
+            self.encode = self._encode_orjson
+            self.decode = _orjson.loads
+        else:
+            self.encode = self._encode_json
+            self.decode = self._decode_json
+
+    @staticmethod
+    def _decode_json(payload: Buffer) -> PayloadObj:
+        # json.loads() detects the encoding of bytes itself, only memoryview needs converting
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+        return json.loads(payload)
+
+    @staticmethod
+    def _encode_json(payload: PayloadObj) -> bytes:
+        return json.dumps(payload).encode()
+
+    @staticmethod
+    def _encode_orjson(payload: PayloadObj) -> bytes:
+        try:
+            return _orjson.dumps(payload)
+        except TypeError:
+            # e.g. integers wider than 64 bits, which the standard library handles
+            return json.dumps(payload).encode()
+
+
+class CborCodec(PayloadCodec):
+    """
+    CBOR codec, requires the ``cbor2`` package.
+    """
+
+    topic_format = 'cbor'
+
+    def __init__(self):
+        try:
+            import cbor2
+        except ImportError as e:
+            raise ImportError("CborCodec requires the cbor2 package") from e
+        self.encode = cbor2.dumps
+        self._loads = cbor2.loads
+
+    def decode(self, payload: Buffer) -> PayloadObj:
+        # cbor2 doesn't accept memoryview
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+        return self._loads(payload)
+
+
+class MsgPackCodec(PayloadCodec):
+    """
+    MessagePack codec, requires the ``msgpack`` package.
+
+    No AWS IoT service topic accepts MessagePack, use it with your own
+    services or brokers only.
+    """
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError("MsgPackCodec requires the msgpack package") from e
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, payload: PayloadObj) -> bytes:
+        return self._packb(payload, use_bin_type=True)
+
+    def decode(self, payload: Buffer) -> PayloadObj:
+        return self._unpackb(payload, raw=False)
+
+
+DEFAULT_CODEC = JsonCodec()
+"""Codec used by service clients when none is given, JSON with the fastest available backend."""
@@ -0,0 +1,254 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+A pool of MQTT 5 connections publishing on behalf of many things.
+
+A gateway publishing for hundreds of meters outgrows a single connection:
+AWS IoT Core limits the publishes per second of each connection.
+:class:`ConnectionPool` builds `size` clients sharing one TLS context, even
+with a ``tls_context_cache`` that caches nothing, and one
+:class:`~awscrt.io.ClientBootstrap`, with client IDs ``<client_id>-0``,
+``<client_id>-1``..., and sends all the publishes of a thing over the
+connection that was least loaded when the thing first published::
+
+    pool = ConnectionPool(mqtt5_client_builder.mtls_from_path, size=4, client_id='gateway-1',
+                          max_publish_tps=100, endpoint=endpoint,
+                          cert_filepath=cert_filepath, pri_key_filepath=pri_key_filepath)
+    pool.start()
+    future = pool.publish('meter-000001', mqtt5.PublishPacket(
+        topic='meters/meter-000001/flow', payload=payload, qos=mqtt5.QoS.AT_LEAST_ONCE))
+    for stats in pool.stats:
+        print(stats)
+    pool.stop()
+"""
+
+__all__ = [
+    'ConnectionPool',
+    'ConnectionStats',
+]
+
+from awscrt import io, mqtt5
+from concurrent.futures import Future, TimeoutError
+import copy
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# seconds over which throughput is averaged
+_THROUGHPUT_WINDOW = 1.0
+
+
+class ConnectionStats:
+    """
+    Publish metrics of one connection of a :class:`ConnectionPool`.
+
+    Attributes:
+        client_id (str): Client ID of the connection.
+        things (int): Things publishing over the connection.
+        in_flight (int): Publishes waiting for their completion.
+        published (int): Publishes that completed.
+        failed (int): Publishes that failed, or were rejected by the broker.
+        throttled (int): Publishes delayed to stay within the publish TPS limit.
+        throughput (float): Publishes sent per second, averaged over about a second.
+    """
+
+    __slots__ = ['client_id', 'things', 'in_flight', 'published', 'failed', 'throttled', 'throughput']
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.things = 0
+        self.in_flight = 0
+        self.published = 0
+        self.failed = 0
+        self.throttled = 0
+        self.throughput = 0.0
+
+    def __repr__(self):
+        return 'ConnectionStats({})'.format(
+            ', '.join('{}={!r}'.format(slot, getattr(self, slot)) for slot in self.__slots__))
+
+
+class _PooledConnection:
+    def __init__(self, client: mqtt5.Client, client_id: str, max_publish_tps: Optional[float]):
+        self.client = client
+        self.max_publish_tps = max_publish_tps
+        self.stats = ConnectionStats(client_id)
+        self._lock = threading.Lock()
+        # token bucket holding up to a second of publishes, negative while publishes wait
+        self._tokens = max_publish_tps or 0.0
+        self._refilled = time.monotonic()
+        # exponentially weighted publish rate, as of _rate_stamp
+        self._rate = 0.0
+        self._rate_stamp = self._refilled
+
+    def load(self, now: float) -> tuple:
+        with self._lock:
+            return (self._decayed_rate(now), self.stats.things, self.stats.in_flight)
+
+    def snapshot(self) -> ConnectionStats:
+        now = time.monotonic()
+        with self._lock:
+            stats = copy.copy(self.stats)
+            stats.throughput = self._decayed_rate(now)
+        return stats
+
+    def publish(self, publish_packet: mqtt5.PublishPacket, timeout: Optional[float]) -> Future:
+        wait = 0.0
+        with self._lock:
+            now = time.monotonic()
+            if self.max_publish_tps:
+                self._tokens = min(self.max_publish_tps,
+                                   self._tokens + (now - self._refilled) * self.max_publish_tps)
+                self._refilled = now
+                if self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.max_publish_tps
+                    if timeout is not None and wait > timeout:
+                        raise TimeoutError("publish TPS limit of {} reached".format(self.stats.client_id))
+                    self.stats.throttled += 1
+                # reserve a token now, so concurrent publishers queue up behind this one
+                self._tokens -= 1.0
+            self._rate = self._decayed_rate(now) + 1.0 / _THROUGHPUT_WINDOW
+            self._rate_stamp = now
+            self.stats.in_flight += 1
+        if wait:
+            time.sleep(wait)
+
+        try:
+            future = self.client.publish(publish_packet)
+        except Exception:
+            self._on_done(None)
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Optional[Future]):
+        failed = future is None or future.exception() is not None
+        if not failed:
+            puback = getattr(future.result(), 'puback', None)
+            failed = puback is not None and puback.reason_code >= 0x80
+        with self._lock:
+            self.stats.in_flight -= 1
+            if failed:
+                self.stats.failed += 1
+            else:
+                self.stats.published += 1
+
+    def _decayed_rate(self, now: float) -> float:
+        return self._rate * math.exp((self._rate_stamp - now) / _THROUGHPUT_WINDOW)
+
+
+class ConnectionPool:
+    """
+    MQTT 5 clients sharing a TLS context and client bootstrap, publishing on
+    behalf of things.
+
+    The clients are built by calling `builder`, a function of
+    :mod:`awsiot.mqtt5_client_builder`, with the keyword arguments given to
+    the pool. Each gets its own ``client_options``, copied from the
+    ``client_options`` argument if there is one, with the client ID of the
+    connection. The TLS context built for the first client is passed to the
+    builder as `tls_ctx` for the others.
+
+    Each thing publishes over the connection that had the lowest throughput,
+    then the fewest things, when it first published, so its messages stay in
+    order. :meth:`publish` waits, if it has to, for the connection to be
+    within `max_publish_tps`.
+
+    Args:
+        builder: Builder function, such as :func:`awsiot.mqtt5_client_builder.mtls_from_path`.
+        size: Number of connections.
+        client_id: Prefix of the client IDs, to which ``-<index>`` is added.
+        max_publish_tps: (Optional) Most publishes per second over each
+            connection, 100 being the limit of AWS IoT Core.
+        timeout: Longest wait in seconds for the publish TPS limit, None to wait as
+            long as it takes.
+        **builder_kwargs: Arguments of `builder`, common to all connections.
+
+    Attributes:
+        clients (List[awscrt.mqtt5.Client]): The clients of the pool, in client ID order.
+        tls_ctx (Optional[awscrt.io.ClientTlsContext]): TLS context shared by the clients.
+    """
+
+    def __init__(self, builder: Callable[..., mqtt5.Client], size: int, client_id: str,
+                 max_publish_tps: Optional[float] = 100, timeout: Optional[float] = None, **builder_kwargs):
+        if size < 1:
+            raise ValueError("size must be positive")
+        self.timeout = timeout
+        self.tls_ctx = builder_kwargs.pop('tls_ctx', None)  # type: Optional[io.ClientTlsContext]
+        self._lock = threading.Lock()
+        self._things = {}  # type: Dict[str, _PooledConnection]
+
+        client_options = builder_kwargs.pop('client_options', None)
+        client_bootstrap = builder_kwargs.pop('client_bootstrap', None)
+        if client_options is not None and client_options.bootstrap is not None:
+            client_bootstrap = client_options.bootstrap
+        if client_bootstrap is None:
+            client_bootstrap = io.ClientBootstrap.get_or_create_static_default()
+
+        self._connections = []  # type: List[_PooledConnection]
+        for index in range(size):
+            if client_options is None:
+                options = mqtt5.ClientOptions(host_name=builder_kwargs.get('endpoint'))
+            else:
+                options = copy.copy(client_options)
+            options.connect_options = copy.copy(options.connect_options) or mqtt5.ConnectPacket()
+            options.connect_options.client_id = '{}-{}'.format(client_id, index)
+            options.bootstrap = client_bootstrap
+            client = builder(client_options=options, tls_ctx=self.tls_ctx, **builder_kwargs)
+            # the builder fills in the options it was given
+            self.tls_ctx = options.tls_ctx
+            self._connections.append(
+                _PooledConnection(client, options.connect_options.client_id, max_publish_tps))
+        self.clients = [connection.client for connection in self._connections]
+
+    @property
+    def stats(self) -> List[ConnectionStats]:
+        """Metrics of each connection, as of now, in client ID order"""
+        return [connection.snapshot() for connection in self._connections]
+
+    def start(self):
+        """Start all the clients"""
+        for client in self.clients:
+            client.start()
+
+    def stop(self, disconnect_packet: Optional[mqtt5.DisconnectPacket] = None):
+        """Stop all the clients"""
+        for client in self.clients:
+            client.stop(disconnect_packet)
+
+    def client_for(self, thing_name: str) -> mqtt5.Client:
+        """
+        Return the client `thing_name` publishes over, for instance to give
+        to a service client. Publishes sent directly over it aren't
+        counted or limited by the pool.
+        """
+        return self._connection_for(thing_name).client
+
+    def publish(self, thing_name: str, publish_packet: mqtt5.PublishPacket) -> Future:
+        """
+        Publish a message of `thing_name` over its connection.
+
+        Returns:
+            The future of :meth:`awscrt.mqtt5.Client.publish`.
+
+        Raises:
+            concurrent.futures.TimeoutError: The connection wouldn't be within
+                its publish TPS limit before the pool's timeout.
+        """
+        return self._connection_for(thing_name).publish(publish_packet, self.timeout)
+
+    def _connection_for(self, thing_name: str) -> _PooledConnection:
+        connection = self._things.get(thing_name)
+        if connection is not None:
+            return connection
+        with self._lock:
+            connection = self._things.get(thing_name)
+            if connection is None:
+                now = time.monotonic()
+                connection = min(self._connections, key=lambda candidate: candidate.load(now))
+                with connection._lock:
+                    connection.stats.things += 1
+                self._things[thing_name] = connection
+            return connection
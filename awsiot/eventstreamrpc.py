@@ -7,12 +7,13 @@ Classes for building a service that uses the event-stream RPC protocol.
 from awscrt.eventstream import Header, HeaderType
 import awscrt.eventstream.rpc as protocol
 from awscrt.io import (ClientBootstrap, SocketOptions, TlsConnectionOptions)
+import binascii
 from concurrent.futures import Future
 from enum import Enum
 import json
 import logging
 from threading import Lock
-from typing import (Any, Callable, Dict, Optional, Sequence)
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Tuple, Union)
 
 VERSION_TUPLE = (0, 1, 0)
 VERSION_STRING = "{v[0]}.{v[1]}.{v[2]}".format(v=VERSION_TUPLE)
@@ -527,6 +528,106 @@ class Shape:
         raise NotImplementedError(self.__class__.__name__ + " must override _to_payload()")
 
 
+# smaller blobs take the regular path, splicing them costs more than it saves
+_BLOB_SPLICE_MIN_SIZE = 4096
+_BLOB_MARKER = '\x00awsiot-blob-{}'
+
+# shape type -> paths of attributes leading to its blobs, through nested shapes
+_blob_paths_by_type = {}  # type: Dict[type, Tuple[Tuple[str, ...], ...]]
+
+
+def _blob_paths(shape_type: type) -> Tuple[Tuple[str, ...], ...]:
+    """
+    Return the paths of attributes leading to the blobs of a shape type,
+    through nested shapes. They are found once per type, from the member
+    types that the generated constructor is annotated with.
+    """
+    paths = _blob_paths_by_type.get(shape_type)
+    if paths is None:
+        paths = _blob_paths_by_type[shape_type] = _find_blob_paths(shape_type, (shape_type,))
+    return paths
+
+
+def _find_blob_paths(shape_type: type, parents: Tuple[type, ...]) -> Tuple[Tuple[str, ...], ...]:
+    paths = []  # type: List[Tuple[str, ...]]
+    for attr, member_type in getattr(shape_type.__init__, '__annotations__', {}).items():
+        # members are Optional[...], blobs are Optional[Union[bytes, str]]
+        if getattr(member_type, '__origin__', None) is not Union:
+            continue
+        for arg in member_type.__args__:
+            if arg is bytes:
+                paths.append((attr,))
+            elif isinstance(arg, type) and issubclass(arg, Shape) and arg not in parents:
+                paths.extend((attr,) + path for path in _find_blob_paths(arg, parents + (arg,)))
+    return tuple(paths)
+
+
+def _shallow_copy(shape: Shape) -> Shape:
+    copy = object.__new__(type(shape))
+    copy.__dict__.update(shape.__dict__)
+    return copy
+
+
+def _blob_stand_in(shape: Shape, blobs: List[bytes]) -> Shape:
+    """
+    Return a copy of a shape whose large blobs, directly or in nested
+    shapes, are replaced by markers, and append those blobs to `blobs`.
+    Return the shape itself if it has no large blobs.
+    """
+    paths = _blob_paths(type(shape))
+    copies = None  # id of each shape on the way to a large blob -> its copy
+    for path in paths:
+        value = shape
+        for attr in path:
+            value = getattr(value, attr, None)
+            if value is None:
+                break
+        else:
+            if len(value) < _BLOB_SPLICE_MIN_SIZE:
+                continue
+            if copies is None:
+                copies = {id(shape): _shallow_copy(shape)}
+            original = shape
+            parent = copies[id(shape)]
+            for attr in path[:-1]:
+                original = getattr(original, attr)
+                child = copies.get(id(original))
+                if child is None:
+                    child = copies[id(original)] = _shallow_copy(original)
+                    setattr(parent, attr, child)
+                parent = child
+            # serialized as the base64 of the marker, in place of the blob's
+            setattr(parent, path[-1], _BLOB_MARKER.format(len(blobs)).encode())
+            blobs.append(value)
+    if copies is None:
+        return shape
+    return copies[id(shape)]
+
+
+def _splice_blobs(payload_bytes: bytes, blobs: List[bytes]) -> bytes:
+    """
+    Replace the blob markers in JSON with the base64 of the blobs.
+    """
+    spans = []
+    for i, blob in enumerate(blobs):
+        marker = b'"' + binascii.b2a_base64(_BLOB_MARKER.format(i).encode(), newline=False) + b'"'
+        start = payload_bytes.index(marker)
+        spans.append((start, start + len(marker), blob))
+    spans.sort(key=lambda span: span[0])
+
+    parts = []
+    position = 0
+    for start, end, blob in spans:
+        parts.append(payload_bytes[position:start])
+        parts.append(b'"')
+        parts.append(binascii.b2a_base64(blob, newline=False))
+        parts.append(b'"')
+        position = end
+    parts.append(payload_bytes[position:])
+    # join() sizes the result first, so the base64 is copied once
+    return b''.join(parts)
+
+
 class ErrorShape(Shape, EventStreamOperationError):
     """
     Base class for all error shapes serialized by a service
@@ -540,13 +641,19 @@ class ShapeIndex:
     """
 
     def __init__(self, shape_types: Sequence[type]):
-        self._shapes_type_by_name = {i._model_name(): i for i in shape_types}
+        # indexed by the first lookup rather than when the model is imported
+        self._shape_types = shape_types
+        self._shapes_type_by_name = None  # type: Optional[Dict[str, type]]
 
     def find_shape_type(self, model_name: str) -> type:
         """
         Returns Shape type with given model_name, or None
         """
-        return self._shapes_type_by_name.get(model_name)
+        shapes_type_by_name = self._shapes_type_by_name
+        if shapes_type_by_name is None:
+            shapes_type_by_name = {i._model_name(): i for i in self._shape_types}
+            self._shapes_type_by_name = shapes_type_by_name
+        return shapes_type_by_name.get(model_name)
 
 
 class StreamResponseHandler:
@@ -664,8 +771,8 @@ class ClientOperation(Operation):
 
     def _shape_from_json_payload(self, payload_bytes, shape_type):
         try:
-            payload_str = payload_bytes.decode()
-            payload_obj = json.loads(payload_str)
+            # json.loads() decodes UTF-8 bytes itself
+            payload_obj = json.loads(payload_bytes)
             shape = shape_type._from_payload(payload_obj)
             return shape
         except Exception as e:
@@ -673,9 +780,12 @@ class ClientOperation(Operation):
 
     def _json_payload_from_shape(self, shape):
         try:
-            payload_obj = shape._to_payload()
-            payload_str = json.dumps(payload_obj)
-            payload_bytes = payload_str.encode()
+            # large blobs skip the base64 str, json.dumps() and encode() copies
+            blobs = []
+            payload_obj = _blob_stand_in(shape, blobs)._to_payload()
+            payload_bytes = json.dumps(payload_obj).encode()
+            if blobs:
+                payload_bytes = _splice_blobs(payload_bytes, blobs)
             return payload_bytes
         except Exception as e:
             raise SerializeError("Failed to serialize", shape, e)
@@ -0,0 +1,290 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Pipelined publishing over Greengrass IPC.
+
+Each ``PublishToTopic`` and ``PublishToIoTCore`` call is its own event-stream
+operation, answered by the nucleus. Waiting for each answer before sending
+the next message caps a component at one message per round trip.
+:class:`BatchPublisher` keeps up to `max_in_flight` publishes on the
+connection instead, and makes callers wait for room when they get ahead of
+the nucleus::
+
+    publisher = BatchPublisher(GreengrassCoreIPCClientV2(), max_in_flight=64)
+
+    # one future per message
+    future = publisher.publish_to_topic('meters/flow', {'flowRate': 12.5})
+
+    # one future for a whole batch
+    batch = publisher.publish_batch(
+        publisher.topic_request('meters/flow', reading) for reading in readings)
+    responses = batch.result()
+
+    publisher.close()
+"""
+
+__all__ = [
+    'BatchPublisher',
+    'PublishBatchError',
+]
+
+from awsiot.eventstreamrpc import Shape
+from awsiot.greengrasscoreipc import model
+from concurrent.futures import Future, TimeoutError
+import threading
+import time
+from typing import Any, Iterable, List, Optional, Union
+
+
+class PublishBatchError(Exception):
+    """
+    Raised by the future of a batch when some of its publishes failed.
+    """
+
+    def __init__(self, results: List[Any]):
+        failed = sum(1 for result in results if isinstance(result, BaseException))
+        super().__init__("{} of {} publishes failed".format(failed, len(results)))
+        #: Response, or exception, of each request of the batch, in order.
+        self.results = results
+
+
+class BatchPublisher:
+    """
+    Publishes over Greengrass IPC with a bounded number of requests in flight.
+
+    Publishing methods return as soon as the request is written, unless
+    `max_in_flight` requests are waiting for their response. They then block
+    until one completes, or raise :class:`~concurrent.futures.TimeoutError`
+    after `timeout` seconds.
+
+    Args:
+        ipc_client: A :class:`~awsiot.greengrasscoreipc.clientv2.GreengrassCoreIPCClientV2`
+            or a connected :class:`~awsiot.greengrasscoreipc.client.GreengrassCoreIPCClient`.
+        max_in_flight: Most requests waiting for their response at once.
+        timeout: Longest wait for room in seconds, None to wait forever.
+
+    Attributes:
+        published (int): Requests that got their response.
+        failed (int): Requests that failed.
+        max_in_flight (int): Most requests waiting for their response at once.
+        peak_in_flight (int): Most requests that were in flight at once.
+    """
+
+    def __init__(self, ipc_client, max_in_flight: int = 64, timeout: Optional[float] = None):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be positive")
+        # V2 clients wrap a V1 client, whose operations are used directly
+        self._client = getattr(ipc_client, 'client', ipc_client)
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.published = 0
+        self.failed = 0
+        self.peak_in_flight = 0
+        self._in_flight = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests waiting for their response"""
+        return self._in_flight
+
+    @staticmethod
+    def topic_request(topic: str, message: Any) -> model.PublishToTopicRequest:
+        """
+        Build a local publish request.
+
+        Args:
+            topic: Topic to publish to.
+            message: Bytes are sent as a binary message, anything else as a
+                JSON message.
+        """
+        if isinstance(message, (bytes, bytearray)):
+            publish_message = model.PublishMessage(binary_message=model.BinaryMessage(message=message))
+        else:
+            publish_message = model.PublishMessage(json_message=model.JsonMessage(message=message))
+        return model.PublishToTopicRequest(topic=topic, publish_message=publish_message)
+
+    @staticmethod
+    def iot_core_request(topic_name: str, payload: bytes, qos: str = model.QOS.AT_LEAST_ONCE,
+                         **kwargs) -> model.PublishToIoTCoreRequest:
+        """
+        Build a request to publish to AWS IoT Core.
+
+        Args:
+            topic_name: Topic to publish to.
+            payload: Payload of the message.
+            qos: A :class:`~awsiot.greengrasscoreipc.model.QOS` value.
+            **kwargs: Other members of the request, such as ``retain``.
+        """
+        return model.PublishToIoTCoreRequest(topic_name=topic_name, payload=payload, qos=qos, **kwargs)
+
+    def publish_to_topic(self, topic: str, message: Any) -> Future:
+        """
+        Publish to a local topic, see :meth:`topic_request`.
+
+        Returns:
+            A Future whose result is the
+            :class:`~awsiot.greengrasscoreipc.model.PublishToTopicResponse`.
+        """
+        return self.publish(self.topic_request(topic, message))
+
+    def publish_to_iot_core(self, topic_name: str, payload: bytes, qos: str = model.QOS.AT_LEAST_ONCE,
+                            **kwargs) -> Future:
+        """
+        Publish to AWS IoT Core, see :meth:`iot_core_request`.
+
+        Returns:
+            A Future whose result is the
+            :class:`~awsiot.greengrasscoreipc.model.PublishToIoTCoreResponse`.
+        """
+        return self.publish(self.iot_core_request(topic_name, payload, qos, **kwargs))
+
+    def publish(self, request: Union[model.PublishToTopicRequest, model.PublishToIoTCoreRequest]) -> Future:
+        """
+        Send a publish request, once there is room for it.
+
+        Returns:
+            A Future whose result is the response to the request.
+        """
+        if isinstance(request, model.PublishToTopicRequest):
+            new_operation = self._client.new_publish_to_topic
+        elif isinstance(request, model.PublishToIoTCoreRequest):
+            new_operation = self._client.new_publish_to_iot_core
+        else:
+            raise TypeError("Not a publish request: {!r}".format(request))
+
+        self._enter()
+        future = Future()
+        # completed by whichever comes first of a failed write and the response
+        completed = []
+
+        def on_write(write_future):
+            if write_future.exception() is not None:
+                self._leave(future, completed, exception=write_future.exception())
+
+        def on_response(response_future):
+            if response_future.exception() is not None:
+                self._leave(future, completed, exception=response_future.exception())
+            else:
+                self._leave(future, completed, response=response_future.result())
+
+        try:
+            operation = new_operation()
+            write_future = operation.activate(request)
+            response_future = operation.get_response()
+        except Exception as e:
+            self._leave(future, completed, exception=e)
+            return future
+        write_future.add_done_callback(on_write)
+        response_future.add_done_callback(on_response)
+        return future
+
+    def publish_batch(self, requests: Iterable[Shape], return_exceptions: bool = False) -> Future:
+        """
+        Send publish requests, each once there is room for it.
+
+        Args:
+            requests: Publish requests, see :meth:`publish`.
+            return_exceptions: Whether failed requests leave their exception
+                in the results instead of failing the batch.
+
+        Returns:
+            A Future whose result is the list of responses, in order. It
+            raises :class:`PublishBatchError` if some requests failed, unless
+            `return_exceptions` is set. If a request couldn't be sent, for
+            instance because there was no room for it before the timeout,
+            the following requests aren't sent and the future raises
+            :class:`PublishBatchError` once the requests sent complete, its
+            results ending with that exception.
+        """
+        futures = []
+        unsent = False
+        for request in requests:
+            try:
+                futures.append(self.publish(request))
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                futures.append(future)
+                unsent = True
+                break
+        batch = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            results = [f.exception() or f.result() for f in futures]
+            if unsent or (not return_exceptions and any(isinstance(result, BaseException) for result in results)):
+                batch.set_exception(PublishBatchError(results))
+            else:
+                batch.set_result(results)
+
+        if not futures:
+            batch.set_result([])
+        for future in futures:
+            future.add_done_callback(on_done)
+        return batch
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for all requests in flight to complete.
+
+        Args:
+            timeout: Longest wait in seconds, None to wait forever.
+
+        Returns:
+            True if no request is in flight, False if `timeout` expired first.
+        """
+        with self._room:
+            return self._room.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop accepting requests and wait for those in flight, see :meth:`flush`.
+        The IPC client is left open.
+        """
+        with self._room:
+            self._closed = True
+            self._room.notify_all()
+        return self.flush(timeout)
+
+    def _enter(self):
+        with self._room:
+            if self._in_flight >= self.max_in_flight and not self._closed:
+                deadline = None if self.timeout is None else time.monotonic() + self.timeout
+                while self._in_flight >= self.max_in_flight and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("{} publishes already in flight".format(self._in_flight))
+                    self._room.wait(remaining)
+            if self._closed:
+                raise RuntimeError("BatchPublisher is closed")
+            self._in_flight += 1
+            if self._in_flight > self.peak_in_flight:
+                self.peak_in_flight = self._in_flight
+
+    def _leave(self, future: Future, completed: List[bool], response: Optional[Shape] = None,
+               exception: Optional[BaseException] = None):
+        with self._room:
+            if completed:
+                return
+            completed.append(True)
+            self._in_flight -= 1
+            if exception is None:
+                self.published += 1
+            else:
+                self.failed += 1
+            # flush() waits on the same condition as publishers waiting for room
+            self._room.notify_all()
+        # outside the lock, callbacks of the future may publish again
+        if exception is None:
+            future.set_result(response)
+        else:
+            future.set_exception(exception)
@@ -1,8 +1,9 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0.
 
+import importlib
 import os
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from awscrt.io import (
     ClientBootstrap,
@@ -16,14 +17,26 @@ from awsiot.eventstreamrpc import (
     LifecycleHandler,
     MessageAmendment,
 )
-from awsiot.greengrasscoreipc.client import GreengrassCoreIPCClient
+
+if TYPE_CHECKING:
+    from awsiot.greengrasscoreipc.client import GreengrassCoreIPCClient
+
+
+def __getattr__(name: str):
+    # the generated client and model are big: import them when first used,
+    # by connect() or by the component, rather than with the package
+    if name in ('client', 'clientv2', 'model'):
+        return importlib.import_module('.' + name, __name__)
+    if name == 'GreengrassCoreIPCClient':
+        return importlib.import_module('.client', __name__).GreengrassCoreIPCClient
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def connect(*,
             ipc_socket: str=None,
             authtoken: str=None,
             lifecycle_handler: Optional[LifecycleHandler]=None,
-            timeout: float=10.0) -> GreengrassCoreIPCClient:
+            timeout: float=10.0) -> 'GreengrassCoreIPCClient':
     """
     Creates an IPC client and connects to the GreengrassCoreIPC service.
 
@@ -65,4 +78,5 @@ def connect(*,
     connect_future = connection.connect(lifecycle_handler)
     connect_future.result(timeout)
 
+    from awsiot.greengrasscoreipc.client import GreengrassCoreIPCClient
     return GreengrassCoreIPCClient(connection)
@@ -0,0 +1,230 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Lazy decoding of job documents for :class:`awsiot.iotjobs.IotJobsClient`.
+
+Job documents can be hundreds of kilobytes when they embed scripts,
+certificates or images, while most handlers only look at the job ID and
+status of an execution. With :class:`LazyJobDocumentCodec`, the
+``jobDocument`` of such messages is kept as raw bytes in a
+:class:`LazyJobDocument` and only parsed when it is first read::
+
+    jobs_client = iotjobs.IotJobsClient(mqtt_connection, codec=LazyJobDocumentCodec())
+
+    def on_next_job_execution_changed(event):
+        execution = event.execution
+        if execution and execution.status == iotjobs.JobStatus.QUEUED:
+            operation = execution.job_document['operation']  # parsed here
+
+Very large documents can be read with :meth:`LazyJobDocument.stream`
+instead, which needs the optional `ijson <https://pypi.org/project/ijson/>`_
+package and never holds the whole parsed document in memory.
+
+The codec only helps documents dominated by large string values. Structured
+documents, such as an OTA manifest listing many files, are decoded eagerly
+and no faster than with :class:`~awsiot.codec.JsonCodec`.
+
+The other fields of a message are decoded as usual, ``statusDetails``
+included, since it is limited to a few small strings.
+"""
+
+__all__ = [
+    'LazyJobDocument',
+    'LazyJobDocumentCodec',
+]
+
+from awsiot.codec import Buffer, JsonCodec, PayloadObj
+from collections.abc import Mapping
+import re
+from typing import Any, Callable, Iterator, Optional
+
+_KEY = b'"jobDocument"'
+_COLON = re.compile(rb'\s*:\s*')
+_TOKEN = re.compile(rb'[{}\[\]"]')
+# parsed in place of the document, then swapped for the LazyJobDocument
+_MARKER = '\x00awsiot-lazy-job-document'
+_MARKER_JSON = b'"\\u0000awsiot-lazy-job-document"'
+# bytes of the document looked at before scanning it
+_SAMPLE_SIZE = 1024
+
+
+def _find_key(data: bytes) -> int:
+    # index of the value of the first jobDocument key, -1 if there is none
+    pos = data.find(_KEY)
+    while pos > 0 and data[pos - 1] == 0x5c:
+        # the quote is escaped, inside a string
+        pos = data.find(_KEY, pos + 1)
+    if pos < 0:
+        return -1
+    colon = _COLON.match(data, pos + len(_KEY))
+    return -1 if colon is None else colon.end()
+
+
+def _object_end(data: bytes, pos: int, budget: int) -> int:
+    # index after the JSON object or array starting at `pos`, -1 if it has
+    # more than `budget` strings and brackets
+    depth = 0
+    search = _TOKEN.search
+    find = data.find
+    while True:
+        budget -= 1
+        if budget < 0:
+            return -1
+        match = search(data, pos)
+        if match is None:
+            raise ValueError("unterminated job document")
+        char = match.group()
+        pos = match.end()
+        if char == b'"':
+            # skip the string, its closing quote is preceded by an even number of backslashes
+            while True:
+                pos = find(b'"', pos) + 1
+                if pos == 0:
+                    raise ValueError("unterminated string in job document")
+                backslash = pos - 2
+                while data[backslash] == 0x5c:
+                    backslash -= 1
+                if (pos - 2 - backslash) % 2 == 0:
+                    break
+        elif char in b'{[':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+class LazyJobDocument(Mapping):
+    """
+    Read-only job document that is parsed from its raw JSON on first access.
+
+    Apart from being read-only, it behaves like the dict it replaces.
+
+    Args:
+        raw: JSON of the document.
+        loads: Function parsing `raw`, ``json.loads`` by default.
+
+    Attributes:
+        raw (bytes): JSON of the document, as received.
+    """
+
+    __slots__ = ['raw', '_loads', '_value']
+
+    def __init__(self, raw: bytes, loads: Optional[Callable[[bytes], Any]] = None):
+        if loads is None:
+            import json
+            loads = json.loads
+        self.raw = raw
+        self._loads = loads
+        self._value = None  # type: Optional[PayloadObj]
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the document was parsed already"""
+        return self._value is not None
+
+    @property
+    def value(self) -> PayloadObj:
+        """The parsed document as a dict, parsed on first access"""
+        value = self._value
+        if value is None:
+            value = self._value = self._loads(self.raw)
+        return value
+
+    def stream(self, prefix: str = '') -> Iterator[Any]:
+        """
+        Parse the document incrementally, without keeping it in memory.
+        Requires the ``ijson`` package.
+
+        Args:
+            prefix: ijson prefix of the values to yield, e.g.
+                ``"files.item"`` for each entry of the ``files`` list. The
+                default yields the whole document.
+
+        Returns:
+            An iterator over the values at `prefix`.
+        """
+        try:
+            import ijson
+        except ImportError as e:
+            raise ImportError("LazyJobDocument.stream() requires the ijson package") from e
+        return ijson.items(self.raw, prefix, use_float=True)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.value[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.value)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def __repr__(self) -> str:
+        if self._value is not None:
+            return 'LazyJobDocument({!r})'.format(self._value)
+        return 'LazyJobDocument(<{} bytes>)'.format(len(self.raw))
+
+
+class LazyJobDocumentCodec(JsonCodec):
+    """
+    JSON codec that decodes the ``jobDocument`` of received messages lazily,
+    see :class:`LazyJobDocument`. Encoding is unchanged.
+
+    Only documents dominated by large string values, such as embedded
+    scripts, certificates or images, are decoded lazily. Finding where a
+    document ends takes a scan of its strings and brackets in Python, which
+    is cheaper than parsing it only in that case. The scan gives up after
+    one string or bracket per `bytes_per_token` bytes of the message, which
+    is then decoded eagerly. It isn't even started when the first kilobyte
+    of the document holds more strings than that. With the default budget,
+    structured documents such as OTA manifests are always decoded eagerly.
+
+    Args:
+        backend: JSON backend, see :class:`~awsiot.codec.JsonCodec`.
+        min_size: Messages smaller than this many bytes are decoded eagerly.
+        bytes_per_token: Lowest number of message bytes per string or
+            bracket of the document for it to be decoded lazily.
+    """
+
+    def __init__(self, backend: str = 'auto', min_size: int = 4096, bytes_per_token: int = 1024):
+        super().__init__(backend)
+        if bytes_per_token < 1:
+            raise ValueError("bytes_per_token must be positive")
+        self.min_size = min_size
+        self.bytes_per_token = bytes_per_token
+        self._loads = self.decode
+        self.decode = self._decode_lazy
+
+    def _decode_lazy(self, payload: Buffer) -> PayloadObj:
+        if len(payload) < self.min_size:
+            return self._loads(payload)
+        if not isinstance(payload, bytes):
+            payload = bytes(payload)
+
+        start = _find_key(payload)
+        if start < 0 or payload[start:start + 1] != b'{':
+            return self._loads(payload)
+        budget = len(payload) // self.bytes_per_token + 2
+        if payload.count(b'"', start, start + _SAMPLE_SIZE) // 2 > budget:
+            # many small values, the scan would give up
+            return self._loads(payload)
+        try:
+            end = _object_end(payload, start, budget)
+        except (ValueError, IndexError):
+            # malformed, let the parser report it
+            return self._loads(payload)
+        if end < 0:
+            return self._loads(payload)
+
+        envelope = self._loads(payload[:start] + _MARKER_JSON + payload[end:])
+        document = LazyJobDocument(payload[start:end], self._loads)
+        if envelope.get('jobDocument') == _MARKER:
+            envelope['jobDocument'] = document
+            return envelope
+        execution = envelope.get('execution')
+        if isinstance(execution, dict) and execution.get('jobDocument') == _MARKER:
+            execution['jobDocument'] = document
+            return envelope
+        # the key found wasn't the one of a job document
+        return self._loads(payload)
@@ -0,0 +1,513 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Concurrent execution of AWS IoT jobs.
+
+:class:`JobRunner` works through the pending job executions of a thing with a
+pool of worker threads, instead of one job at a time::
+
+    def install(job):
+        job.report({'step': 'download'})
+        ...
+        return {'installed': job.document['version']}
+
+    runner = JobRunner(iotjobs.IotJobsClient(mqtt_connection), 'gateway', install,
+                       max_workers=8, step_timeout_in_minutes=5)
+    runner.start().result()
+
+The runner lists the pending executions with ``GetPendingJobExecutions`` and
+claims each one by updating it to ``IN_PROGRESS``, which returns its job
+document. ``StartNextPendingJobExecution`` can't be used for this, as it keeps
+returning the oldest execution in progress. A job succeeds if the handler
+returns and fails if it raises.
+
+The runner subscribes to the thing's ``get`` and ``update`` response topics
+and to its ``notify`` topic, and matches responses to requests by
+``clientToken``. While a job runs, one heartbeat per `heartbeat_interval`
+resets its step timeout and carries the status details reported since the
+previous one, so frequent :meth:`Job.report` calls don't each cost an update.
+"""
+
+__all__ = [
+    'Job',
+    'JobRequestError',
+    'JobRunner',
+]
+
+from awscrt import mqtt
+from awsiot import iotjobs
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+import heapq
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+import uuid
+
+StatusDetails = Dict[str, str]
+
+
+class JobRequestError(Exception):
+    """
+    The AWS IoT Jobs service rejected a request.
+    """
+
+    def __init__(self, rejected_error: iotjobs.RejectedError):
+        super().__init__('{} {}'.format(rejected_error.code, rejected_error.message))
+        #: `awsiot.iotjobs.RejectedError` sent by the service
+        self.rejected_error = rejected_error  # type: iotjobs.RejectedError
+
+
+class Job:
+    """
+    A job execution claimed by a :class:`JobRunner`, passed to its handler.
+
+    Attributes:
+        job_id (str): ID of the job.
+        document (Dict[str, Any]): Job document.
+        execution_number (Optional[int]): Number of the job execution.
+    """
+
+    __slots__ = ['job_id', 'document', 'execution_number', '_runner', '_status_details', '_update_lock']
+
+    def __init__(self, runner: 'JobRunner', job_id: str, document: Dict[str, Any],
+                 execution_number: Optional[int] = None):
+        self.job_id = job_id
+        self.document = document
+        self.execution_number = execution_number
+        self._runner = runner
+        self._status_details = None  # type: Optional[StatusDetails]
+        # serializes the heartbeats of the job with its final status update
+        self._update_lock = threading.Lock()
+
+    def report(self, status_details: StatusDetails):
+        """
+        Report progress. The status details are merged with those reported
+        before and sent with the next heartbeat or the final status update.
+        """
+        with self._runner._lock:
+            if self._status_details is None:
+                self._status_details = dict(status_details)
+            else:
+                self._status_details.update(status_details)
+                self._runner.reports_merged += 1
+
+
+class _PendingRequest:
+    __slots__ = ['future', 'operation']
+
+    def __init__(self, future: Future, operation: str):
+        self.future = future
+        self.operation = operation
+
+
+class JobRunner:
+    """
+    Runs the job executions of one thing concurrently.
+
+    Args:
+        jobs_client: `awsiot.iotjobs.IotJobsClient` to use.
+        thing_name: Name of the thing whose jobs are run.
+        handler: Invoked with a :class:`Job` on a worker thread. The job
+            succeeds with the status details it returns, if any, and fails
+            with a ``reason`` status detail if it raises.
+        max_workers: Number of jobs run at the same time.
+        prefetch: Number of jobs claimed ahead of a free worker, so their
+            documents are at hand when one frees up. Their step timeouts
+            start when they are claimed.
+        step_timeout_in_minutes: (Optional) Step timeout set on the job
+            executions, refreshed by the heartbeats.
+        heartbeat_interval: Seconds between two heartbeats of a running
+            job. Jobs without step timeout and without new status details
+            get no heartbeat.
+        qos: Quality of Service of the subscription and requests.
+        timeout: Seconds to wait for the response to a request.
+
+    Attributes:
+        claimed (int): Job executions claimed.
+        succeeded (int): Jobs whose handler returned.
+        failed (int): Jobs whose handler raised.
+        heartbeats (int): Heartbeat updates sent.
+        reports_merged (int): :meth:`Job.report` calls that didn't need an
+            update of their own.
+    """
+
+    def __init__(self,
+                 jobs_client: iotjobs.IotJobsClient,
+                 thing_name: str,
+                 handler: Callable[[Job], Optional[StatusDetails]],
+                 max_workers: int = 4,
+                 prefetch: int = 0,
+                 step_timeout_in_minutes: Optional[int] = None,
+                 heartbeat_interval: float = 30.0,
+                 qos: int = mqtt.QoS.AT_LEAST_ONCE,
+                 timeout: float = 10.0):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if prefetch < 0:
+            raise ValueError("prefetch must not be negative")
+        if heartbeat_interval <= 0:
+            raise ValueError("heartbeat_interval must be positive")
+        if step_timeout_in_minutes is not None and heartbeat_interval >= step_timeout_in_minutes * 60:
+            raise ValueError("heartbeat_interval must be shorter than the step timeout")
+        self.jobs_client = jobs_client
+        self.thing_name = thing_name
+        self.handler = handler
+        self.max_workers = max_workers
+        self.prefetch = prefetch
+        self.step_timeout_in_minutes = step_timeout_in_minutes
+        self.heartbeat_interval = heartbeat_interval
+        self.qos = qos
+        self.timeout = timeout
+
+        self.claimed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.heartbeats = 0
+        self.reports_merged = 0
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._decode = jobs_client.codec.decode
+        self._topics = [
+            '$aws/things/{}/jobs/get/+'.format(thing_name),
+            '$aws/things/{}/jobs/+/update/+'.format(thing_name),
+            '$aws/things/{}/jobs/notify'.format(thing_name),
+        ]
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='JobRunner')
+
+        self._pending = {}  # type: Dict[str, _PendingRequest]
+        self._deadlines = []  # type: List[Tuple[float, str]]
+        self._queued = collections.deque()  # type: Deque[iotjobs.JobExecutionSummary]
+        self._known = set()  # type: Set[str]
+        self._claiming = 0
+        self._ready = collections.deque()  # type: Deque[Job]
+        self._running = {}  # type: Dict[str, Job]
+        # final status updates waiting for their response
+        self._reporting = 0
+        self._listing = False
+        self._list_again = False
+        self._idle = threading.Event()
+        self._started = None  # type: Optional[Future]
+        self._stopped = False
+        self._closed = False
+        self._timer_thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def running(self) -> List[str]:
+        """IDs of the jobs being run"""
+        with self._lock:
+            return list(self._running)
+
+    def start(self) -> Future:
+        """
+        Subscribe to the response and notify topics, then list the pending
+        job executions and start running them.
+
+        Returns:
+            A `Future` whose result is the first
+            `awsiot.iotjobs.GetPendingJobExecutionsResponse`.
+        """
+        if self._started is not None:
+            return self._started
+        self._started = Future()
+        self._timer_thread = threading.Thread(target=self._run_timers, name='JobRunner', daemon=True)
+        self._timer_thread.start()
+
+        suback_futures = []  # type: List[Future]
+        remaining = [len(self._topics)]
+
+        def on_suback(suback_future):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [f.exception() for f in suback_futures if f.exception() is not None]
+            if errors:
+                self._started.set_exception(errors[0])
+            else:
+                self._list()
+
+        try:
+            for topic in self._topics:
+                suback_future, _ = self.jobs_client.subscribe_raw(topic, self.qos, self._on_message)
+                suback_futures.append(suback_future)
+        except Exception as e:
+            self._started.set_exception(e)
+            return self._started
+        for suback_future in suback_futures:
+            suback_future.add_done_callback(on_suback)
+        return self._started
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until no job is pending, running or having its final status
+        reported. Returns False on timeout.
+        """
+        return self._idle.wait(timeout)
+
+    def stop(self, wait: bool = True):
+        """
+        Stop claiming jobs and unsubscribe.
+
+        Args:
+            wait: If true, wait for the running jobs to finish. Their final
+                status updates are still published, but the responses are
+                no longer awaited.
+        """
+        with self._lock:
+            self._stopped = True
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+            self._wake.notify()
+        for request in pending.values():
+            request.future.set_exception(RuntimeError("JobRunner stopped"))
+        for topic in self._topics:
+            self.jobs_client.unsubscribe(topic)
+
+    # requests
+
+    def _request(self, operation: str, request, publish: Callable) -> Future:
+        request.client_token = uuid.uuid4().hex
+        future = Future()  # type: Future
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError("JobRunner stopped"))
+                return future
+            self._pending[request.client_token] = _PendingRequest(future, operation)
+            heapq.heappush(self._deadlines, (time.monotonic() + self.timeout, request.client_token))
+            self._wake.notify()
+
+        def on_puback(pub_future):
+            if pub_future.exception() is not None:
+                self._fail(request.client_token, pub_future.exception())
+
+        try:
+            publish(request, self.qos).add_done_callback(on_puback)
+        except Exception as e:
+            self._fail(request.client_token, e)
+        return future
+
+    def _update(self, job_id: str, status: str, status_details: Optional[StatusDetails] = None,
+                **kwargs) -> Future:
+        request = iotjobs.UpdateJobExecutionRequest(
+            thing_name=self.thing_name, job_id=job_id, status=status, status_details=status_details, **kwargs)
+        return self._request('update', request, self.jobs_client.publish_update_job_execution)
+
+    def _fail(self, token: str, exception: BaseException):
+        with self._lock:
+            request = self._pending.pop(token, None)
+        if request is not None:
+            request.future.set_exception(exception)
+
+    def _on_message(self, topic: str, payload):
+        # $aws/things/<thing>/jobs/(get|<jobId>/update)/(accepted|rejected), or .../jobs/notify
+        parts = topic.split('/')
+        result = parts[-1]
+        if result == 'notify':
+            self._on_jobs_changed()
+            return
+        if result not in ('accepted', 'rejected'):
+            return
+        try:
+            payload_obj = self._decode(payload)
+        except Exception:
+            return
+        with self._lock:
+            request = self._pending.get(payload_obj.get('clientToken'))
+            if request is None or request.operation != parts[-2]:
+                return
+            del self._pending[payload_obj['clientToken']]
+
+        try:
+            if result == 'rejected':
+                request.future.set_exception(JobRequestError(iotjobs.RejectedError.from_payload(payload_obj)))
+            elif request.operation == 'get':
+                request.future.set_result(iotjobs.GetPendingJobExecutionsResponse.from_payload(payload_obj))
+            else:
+                request.future.set_result(iotjobs.UpdateJobExecutionResponse.from_payload(payload_obj))
+        except Exception as e:
+            request.future.set_exception(e)
+
+    # scheduling
+
+    def _on_jobs_changed(self):
+        with self._lock:
+            if self._listing:
+                self._list_again = True
+                return
+        self._list()
+
+    def _list(self):
+        with self._lock:
+            if self._stopped:
+                return
+            self._listing = True
+            self._list_again = False
+            self._idle.clear()
+        request = iotjobs.GetPendingJobExecutionsRequest(thing_name=self.thing_name)
+        self._request('get', request, self.jobs_client.publish_get_pending_job_executions).add_done_callback(
+            self._on_list)
+
+    def _on_list(self, list_future: Future):
+        error = list_future.exception()
+        with self._lock:
+            self._listing = False
+            list_again = self._list_again
+            if error is None:
+                response = list_future.result()
+                # jobs left in progress by a previous run are resumed
+                for summary in (response.in_progress_jobs or []) + (response.queued_jobs or []):
+                    if summary.job_id not in self._known:
+                        self._known.add(summary.job_id)
+                        self._queued.append(summary)
+        if self._started is not None and not self._started.done():
+            if error is None:
+                self._started.set_result(list_future.result())
+            else:
+                self._started.set_exception(error)
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+        if list_again:
+            self._list()
+        else:
+            self._dispatch()
+
+    def _dispatch(self):
+        claims = []
+        runs = []
+        with self._lock:
+            if self._stopped:
+                return
+            while self._ready and len(self._running) < self.max_workers:
+                job = self._ready.popleft()
+                self._running[job.job_id] = job
+                runs.append(job)
+            capacity = self.max_workers + self.prefetch - len(self._running) - len(self._ready) - self._claiming
+            while self._queued and capacity > 0:
+                claims.append(self._queued.popleft())
+                self._claiming += 1
+                capacity -= 1
+            if not (self._queued or self._ready or self._running or self._claiming or self._listing
+                    or self._reporting):
+                self._idle.set()
+        for summary in claims:
+            self._claim(summary)
+        for job in runs:
+            self._executor.submit(self._run, job)
+
+    def _claim(self, summary: iotjobs.JobExecutionSummary):
+        def on_claimed(update_future):
+            with self._lock:
+                self._claiming -= 1
+                if update_future.exception() is None:
+                    response = update_future.result()
+                    self._ready.append(Job(self, summary.job_id, response.job_document or {},
+                                           summary.execution_number))
+                    self.claimed += 1
+                else:
+                    # e.g. canceled or claimed by someone else meanwhile
+                    self._known.discard(summary.job_id)
+            self._dispatch()
+
+        self._update(summary.job_id, iotjobs.JobStatus.IN_PROGRESS,
+                     expected_version=summary.version_number,
+                     include_job_document=True,
+                     step_timeout_in_minutes=self.step_timeout_in_minutes).add_done_callback(on_claimed)
+
+    def _run(self, job: Job):
+        try:
+            result = self.handler(job)
+            status = iotjobs.JobStatus.SUCCEEDED
+        except Exception as e:
+            result = {'reason': '{}: {}'.format(type(e).__name__, e)}
+            status = iotjobs.JobStatus.FAILED
+
+        def on_done(update_future):
+            # until now, a listing could still show the job in progress
+            with self._lock:
+                self._known.discard(job.job_id)
+                self._reporting -= 1
+            self._on_update_done(update_future)
+            self._dispatch()
+
+        with job._update_lock:
+            with self._lock:
+                if status == iotjobs.JobStatus.SUCCEEDED:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                status_details = job._status_details
+                job._status_details = None
+                del self._running[job.job_id]
+                self._reporting += 1
+            if result:
+                status_details = dict(status_details or {}, **result)
+            self._update(job.job_id, status, status_details).add_done_callback(on_done)
+
+        with self._lock:
+            list_again = not self._queued and not self._listing
+        if list_again:
+            # more jobs may have been queued than were listed
+            self._list()
+        else:
+            self._dispatch()
+
+    @staticmethod
+    def _on_update_done(update_future: Future):
+        error = update_future.exception()
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+    # heartbeats and request timeouts
+
+    def _run_timers(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+        while True:
+            expired = []
+            heartbeats = []
+            with self._lock:
+                while not self._closed:
+                    now = time.monotonic()
+                    while self._deadlines and self._deadlines[0][0] <= now:
+                        _, token = heapq.heappop(self._deadlines)
+                        request = self._pending.pop(token, None)
+                        if request is not None:
+                            expired.append(request)
+                    if now >= next_heartbeat:
+                        next_heartbeat = now + self.heartbeat_interval
+                        heartbeats = [job for job in self._running.values() if self._needs_heartbeat(job)]
+                    if expired or heartbeats:
+                        break
+                    wake_at = next_heartbeat
+                    if self._deadlines:
+                        wake_at = min(wake_at, self._deadlines[0][0])
+                    self._wake.wait(wake_at - now)
+                if self._closed:
+                    return
+
+            for request in expired:
+                request.future.set_exception(TimeoutError("no response to jobs request"))
+            for job in heartbeats:
+                self._heartbeat(job)
+
+    def _needs_heartbeat(self, job: Job) -> bool:
+        return self.step_timeout_in_minutes is not None or job._status_details is not None
+
+    def _heartbeat(self, job: Job):
+        with job._update_lock:
+            with self._lock:
+                # the job may have finished since, its final update then went out
+                if job.job_id not in self._running or not self._needs_heartbeat(job):
+                    return
+                status_details = job._status_details
+                job._status_details = None
+                self.heartbeats += 1
+            self._update(job.job_id, iotjobs.JobStatus.IN_PROGRESS, status_details,
+                         step_timeout_in_minutes=self.step_timeout_in_minutes).add_done_callback(
+                self._on_update_done)
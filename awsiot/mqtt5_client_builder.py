@@ -30,6 +30,11 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
         The ClientBootstrap will default to the static default (Io.ClientBootstrap.get_or_create_static_default)
         if the argument is omitted or set to 'None'.
 
+    **tls_ctx** (:class:`awscrt.io.ClientTlsContext`): TLS context to use instead of building one from the other
+        arguments. Clients connecting with the same credentials can share the context of the first one, which
+        saves loading the certificate again for each (see :mod:`awsiot.connection_pool`). Any `tls_ctx` set within
+        `client_options` is replaced either way.
+
     **http_proxy_options** (:class:`awscrt.http.HttpProxyOptions`): HTTP proxy options to use
 
     **keep_alive_interval_sec** (`int`): The maximum time interval, in seconds, that is permitted to elapse
@@ -89,6 +94,10 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
     **topic_aliasing_options** (:class:`awscrt.mqtt5.TopicAliasingOptions`): Configuration options for how the client
         should use the topic aliasing features of MQTT5
 
+    **topic_alias_manager** (:class:`awsiot.mqtt5_topic_alias.TopicAliasManager`): Picks the outbound topic aliases
+        of the client's publishes. Outbound aliasing is set to `MANUAL` unless `topic_aliasing_options` are given.
+        Service clients apply it to their publishes when the client also has a `publish_router`.
+
     **retry_jitter_mode** (:class:`awscrt.mqtt5.ExponentialBackoffJitterMode`): How the reconnect delay is modified
         in order to smooth out the distribution of reconnection attempt timepoints for a large set of reconnecting
         clients.
@@ -120,6 +129,12 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
 
             *   `publish_packet`: (:class:`awscrt.mqtt5.PublishPacket`): Data model of an `MQTT5 PUBLISH <https://docs.oasis-open.org/mqtt/mqtt/v5.0/os/mqtt-v5.0-os.html#_Toc3901100>` _ packet.
 
+    **publish_router** (`bool`): If True, the client's publish callback is an
+        :class:`awsiot.mqtt5_router.PublishRouter`, and service clients given this client send their PUBLISH,
+        SUBSCRIBE and UNSUBSCRIBE packets themselves instead of going through an MQTT 3 adapter.
+        `on_publish_received` is then called by the router, after the service clients' callbacks for the message.
+        Ignored if `client_options` carry an `on_publish_callback_fn`. Default is False.
+
     **on_lifecycle_stopped** (`Callable`): Callback invoked for Lifecycle Event Stopped.
         The function should take the following arguments and return nothing:
 
@@ -167,6 +182,10 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
 
     **ca_bytes** (`bytes`): Override default trust store with CA certificates from these PEM formatted bytes.
 
+    **tls_context_cache** (:class:`awsiot.tls_context_cache.TlsContextCache`): Cache of the credential files
+        read and TLS contexts created, shared with other connections built with the same credentials.
+        Default is :data:`awsiot.tls_context_cache.default_cache`.
+
     **enable_metrics_collection** (`bool`): Whether to send the SDK version number in the CONNECT packet.
         Default is True.
 
@@ -179,6 +198,9 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
 import awscrt.auth
 import awscrt.io
 import awscrt.mqtt5
+from awsiot.mqtt5_router import PublishRouter
+import awsiot
+import awsiot.tls_context_cache
 import urllib.parse
 
 
@@ -219,12 +241,7 @@ def _get_metrics_str(current_username=""):
 
     if _metrics_str is None:
         try:
-            import pkg_resources
-            try:
-                version = pkg_resources.get_distribution("awsiotsdk").version
-                _metrics_str = "SDK=PythonV2&Version={}".format(version)
-            except pkg_resources.DistributionNotFound:
-                _metrics_str = "SDK=PythonV2&Version=dev"
+            _metrics_str = "SDK=PythonV2&Version={}".format(awsiot._sdk_version())
         except BaseException:
             _metrics_str = ""
 
@@ -295,6 +312,10 @@ def _builder(
         client_options.websocket_handshake_transform = websocket_handshake_transform
     if client_options.topic_aliasing_options is None:
         client_options.topic_aliasing_options = _get(kwargs, 'topic_aliasing_options')
+    topic_alias_manager = _get(kwargs, 'topic_alias_manager')
+    if topic_alias_manager is not None and client_options.topic_aliasing_options is None:
+        client_options.topic_aliasing_options = awscrt.mqtt5.TopicAliasingOptions(
+            outbound_behavior=awscrt.mqtt5.OutboundTopicAliasBehaviorType.MANUAL)
 
     # Connect Options
     if client_options.connect_options.client_id is None:
@@ -323,26 +344,42 @@ def _builder(
         client_options.connect_options.user_properties = _get(kwargs, 'user_properties')
 
     # Callbacks
+    router = None
     if client_options.on_publish_callback_fn is None:
-        client_options.on_publish_callback_fn = _get(kwargs, 'on_publish_received')
+        if _get(kwargs, 'publish_router', False):
+            router = PublishRouter(_get(kwargs, 'on_publish_received'))
+            client_options.on_publish_callback_fn = router
+        else:
+            client_options.on_publish_callback_fn = _get(kwargs, 'on_publish_received')
     if client_options.on_lifecycle_event_stopped_fn is None:
         client_options.on_lifecycle_event_stopped_fn = _get(kwargs, 'on_lifecycle_stopped')
     if client_options.on_lifecycle_event_attempting_connect_fn is None:
         client_options.on_lifecycle_event_attempting_connect_fn = _get(kwargs, 'on_lifecycle_attempting_connect')
     if client_options.on_lifecycle_event_connection_success_fn is None:
         client_options.on_lifecycle_event_connection_success_fn = _get(kwargs, 'on_lifecycle_connection_success')
+    if topic_alias_manager is not None:
+        on_connection_success = client_options.on_lifecycle_event_connection_success_fn
+
+        def on_lifecycle_connection_success(lifecycle_connect_success_data):
+            topic_alias_manager.on_connection_success(lifecycle_connect_success_data)
+            if on_connection_success is not None:
+                on_connection_success(lifecycle_connect_success_data)
+        client_options.on_lifecycle_event_connection_success_fn = on_lifecycle_connection_success
     if client_options.on_lifecycle_event_connection_failure_fn is None:
         client_options.on_lifecycle_event_connection_failure_fn = _get(kwargs, 'on_lifecycle_connection_failure')
     if client_options.on_lifecycle_event_disconnection_fn is None:
         client_options.on_lifecycle_event_disconnection_fn = _get(kwargs, 'on_lifecycle_disconnection')
 
+    tls_context_cache = _get(kwargs, 'tls_context_cache', awsiot.tls_context_cache.default_cache)
     ca_bytes = _get(kwargs, 'ca_bytes')
     ca_filepath = _get(kwargs, 'ca_filepath')
     ca_dirpath = _get(kwargs, 'ca_dirpath')
     if ca_bytes:
         tls_ctx_options.override_default_trust_store(ca_bytes)
     elif ca_filepath or ca_dirpath:
-        tls_ctx_options.override_default_trust_store_from_path(ca_dirpath, ca_filepath)
+        tls_ctx_options.override_default_trust_store_from_path(ca_dirpath)
+        if ca_filepath:
+            tls_ctx_options.override_default_trust_store(tls_context_cache.read(ca_filepath))
 
     if client_options.port is None:
         # prefer 443, even for direct MQTT connections, since it's less likely to be blocked by firewalls
@@ -354,9 +391,15 @@ def _builder(
     if client_options.port == 443 and awscrt.io.is_alpn_available() and use_custom_authorizer is False:
         tls_ctx_options.alpn_list = ['http/1.1'] if use_websockets else ['x-amzn-mqtt-ca']
 
-    tls_ctx = awscrt.io.ClientTlsContext(tls_ctx_options)
+    tls_ctx = _get(kwargs, 'tls_ctx')
+    if tls_ctx is None:
+        tls_ctx = tls_context_cache.get(tls_ctx_options)
     client_options.tls_ctx = tls_ctx
     client = awscrt.mqtt5.Client(client_options=client_options)
+    if router is not None:
+        router.attach(client)
+    if topic_alias_manager is not None:
+        topic_alias_manager.attach(client)
 
     return client
 
@@ -375,7 +418,9 @@ def mtls_from_path(cert_filepath, pri_key_filepath, **kwargs) -> awscrt.mqtt5.Cl
         pri_key_filepath (str): Path to private key file.
     """
     _check_required_kwargs(**kwargs)
-    tls_ctx_options = awscrt.io.TlsContextOptions.create_client_with_mtls_from_path(cert_filepath, pri_key_filepath)
+    tls_context_cache = _get(kwargs, 'tls_context_cache', awsiot.tls_context_cache.default_cache)
+    tls_ctx_options = awscrt.io.TlsContextOptions.create_client_with_mtls(
+        tls_context_cache.read(cert_filepath), tls_context_cache.read(pri_key_filepath))
     return _builder(tls_ctx_options, **kwargs)
 
 
@@ -455,9 +500,9 @@ def mtls_with_pkcs11(*,
 def mtls_with_pkcs12(*,
                      pkcs12_filepath: str,
                      pkcs12_password: str,
-                     **kwargs) -> awscrt.mqtt.Connection:
+                     **kwargs) -> awscrt.mqtt5.Client:
     """
-    This builder creates an :class:`awscrt.mqtt.Connection`, configured for an mTLS MQTT connection to AWS IoT,
+    This builder creates an :class:`awscrt.mqtt5.Client`, configured for an mTLS MQTT5 Client to AWS IoT,
     using a PKCS#12 certificate.
 
     NOTE: MacOS only
@@ -0,0 +1,186 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Dispatch of the messages received by an :class:`awscrt.mqtt5.Client` to
+callbacks registered per topic filter.
+
+An MQTT 5 client has a single callback for every PUBLISH it receives, set
+when the client is created. Service clients, such as
+:class:`awsiot.iotshadow.IotShadowClient`, need one per subscription: given
+an MQTT 5 client, they used to drive it through the MQTT 3 adapter returned
+by ``new_connection()``. When the client was created with a
+:class:`PublishRouter`, they instead send PUBLISH, SUBSCRIBE and UNSUBSCRIBE
+packets themselves and receive their messages from the router. Service
+clients sharing a client each keep their callbacks, and UNSUBSCRIBE is only
+sent once none of them needs the topic filter. Requests and responses are
+still matched by ``clientToken``, not by MQTT 5 correlation data.
+
+Routing is opt-in. Clients made by :mod:`awsiot.mqtt5_client_builder` get a
+router when it is passed ``publish_router=True``. Otherwise::
+
+    router = PublishRouter(on_publish_received)
+    client = mqtt5.Client(mqtt5.ClientOptions(..., on_publish_callback_fn=router))
+    router.attach(client)
+    shadow_client = iotshadow.IotShadowClient(client)
+"""
+
+__all__ = [
+    'PublishRouter',
+]
+
+from awscrt import mqtt5
+import sys
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional, Tuple
+import weakref
+
+# clients created with a router, and their router
+_routers = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+# the callbacks of a topic filter, with their owner, in the order they were added
+_Callbacks = Tuple[Tuple[Any, Callable[[mqtt5.PublishPacket], None]], ...]
+
+
+def _matches(filter_levels: Tuple[str, ...], topic: str) -> bool:
+    topic_levels = topic.split('/')
+    if topic.startswith('$') and filter_levels[0] in ('+', '#'):
+        # wildcards don't match the first level of $ topics
+        return False
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _added(callbacks: _Callbacks, owner: Any, callback: Callable[[mqtt5.PublishPacket], None]) -> _Callbacks:
+    for i, (existing_owner, _) in enumerate(callbacks):
+        if existing_owner is owner:
+            return callbacks[:i] + ((owner, callback),) + callbacks[i + 1:]
+    return callbacks + ((owner, callback),)
+
+
+def _removed(callbacks: _Callbacks, owner: Any) -> _Callbacks:
+    return tuple(entry for entry in callbacks if entry[0] is not owner)
+
+
+class PublishRouter:
+    """
+    ``on_publish_callback_fn`` of an :class:`awscrt.mqtt5.Client` calling
+    callbacks per topic filter.
+
+    Several owners, such as service clients sharing the MQTT 5 client, can
+    each have a callback for the same topic filter. Each is called with the
+    messages matching it, and removed without affecting the others.
+
+    Args:
+        on_publish_received: (Optional) Callback invoked with the
+            :class:`awscrt.mqtt5.PublishReceivedData` of every message, routed
+            or not, as if it was the client's own callback.
+
+    Attributes:
+        routed (int): Messages that matched a topic filter.
+        unrouted (int): Messages that matched no topic filter.
+    """
+
+    def __init__(self, on_publish_received: Optional[Callable[[mqtt5.PublishReceivedData], None]] = None):
+        self._on_publish_received = on_publish_received
+        self._lock = threading.Lock()
+        # replaced rather than modified, so messages are routed without the lock
+        self._exact = {}  # type: Dict[str, _Callbacks]
+        self._wildcards = ()  # type: Tuple[Tuple[str, Tuple[str, ...], _Callbacks], ...]
+        self.routed = 0
+        self.unrouted = 0
+
+    @staticmethod
+    def of(client: mqtt5.Client) -> Optional['PublishRouter']:
+        """Return the router attached to a client, or None"""
+        return _routers.get(client)
+
+    def attach(self, client: mqtt5.Client):
+        """
+        Tell service clients that this router is the ``on_publish_callback_fn``
+        of `client`.
+        """
+        _routers[client] = self
+
+    def add(self, topic_filter: str, callback: Callable[[mqtt5.PublishPacket], None], owner: Any = None):
+        """
+        Call `callback` with the PUBLISH packets whose topic matches `topic_filter`,
+        in place of any callback `owner` had for it. The callbacks of other
+        owners are kept.
+        """
+        with self._lock:
+            if '+' in topic_filter or '#' in topic_filter:
+                wildcards = list(self._wildcards)
+                for i, (wildcard, filter_levels, callbacks) in enumerate(wildcards):
+                    if wildcard == topic_filter:
+                        wildcards[i] = (wildcard, filter_levels, _added(callbacks, owner, callback))
+                        break
+                else:
+                    wildcards.append((topic_filter, tuple(topic_filter.split('/')), ((owner, callback),)))
+                self._wildcards = tuple(wildcards)
+            else:
+                exact = dict(self._exact)
+                exact[topic_filter] = _added(exact.get(topic_filter, ()), owner, callback)
+                self._exact = exact
+
+    def remove(self, topic_filter: str, owner: Any = None) -> bool:
+        """
+        Stop calling the callback `owner` has for `topic_filter`.
+
+        Returns:
+            True if no callback is left for `topic_filter`, so nobody needs
+            its subscription anymore.
+        """
+        with self._lock:
+            if topic_filter in self._exact:
+                exact = dict(self._exact)
+                callbacks = _removed(exact.pop(topic_filter), owner)
+                if callbacks:
+                    exact[topic_filter] = callbacks
+                self._exact = exact
+                return not callbacks
+            wildcards = []
+            left = ()  # type: _Callbacks
+            for wildcard, filter_levels, callbacks in self._wildcards:
+                if wildcard == topic_filter:
+                    left = _removed(callbacks, owner)
+                    if not left:
+                        continue
+                    callbacks = left
+                wildcards.append((wildcard, filter_levels, callbacks))
+            self._wildcards = tuple(wildcards)
+            return not left
+
+    def __call__(self, publish_received_data: mqtt5.PublishReceivedData):
+        packet = publish_received_data.publish_packet
+        topic = packet.topic
+        routed = False
+        callbacks = self._exact.get(topic)
+        if callbacks is not None:
+            routed = True
+            for _, callback in callbacks:
+                self._call(callback, packet)
+        for _, filter_levels, callbacks in self._wildcards:
+            if _matches(filter_levels, topic):
+                routed = True
+                for _, callback in callbacks:
+                    self._call(callback, packet)
+        if routed:
+            self.routed += 1
+        else:
+            self.unrouted += 1
+        if self._on_publish_received is not None:
+            self._on_publish_received(publish_received_data)
+
+    @staticmethod
+    def _call(callback: Callable[[mqtt5.PublishPacket], None], packet: mqtt5.PublishPacket):
+        try:
+            callback(packet)
+        except Exception:
+            # don't let one callback keep the message from the others
+            traceback.print_exc(file=sys.stderr)
@@ -0,0 +1,232 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Outbound MQTT 5 topic aliases for the topics a client publishes to most.
+
+Once a topic alias is bound to a topic on a connection, a PUBLISH can carry
+the 3 byte alias instead of the topic. Telemetry topics such as
+``$aws/things/<thing>/shadow/name/<name>/update`` are long and published
+to every few seconds, while brokers accept only a few aliases per
+connection (8 for AWS IoT Core). :class:`TopicAliasManager` picks the
+topics that get one, by frequency (LFU) or recency (LRU), and awscrt sends
+the topic only when an alias is bound or rebound::
+
+    aliases = TopicAliasManager()
+    client = mqtt5_client_builder.mtls_from_path(..., topic_alias_manager=aliases)
+    client.publish(aliases.apply(mqtt5.PublishPacket(topic=topic, payload=payload, qos=mqtt5.QoS.AT_LEAST_ONCE)))
+    print(aliases.stats.bytes_saved_per_publish)
+
+Service clients using the client natively (see :mod:`awsiot.mqtt5_router`)
+apply the manager to their own publishes.
+
+Without :mod:`awsiot.mqtt5_client_builder`, set the client's outbound
+aliasing to ``MANUAL``, call :meth:`TopicAliasManager.on_connection_success`
+from its connection success callback, then :meth:`TopicAliasManager.attach`
+the manager to the client.
+"""
+
+__all__ = [
+    'LFU',
+    'LRU',
+    'TopicAliasManager',
+    'TopicAliasStats',
+]
+
+from awscrt import mqtt5
+import collections
+import threading
+from typing import Dict, Optional
+import weakref
+
+LFU = 'lfu'
+LRU = 'lru'
+
+# bytes of the Topic Alias property, sent in place of the topic
+_ALIAS_PROPERTY_SIZE = 3
+
+# clients and their manager
+_managers = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+class TopicAliasStats:
+    """
+    Topic alias metrics of a :class:`TopicAliasManager`.
+
+    Attributes:
+        publishes (int): Publishes the manager was asked about.
+        aliased (int): Publishes sent with an alias instead of their topic.
+        bindings (int): Publishes binding an alias to a topic, which carry both.
+        evictions (int): Aliases taken from a topic for another one.
+        bytes_saved (int): Topic bytes not sent, less the bytes of the alias
+            properties. Negative while bindings outweigh the savings.
+    """
+
+    __slots__ = ['publishes', 'aliased', 'bindings', 'evictions', 'bytes_saved']
+
+    def __init__(self):
+        self.publishes = 0
+        self.aliased = 0
+        self.bindings = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    @property
+    def bytes_saved_per_publish(self) -> float:
+        """Mean bytes saved per publish"""
+        return self.bytes_saved / self.publishes if self.publishes else 0.0
+
+    def __repr__(self):
+        return 'TopicAliasStats({}, bytes_saved_per_publish={:.1f})'.format(
+            ', '.join('{}={}'.format(slot, getattr(self, slot)) for slot in self.__slots__),
+            self.bytes_saved_per_publish)
+
+
+class _Alias:
+    __slots__ = ['number', 'saving', 'bound']
+
+    def __init__(self, number: int, saving: int):
+        self.number = number
+        # bytes saved by each publish once bound
+        self.saving = saving
+        self.bound = False
+
+
+class TopicAliasManager:
+    """
+    Assigns outbound topic aliases, within the ``topic_alias_maximum`` of the
+    broker, to the topics worth one.
+
+    A topic is considered once it was published to `min_publishes` times
+    within a `decay_interval`. If all aliases are taken, the ``"lfu"``
+    policy takes the alias of the least frequently published topic if the
+    new one is published more often, the ``"lru"`` policy takes the alias of
+    the topic published least recently.
+
+    Args:
+        policy: ``"lfu"`` (default) or ``"lru"``.
+        maximum: (Optional) Most aliases to use, at most the broker's
+            ``topic_alias_maximum``.
+        min_publishes: Publishes to a topic before it gets an alias.
+        min_length: Topics shorter than this many bytes never get one.
+        decay_interval: Publishes after which publish counts are halved, so
+            topics that were hot in the past give way.
+
+    Attributes:
+        stats (TopicAliasStats): Alias metrics, kept across connections.
+    """
+
+    def __init__(self, policy: str = LFU, maximum: Optional[int] = None, min_publishes: int = 2,
+                 min_length: int = 8, decay_interval: int = 4096):
+        if policy not in (LFU, LRU):
+            raise ValueError("policy must be 'lfu' or 'lru'")
+        self.policy = policy
+        self.maximum = maximum
+        self.min_publishes = min_publishes
+        self.min_length = max(min_length, _ALIAS_PROPERTY_SIZE + 1)
+        self.decay_interval = decay_interval
+        self.stats = TopicAliasStats()
+        self._lock = threading.Lock()
+        self._counts = {}  # type: Dict[str, int]
+        self._until_decay = decay_interval
+        self._aliases = collections.OrderedDict()  # type: collections.OrderedDict
+        self._free = []  # type: list
+
+    @staticmethod
+    def of(client: mqtt5.Client) -> Optional['TopicAliasManager']:
+        """Return the manager attached to a client, or None"""
+        return _managers.get(client)
+
+    def attach(self, client: mqtt5.Client):
+        """Tell service clients to use this manager for the publishes of `client`"""
+        _managers[client] = self
+
+    @property
+    def aliases(self) -> Dict[str, int]:
+        """Alias of each topic that has one"""
+        with self._lock:
+            return {topic: alias.number for topic, alias in self._aliases.items()}
+
+    def on_connection_success(self, lifecycle_connect_success_data: mqtt5.LifecycleConnectSuccessData):
+        """
+        Start over with the aliases the broker accepts on a new connection.
+        Meant to be called from the client's ``on_lifecycle_event_connection_success_fn``.
+        """
+        self.reset(lifecycle_connect_success_data.negotiated_settings.topic_alias_maximum_to_server or 0)
+
+    def reset(self, topic_alias_maximum: int):
+        """
+        Forget the aliases, which don't outlive a connection, and use up to
+        `topic_alias_maximum` from now on.
+        """
+        if self.maximum is not None:
+            topic_alias_maximum = min(topic_alias_maximum, self.maximum)
+        with self._lock:
+            self._aliases.clear()
+            self._free = list(range(topic_alias_maximum, 0, -1))
+
+    def apply(self, publish_packet: mqtt5.PublishPacket) -> mqtt5.PublishPacket:
+        """Set the topic alias of a PUBLISH packet, and return it"""
+        publish_packet.topic_alias = self.alias(publish_packet.topic)
+        return publish_packet
+
+    def alias(self, topic: str) -> Optional[int]:
+        """
+        Return the alias to publish `topic` with, or None, and count the
+        publish in :attr:`stats`.
+        """
+        stats = self.stats
+        with self._lock:
+            stats.publishes += 1
+            count = self._counts.get(topic, 0) + 1
+            self._counts[topic] = count
+            self._until_decay -= 1
+            if self._until_decay <= 0:
+                self._decay()
+
+            alias = self._aliases.get(topic)
+            if alias is None:
+                if count < self.min_publishes:
+                    return None
+                alias = self._assign(topic, count)
+                if alias is None:
+                    return None
+            elif self.policy == LRU:
+                self._aliases.move_to_end(topic)
+
+            if alias.bound:
+                stats.aliased += 1
+                stats.bytes_saved += alias.saving
+            else:
+                alias.bound = True
+                stats.bindings += 1
+                stats.bytes_saved -= _ALIAS_PROPERTY_SIZE
+            return alias.number
+
+    def _assign(self, topic: str, count: int) -> Optional[_Alias]:
+        length = len(topic.encode())
+        if length < self.min_length:
+            return None
+        if self._free:
+            number = self._free.pop()
+        elif not self._aliases:
+            # no aliases on this connection
+            return None
+        else:
+            if self.policy == LRU:
+                victim = next(iter(self._aliases))
+            else:
+                counts = self._counts
+                victim = min(self._aliases, key=lambda aliased: counts.get(aliased, 0))
+                if counts.get(victim, 0) >= count:
+                    return None
+            number = self._aliases.pop(victim).number
+            self.stats.evictions += 1
+        alias = _Alias(number, length - _ALIAS_PROPERTY_SIZE)
+        self._aliases[topic] = alias
+        return alias
+
+    def _decay(self):
+        self._until_decay = self.decay_interval
+        self._counts = {topic: count // 2 for topic, count in self._counts.items()
+                        if count > 1 or topic in self._aliases}
@@ -111,6 +111,10 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
 
     **ca_bytes** (`bytes`): Override default trust store with CA certificates from these PEM formatted bytes.
 
+    **tls_context_cache** (:class:`awsiot.tls_context_cache.TlsContextCache`): Cache of the credential files
+        read and TLS contexts created, shared with other connections built with the same credentials.
+        Default is :data:`awsiot.tls_context_cache.default_cache`.
+
     **enable_metrics_collection** (`bool`): Whether to send the SDK version number in the CONNECT packet.
         Default is True.
 
@@ -123,6 +127,8 @@ Optional Keyword Arguments (omit, or set `None` to get default value):
 import awscrt.auth
 import awscrt.io
 import awscrt.mqtt
+import awsiot
+import awsiot.tls_context_cache
 import urllib.parse
 
 
@@ -158,12 +164,7 @@ def _get_metrics_str(current_username=""):
 
     if _metrics_str is None:
         try:
-            import pkg_resources
-            try:
-                version = pkg_resources.get_distribution("awsiotsdk").version
-                _metrics_str = "SDK=PythonV2&Version={}".format(version)
-            except pkg_resources.DistributionNotFound:
-                _metrics_str = "SDK=PythonV2&Version=dev"
+            _metrics_str = "SDK=PythonV2&Version={}".format(awsiot._sdk_version())
         except BaseException:
             _metrics_str = ""
 
@@ -183,13 +184,16 @@ def _builder(
         use_custom_authorizer=False,
         **kwargs):
 
+    tls_context_cache = _get(kwargs, 'tls_context_cache', awsiot.tls_context_cache.default_cache)
     ca_bytes = _get(kwargs, 'ca_bytes')
     ca_filepath = _get(kwargs, 'ca_filepath')
     ca_dirpath = _get(kwargs, 'ca_dirpath')
     if ca_bytes:
         tls_ctx_options.override_default_trust_store(ca_bytes)
     elif ca_filepath or ca_dirpath:
-        tls_ctx_options.override_default_trust_store_from_path(ca_dirpath, ca_filepath)
+        tls_ctx_options.override_default_trust_store_from_path(ca_dirpath)
+        if ca_filepath:
+            tls_ctx_options.override_default_trust_store(tls_context_cache.read(ca_filepath))
 
     port = _get(kwargs, 'port')
     if port is None:
@@ -228,7 +232,7 @@ def _builder(
     if client_bootstrap is None:
         client_bootstrap = awscrt.io.ClientBootstrap.get_or_create_static_default()
 
-    tls_ctx = awscrt.io.ClientTlsContext(tls_ctx_options)
+    tls_ctx = tls_context_cache.get(tls_ctx_options)
     mqtt_client = awscrt.mqtt.Client(client_bootstrap, tls_ctx)
 
     proxy_options = kwargs.get('http_proxy_options', kwargs.get('websocket_proxy_options', None))
@@ -272,7 +276,9 @@ def mtls_from_path(cert_filepath, pri_key_filepath, **kwargs) -> awscrt.mqtt.Con
         pri_key_filepath (str): Path to private key file.
     """
     _check_required_kwargs(**kwargs)
-    tls_ctx_options = awscrt.io.TlsContextOptions.create_client_with_mtls_from_path(cert_filepath, pri_key_filepath)
+    tls_context_cache = _get(kwargs, 'tls_context_cache', awsiot.tls_context_cache.default_cache)
+    tls_ctx_options = awscrt.io.TlsContextOptions.create_client_with_mtls(
+        tls_context_cache.read(cert_filepath), tls_context_cache.read(pri_key_filepath))
     return _builder(tls_ctx_options, **kwargs)
 
 
@@ -0,0 +1,572 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Pipelined fleet provisioning for :class:`awsiot.iotidentity.IotIdentityClient`.
+
+Provisioning one device takes a key pair and CSR, a ``CreateCertificateFromCsr``
+exchange, then a ``RegisterThing`` exchange. :class:`FleetProvisioner` keeps
+a pool of keys and CSRs generated ahead of time in worker processes, and
+keeps several exchanges of each kind in flight on the connection, so the
+stages of consecutive devices overlap::
+
+    provisioner = FleetProvisioner(iotidentity.IotIdentityClient(mqtt_connection), 'MeterTemplate')
+    provisioner.start().result()
+    futures = [provisioner.provision({'SerialNumber': serial}) for serial in serials]
+    for future in futures:
+        result = future.result()
+        store(result.thing_name, result.certificate_pem, result.private_key_pem)
+    print(provisioner.stats)
+
+:func:`generate_key_and_csr`, the default key factory, needs the optional
+`cryptography <https://pypi.org/project/cryptography/>`_ package.
+
+Fleet Provisioning responses carry no client token. Certificates are matched
+to their CSR by public key, so several ``CreateCertificateFromCsr`` requests
+can be in flight when the keys have a known public key and ``cryptography``
+is installed. Otherwise, and for ``RegisterThing``, whose responses can't be
+told apart, one request of the kind is in flight at a time. A rejection is
+given to the device it is for once the other requests in flight are
+accepted. Since a response arriving after its request timed out could be
+taken for the response to another one, the provisioner closes on the first
+timeout. Use one provisioner per connection.
+"""
+
+__all__ = [
+    'FleetProvisioner',
+    'KeyAndCsr',
+    'ProvisioningError',
+    'ProvisioningResult',
+    'StageStats',
+    'generate_key_and_csr',
+]
+
+from awscrt import mqtt
+from awsiot import iotidentity
+import collections
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, TimeoutError
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+STAGES = ('keys', 'certificate', 'register')
+
+
+class KeyAndCsr:
+    """
+    A private key and a certificate signing request for it.
+
+    Attributes:
+        private_key_pem (str): PEM of the private key.
+        csr_pem (str): PEM of the CSR.
+        public_key_der (Optional[bytes]): DER of the public key, used to match
+            the certificate created from the CSR. None if unknown.
+    """
+
+    __slots__ = ['private_key_pem', 'csr_pem', 'public_key_der']
+
+    def __init__(self, private_key_pem: str, csr_pem: str, public_key_der: Optional[bytes] = None):
+        self.private_key_pem = private_key_pem
+        self.csr_pem = csr_pem
+        self.public_key_der = public_key_der
+
+    def __getstate__(self):
+        # returned from worker processes
+        return (self.private_key_pem, self.csr_pem, self.public_key_der)
+
+    def __setstate__(self, state):
+        self.private_key_pem, self.csr_pem, self.public_key_der = state
+
+
+def generate_key_and_csr(key_type: str = 'ec', common_name: str = 'AWS IoT Certificate') -> KeyAndCsr:
+    """
+    Generate a private key and a CSR for it. Requires the ``cryptography`` package.
+
+    Args:
+        key_type: ``"ec"`` for a P-256 key or ``"rsa"`` for a 2048-bit RSA key.
+        common_name: Subject common name of the CSR. AWS IoT ignores it.
+    """
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+        from cryptography.x509.oid import NameOID
+    except ImportError as e:
+        raise ImportError("generate_key_and_csr() requires the cryptography package") from e
+
+    if key_type == 'ec':
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif key_type == 'rsa':
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError("key_type must be 'ec' or 'rsa'")
+    csr = x509.CertificateSigningRequestBuilder().subject_name(
+        x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])).sign(key, hashes.SHA256())
+    return KeyAndCsr(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                          serialization.NoEncryption()).decode(),
+        csr.public_bytes(serialization.Encoding.PEM).decode(),
+        _public_key_der(key.public_key()))
+
+
+def _public_key_der(public_key) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    return public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def _certificate_public_key_der(certificate_pem: str) -> Optional[bytes]:
+    try:
+        from cryptography import x509
+    except ImportError:
+        return None
+    try:
+        return _public_key_der(x509.load_pem_x509_certificate(certificate_pem.encode()).public_key())
+    except ValueError:
+        return None
+
+
+class ProvisioningError(Exception):
+    """
+    The Fleet Provisioning service rejected a request.
+    """
+
+    def __init__(self, stage: str, error_response: iotidentity.ErrorResponse):
+        super().__init__('{}: {} {}'.format(stage, error_response.error_code, error_response.error_message))
+        #: Stage of the rejected request, ``"certificate"`` or ``"register"``
+        self.stage = stage  # type: str
+        #: `awsiot.iotidentity.ErrorResponse` sent by the service
+        self.error_response = error_response  # type: iotidentity.ErrorResponse
+
+
+class ProvisioningResult:
+    """
+    A provisioned device.
+
+    Attributes:
+        thing_name (str): Name of the registered thing.
+        device_configuration (Dict[str, str]): Device configuration of the template.
+        certificate_id (str): ID of the certificate.
+        certificate_pem (str): The certificate.
+        private_key_pem (str): Private key of the certificate.
+        parameters (Dict[str, str]): Template parameters the device was registered with.
+    """
+
+    __slots__ = ['thing_name', 'device_configuration', 'certificate_id', 'certificate_pem',
+                 'private_key_pem', 'parameters']
+
+    def __init__(self, **kwargs):
+        for slot in self.__slots__:
+            setattr(self, slot, kwargs.get(slot))
+
+
+class StageStats:
+    """
+    Throughput and latency of one provisioning stage, see
+    :attr:`FleetProvisioner.stats`.
+
+    Attributes:
+        completed (int): Devices that went through the stage.
+        failed (int): Devices that failed in the stage.
+        in_flight (int): Devices in the stage, including those waiting for it.
+        total_latency (float): Sum of the seconds devices spent in the stage.
+            For the certificate and register stages, that is from the publish
+            of the request to the response.
+        max_latency (float): Longest time a device spent in the stage.
+    """
+
+    __slots__ = ['completed', 'failed', 'in_flight', 'total_latency', 'max_latency', '_first', '_last']
+
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._first = None  # type: Optional[float]
+        self._last = None  # type: Optional[float]
+
+    @property
+    def mean_latency(self) -> float:
+        """Mean seconds a device spent in the stage"""
+        return self.total_latency / self.completed if self.completed else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Devices per second through the stage, since the first one entered it"""
+        if not self.completed or self._last == self._first:
+            return 0.0
+        return self.completed / (self._last - self._first)
+
+    def _enter(self, now: float):
+        self.in_flight += 1
+        if self._first is None:
+            self._first = now
+
+    def _leave(self, started: float, now: float, failed: bool = False):
+        self.in_flight -= 1
+        if failed:
+            self.failed += 1
+            return
+        latency = now - started
+        self.completed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self._last = now
+
+    def __repr__(self):
+        return 'StageStats(completed={}, failed={}, in_flight={}, mean_latency={:.3f}, throughput={:.1f})'.format(
+            self.completed, self.failed, self.in_flight, self.mean_latency, self.throughput)
+
+
+class _Device:
+    __slots__ = ['parameters', 'future', 'keys', 'certificate', 'stage_started']
+
+    def __init__(self, parameters: Dict[str, str], future: Future):
+        self.parameters = parameters
+        self.future = future
+        self.keys = None  # type: Optional[KeyAndCsr]
+        self.certificate = None  # type: Optional[iotidentity.CreateCertificateFromCsrResponse]
+        self.stage_started = 0.0
+
+
+class FleetProvisioner:
+    """
+    Provisions devices through one template, with keys generated ahead of
+    time and several requests in flight.
+
+    Args:
+        identity_client: `awsiot.iotidentity.IotIdentityClient` to use.
+        template_name: Name of the provisioning template.
+        key_factory: Called without arguments in `key_executor` to create a
+            :class:`KeyAndCsr`. Must be picklable for a process pool.
+        key_executor: (Optional) Executor generating the keys. A
+            `ProcessPoolExecutor` by default, shut down by :meth:`close`.
+        pool_size: Number of keys generated ahead of time.
+        max_in_flight: Highest number of ``CreateCertificateFromCsr``
+            requests awaiting a response at once, when their responses can
+            be matched to them by public key.
+        qos: Quality of Service of the subscriptions and requests.
+        timeout: Seconds to wait for each response. The provisioner closes,
+            failing the devices being provisioned, if a response doesn't
+            come in time.
+    """
+
+    def __init__(self,
+                 identity_client: iotidentity.IotIdentityClient,
+                 template_name: str,
+                 key_factory: Callable[[], KeyAndCsr] = generate_key_and_csr,
+                 key_executor: Optional[Executor] = None,
+                 pool_size: int = 8,
+                 max_in_flight: int = 4,
+                 qos: int = mqtt.QoS.AT_LEAST_ONCE,
+                 timeout: float = 30.0):
+        if pool_size < 0:
+            raise ValueError("pool_size must not be negative")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.identity_client = identity_client
+        self.template_name = template_name
+        self.key_factory = key_factory
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.qos = qos
+        self.timeout = timeout
+
+        self._own_executor = key_executor is None
+        self._key_executor = key_executor if key_executor is not None else ProcessPoolExecutor()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._key_pool = collections.deque()  # type: Deque[Future]
+        # waiting for a free slot, then awaiting the response, per stage
+        self._waiting = {'certificate': collections.deque(), 'register': collections.deque()}
+        self._in_flight = {'certificate': collections.deque(), 'register': collections.deque()}
+        # rejections not given to a device yet, as there were several in flight
+        self._rejections = {'certificate': collections.deque(), 'register': collections.deque()}
+        self._stats = {stage: StageStats() for stage in STAGES}
+        self._started = None  # type: Optional[Future]
+        self._closed = False
+
+    @property
+    def stats(self) -> Dict[str, StageStats]:
+        """
+        Throughput and latency of the ``"keys"``, ``"certificate"`` and
+        ``"register"`` stages. The keys stage measures how long devices
+        waited for their keys, which is close to zero while the pool keeps up.
+        """
+        return self._stats
+
+    def start(self) -> Future:
+        """
+        Subscribe to the responses and start filling the key pool.
+
+        Returns:
+            A `Future` whose result is None once subscribed.
+        """
+        if self._started is not None:
+            return self._started
+        self._started = Future()
+        with self._lock:
+            for _ in range(self.pool_size):
+                self._key_pool.append(self._key_executor.submit(self.key_factory))
+        threading.Thread(target=self._expire, name='FleetProvisioner', daemon=True).start()
+
+        client = self.identity_client
+        csr_request = iotidentity.CreateCertificateFromCsrSubscriptionRequest()
+        register_request = iotidentity.RegisterThingSubscriptionRequest(template_name=self.template_name)
+        subscriptions = [
+            client.subscribe_to_create_certificate_from_csr_accepted(
+                csr_request, self.qos, self._on_certificate)[0],
+            client.subscribe_to_create_certificate_from_csr_rejected(
+                csr_request, self.qos, lambda error: self._on_rejected('certificate', error))[0],
+            client.subscribe_to_register_thing_accepted(
+                register_request, self.qos, self._on_registered)[0],
+            client.subscribe_to_register_thing_rejected(
+                register_request, self.qos, lambda error: self._on_rejected('register', error))[0],
+        ]
+        remaining = [len(subscriptions)]
+
+        def on_suback(suback_future):
+            with self._lock:
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if self._started.done():
+                return
+            if suback_future.exception() is not None:
+                self._started.set_exception(suback_future.exception())
+            elif done:
+                self._started.set_result(None)
+
+        for subscription in subscriptions:
+            subscription.add_done_callback(on_suback)
+        return self._started
+
+    def provision(self, parameters: Optional[Dict[str, str]] = None) -> Future:
+        """
+        Provision one device.
+
+        Args:
+            parameters: (Optional) Template parameters.
+
+        Returns:
+            A `Future` whose result is a :class:`ProvisioningResult`. Its
+            exception is a :class:`ProvisioningError` if a request was
+            rejected, a `concurrent.futures.TimeoutError` if a response to
+            it or to another device's request didn't come in time, or the
+            error of the key factory or publish.
+        """
+        if self._started is None:
+            raise RuntimeError("FleetProvisioner.start() wasn't called")
+        device = _Device(parameters or {}, Future())
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FleetProvisioner is closed")
+            keys = self._key_pool.popleft() if self._key_pool else self._key_executor.submit(self.key_factory)
+            if self.pool_size:
+                self._key_pool.append(self._key_executor.submit(self.key_factory))
+            device.stage_started = now
+            self._stats['keys']._enter(now)
+        keys.add_done_callback(lambda keys_future: self._on_keys(device, keys_future))
+        return device.future
+
+    def provision_many(self, parameters: List[Dict[str, str]]) -> List[Future]:
+        """
+        Provision several devices, see :meth:`provision`.
+        """
+        return [self.provision(p) for p in parameters]
+
+    def close(self):
+        """
+        Fail the devices being provisioned and stop generating keys.
+        """
+        self._close(RuntimeError("FleetProvisioner closed"))
+
+    def _close(self, error: BaseException):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            now = time.monotonic()
+            devices = []
+            for stage in ('certificate', 'register'):
+                for queue in (self._waiting[stage], self._in_flight[stage]):
+                    for device in queue:
+                        self._stats[stage]._leave(device.stage_started, now, failed=True)
+                    devices += queue
+                    queue.clear()
+            pool, self._key_pool = list(self._key_pool), collections.deque()
+            self._wake.notify()
+        for keys in pool:
+            keys.cancel()
+        for device in devices:
+            if not device.future.done():
+                device.future.set_exception(error)
+        if self._own_executor:
+            self._key_executor.shutdown(wait=False)
+
+    def _on_keys(self, device: _Device, keys_future: Future):
+        now = time.monotonic()
+        error = None if keys_future.cancelled() else keys_future.exception()
+        with self._lock:
+            failed = keys_future.cancelled() or error is not None or self._closed
+            self._stats['keys']._leave(device.stage_started, now, failed)
+            if not failed:
+                device.keys = keys_future.result()
+                self._enter('certificate', device, now)
+        if failed:
+            if not device.future.done():
+                device.future.set_exception(error or RuntimeError("FleetProvisioner closed"))
+        else:
+            self._send('certificate')
+
+    def _enter(self, stage: str, device: _Device, now: float):
+        # called with the lock held
+        device.stage_started = now
+        self._stats[stage]._enter(now)
+        self._waiting[stage].append(device)
+
+    def _send(self, stage: str):
+        sends = []
+        with self._lock:
+            waiting = self._waiting[stage]
+            in_flight = self._in_flight[stage]
+            while waiting and len(in_flight) < self._max_in_flight(stage, waiting[0]) and not self._closed:
+                device = waiting.popleft()
+                device.stage_started = time.monotonic()
+                in_flight.append(device)
+                sends.append(device)
+            if sends:
+                self._wake.notify()
+
+        for device in sends:
+            try:
+                if stage == 'certificate':
+                    future = self.identity_client.publish_create_certificate_from_csr(
+                        iotidentity.CreateCertificateFromCsrRequest(certificate_signing_request=device.keys.csr_pem),
+                        self.qos)
+                else:
+                    future = self.identity_client.publish_register_thing(
+                        iotidentity.RegisterThingRequest(
+                            template_name=self.template_name,
+                            certificate_ownership_token=device.certificate.certificate_ownership_token,
+                            parameters=device.parameters),
+                        self.qos)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda pub_future, d=device: self._on_puback(stage, d, pub_future))
+
+    def _on_puback(self, stage: str, device: _Device, pub_future: Future):
+        if pub_future.exception() is not None:
+            self._fail(stage, device, pub_future.exception())
+
+    def _max_in_flight(self, stage: str, device: _Device) -> int:
+        # called with the lock held, several requests only if their responses can be told apart
+        if stage == 'certificate' and device.keys.public_key_der is not None and \
+                all(d.keys.public_key_der is not None for d in self._in_flight[stage]):
+            return self.max_in_flight
+        return 1
+
+    def _take(self, stage: str, public_key_der: Optional[bytes] = None) -> Optional[_Device]:
+        # called with the lock held, the device an accepted response is for, None if it can't be told
+        in_flight = self._in_flight[stage]
+        if public_key_der is not None:
+            for device in in_flight:
+                if device.keys.public_key_der == public_key_der:
+                    in_flight.remove(device)
+                    return device
+        # the only request in flight, unless its key is known and differs
+        if len(in_flight) == 1 and (public_key_der is None or in_flight[0].keys.public_key_der is None):
+            return in_flight.popleft()
+        return None
+
+    def _rejected_devices(self, stage: str) -> List[Tuple[_Device, iotidentity.ErrorResponse]]:
+        # called with the lock held, once as many requests were rejected as are in flight, all of them were
+        in_flight = self._in_flight[stage]
+        rejections = self._rejections[stage]
+        if not rejections or len(rejections) < len(in_flight):
+            return []
+        rejected = list(zip(in_flight, rejections))
+        in_flight.clear()
+        rejections.clear()
+        return rejected
+
+    def _on_certificate(self, response: iotidentity.CreateCertificateFromCsrResponse):
+        public_key_der = _certificate_public_key_der(response.certificate_pem or '')
+        now = time.monotonic()
+        with self._lock:
+            device = self._take('certificate', public_key_der)
+            if device is None:
+                # a response to another client, or that can't be matched and will time out
+                return
+            self._stats['certificate']._leave(device.stage_started, now)
+            device.certificate = response
+            self._enter('register', device, now)
+            rejected = self._rejected_devices('certificate')
+        self._fail_rejected('certificate', rejected)
+        self._send('certificate')
+        self._send('register')
+
+    def _on_registered(self, response: iotidentity.RegisterThingResponse):
+        now = time.monotonic()
+        with self._lock:
+            device = self._take('register')
+            if device is None:
+                return
+            self._stats['register']._leave(device.stage_started, now)
+            rejected = self._rejected_devices('register')
+        self._fail_rejected('register', rejected)
+        self._send('register')
+        device.future.set_result(ProvisioningResult(
+            thing_name=response.thing_name,
+            device_configuration=response.device_configuration,
+            certificate_id=device.certificate.certificate_id,
+            certificate_pem=device.certificate.certificate_pem,
+            private_key_pem=device.keys.private_key_pem,
+            parameters=device.parameters))
+
+    def _on_rejected(self, stage: str, error_response: iotidentity.ErrorResponse):
+        with self._lock:
+            if not self._in_flight[stage]:
+                return
+            self._rejections[stage].append(error_response)
+            rejected = self._rejected_devices(stage)
+        self._fail_rejected(stage, rejected)
+
+    def _fail_rejected(self, stage: str, rejected: List[Tuple[_Device, iotidentity.ErrorResponse]]):
+        for device, error_response in rejected:
+            self._finish_failed(stage, device, ProvisioningError(stage, error_response))
+
+    def _fail(self, stage: str, device: _Device, exception: BaseException):
+        with self._lock:
+            try:
+                self._in_flight[stage].remove(device)
+            except ValueError:
+                # already answered
+                return
+            rejected = self._rejected_devices(stage)
+        self._finish_failed(stage, device, exception)
+        self._fail_rejected(stage, rejected)
+
+    def _finish_failed(self, stage: str, device: _Device, exception: BaseException):
+        with self._lock:
+            self._stats[stage]._leave(device.stage_started, time.monotonic(), failed=True)
+        self._send(stage)
+        if not device.future.done():
+            device.future.set_exception(exception)
+
+    def _expire(self):
+        # the oldest request of each stage is the first to time out
+        with self._lock:
+            while True:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                deadlines = {stage: in_flight[0].stage_started + self.timeout
+                             for stage, in_flight in self._in_flight.items() if in_flight}
+                expired = [stage for stage, deadline in deadlines.items() if deadline <= now]
+                if expired:
+                    break
+                self._wake.wait(min(deadlines.values()) - now if deadlines else None)
+        # a late response could be taken for the response to a later request
+        self._close(TimeoutError("no {} response".format(expired[0])))
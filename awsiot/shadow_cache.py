@@ -0,0 +1,269 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Local copy of a device shadow, kept current from shadow events.
+
+:class:`ShadowCache` gets the shadow once, then applies the ``update/documents``
+and ``update/delta`` events and ``delete/accepted`` responses the service
+publishes, so reads are served locally::
+
+    shadows = ShadowRequestClient(iotshadow.IotShadowClient(mqtt_connection))
+    cache = ShadowCache(shadows, 'meter')
+    cache.start().result()
+    interval = cache.desired.get('interval', 60)
+
+The cache tracks the shadow version. Events older than the cached version are
+ignored, and the shadow is only fetched again when a delta event skips a
+version, since a delta alone can't be applied on top of a missed update.
+"""
+
+__all__ = [
+    'ShadowCache',
+    'merge_state',
+    'state_delta',
+]
+
+from awsiot.shadow_requests import ShadowRequestClient, ShadowRequestError
+from awsiot import iotshadow
+from concurrent.futures import Future
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Document = Dict[str, Any]
+
+
+def merge_state(state: Document, patch: Document) -> Document:
+    """
+    Apply a shadow state patch the way the Device Shadow service does:
+    objects are merged, None removes a key and other values replace.
+    Returns a new dict, `state` is not modified.
+    """
+    merged = dict(state)
+    for key, value in patch.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_state(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def state_delta(desired: Document, reported: Document) -> Document:
+    """
+    The desired values that differ from the reported ones.
+    """
+    delta = {}
+    for key, value in desired.items():
+        if key not in reported:
+            delta[key] = value
+        elif isinstance(value, dict) and isinstance(reported[key], dict):
+            sub_delta = state_delta(value, reported[key])
+            if sub_delta:
+                delta[key] = sub_delta
+        elif value != reported[key]:
+            delta[key] = value
+    return delta
+
+
+class ShadowCache:
+    """
+    Local copy of one shadow.
+
+    The `desired`, `reported` and `delta` documents are replaced, never
+    modified, when the shadow changes, so a reference obtained from them is
+    a consistent snapshot. They must not be modified by the caller.
+
+    Args:
+        requests: :class:`~awsiot.shadow_requests.ShadowRequestClient` used
+            for the initial get, resyncs and to receive shadow events.
+        thing_name: Name of the thing.
+        shadow_name: (Optional) Name of the shadow, None for the classic shadow.
+        on_change: (Optional) Callback invoked with the cache after every
+            change applied to it.
+
+    Attributes:
+        version (Optional[int]): Version of the cached shadow, None before
+            the first sync. 0 if the shadow doesn't exist.
+        resyncs (int): Number of times the shadow was fetched again after a
+            missed update.
+    """
+
+    def __init__(self,
+                 requests: ShadowRequestClient,
+                 thing_name: str,
+                 shadow_name: Optional[str] = None,
+                 on_change: Optional[Callable[['ShadowCache'], None]] = None):
+        self.requests = requests
+        self.thing_name = thing_name
+        self.shadow_name = shadow_name
+        self.on_change = on_change
+
+        self.version = None  # type: Optional[int]
+        self.resyncs = 0
+        self._desired = {}  # type: Document
+        self._reported = {}  # type: Document
+        self._delta = {}  # type: Document
+
+        self._lock = threading.Lock()
+        self._syncing = False
+        self._buffered = []  # type: List[Tuple[str, str, Document]]
+        self._synced = threading.Event()
+        self._started = None  # type: Optional[Future]
+
+    @property
+    def desired(self) -> Document:
+        """Desired state"""
+        return self._desired
+
+    @property
+    def reported(self) -> Document:
+        """Reported state"""
+        return self._reported
+
+    @property
+    def delta(self) -> Document:
+        """Desired values that differ from the reported ones"""
+        return self._delta
+
+    def start(self) -> Future:
+        """
+        Start listening to shadow events and get the shadow.
+
+        Returns:
+            A `Future` whose result is None once the cache holds the shadow.
+        """
+        if self._started is not None:
+            return self._started
+        self._started = Future()
+        with self._lock:
+            self._syncing = True
+        self.requests.add_listener(self.thing_name, self.shadow_name, self._on_event).add_done_callback(
+            self._on_subscribed)
+        return self._started
+
+    def close(self):
+        """
+        Stop applying shadow events.
+        """
+        self.requests.remove_listener(self.thing_name, self.shadow_name, self._on_event)
+
+    def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the cache holds the shadow. Returns False on timeout.
+        """
+        return self._synced.wait(timeout)
+
+    def _on_subscribed(self, suback_future: Future):
+        if suback_future.exception() is not None:
+            with self._lock:
+                self._syncing = False
+            self._started.set_exception(suback_future.exception())
+        else:
+            self._sync()
+
+    def _sync(self):
+        if self.shadow_name is None:
+            request = iotshadow.GetShadowRequest(thing_name=self.thing_name)
+        else:
+            request = iotshadow.GetNamedShadowRequest(thing_name=self.thing_name, shadow_name=self.shadow_name)
+        self.requests.get_shadow(request).add_done_callback(self._on_get)
+
+    def _on_get(self, get_future: Future):
+        error = get_future.exception()
+        if error is not None and not (isinstance(error, ShadowRequestError) and error.error_response.code == 404):
+            with self._lock:
+                # retried on the next event
+                self._syncing = False
+                self._buffered = []
+            if not self._started.done():
+                self._started.set_exception(error)
+            return
+
+        with self._lock:
+            if error is None:
+                response = get_future.result()
+                state = response.state
+                version = response.version or 0
+                desired = (state.desired if state else None) or {}
+                reported = (state.reported if state else None) or {}
+            else:
+                # the shadow doesn't exist (yet)
+                version, desired, reported = 0, {}, {}
+            if self.version is None or version >= self.version:
+                self._set(version, desired, reported)
+            self._syncing = False
+            buffered, self._buffered = self._buffered, []
+            for event in buffered:
+                if self._syncing:
+                    # a gap in the buffered events, keep the rest for after the resync
+                    self._buffered.append(event)
+                else:
+                    self._apply(*event)
+            resync = self._syncing
+        self._synced.set()
+        if not self._started.done():
+            self._started.set_result(None)
+        if resync:
+            self._sync()
+        else:
+            self._changed()
+
+    def _on_event(self, operation: str, result: str, payload: Document):
+        if (operation, result) not in (('update', 'documents'), ('update', 'delta'), ('delete', 'accepted')):
+            return
+        with self._lock:
+            if self._syncing:
+                self._buffered.append((operation, result, payload))
+                return
+            if self.version is None:
+                # the first get failed, try again
+                self._syncing = True
+                self._buffered.append((operation, result, payload))
+                changed = False
+            else:
+                changed = self._apply(operation, result, payload)
+            resync = self._syncing
+        if resync:
+            self._sync()
+        elif changed:
+            self._changed()
+
+    def _apply(self, operation: str, result: str, payload: Document) -> bool:
+        # called with the lock held, returns whether the cache changed.
+        # Sets _syncing if the shadow must be fetched again.
+        if result == 'documents':
+            current = payload.get('current') or {}
+            version = current.get('version')
+            if version is None or version < self.version:
+                return False
+            state = current.get('state') or {}
+            # a full document, missed updates don't matter
+            self._set(version, state.get('desired') or {}, state.get('reported') or {})
+        elif result == 'delta':
+            version = payload.get('version')
+            if version is None or version <= self.version:
+                return False
+            if version > self.version + 1:
+                self._syncing = True
+                self.resyncs += 1
+                return False
+            self._set(version, merge_state(self._desired, payload.get('state') or {}), self._reported)
+        else:
+            version = payload.get('version')
+            if version is not None and version < self.version:
+                return False
+            # 0 so the events of a recreated shadow apply, whatever its version
+            self._set(0, {}, {})
+        return True
+
+    def _set(self, version: int, desired: Document, reported: Document):
+        self._desired = desired
+        self._reported = reported
+        self._delta = state_delta(desired, reported)
+        self.version = version
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
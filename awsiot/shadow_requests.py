@@ -0,0 +1,369 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Request/response helper for the Device Shadow service.
+
+Making a shadow request with :class:`awsiot.iotshadow.IotShadowClient` means
+subscribing to its ``accepted`` and ``rejected`` topics, waiting for both
+SUBACKs, publishing, then matching the response. :class:`ShadowRequestClient`
+does this with one wildcard subscription per thing (one more once a named
+shadow is used), made once and shared by all requests. Responses are matched
+to requests by ``clientToken``, so a get, update or delete is one publish plus
+one response::
+
+    shadows = ShadowRequestClient(iotshadow.IotShadowClient(mqtt_connection))
+    response = shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter')).result()
+
+The other messages received on these subscriptions, such as ``update/delta``
+and ``update/documents``, can be observed with
+:meth:`ShadowRequestClient.add_listener` without subscribing again.
+"""
+
+__all__ = [
+    'ShadowRequestClient',
+    'ShadowRequestError',
+]
+
+from awscrt import mqtt
+from awsiot import iotshadow
+from concurrent.futures import Future, TimeoutError
+import heapq
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import uuid
+
+_RESPONSE_CLASSES = {
+    'get': iotshadow.GetShadowResponse,
+    'update': iotshadow.UpdateShadowResponse,
+    'delete': iotshadow.DeleteShadowResponse,
+}
+
+# request class -> (operation, publish method)
+_OPERATIONS = {
+    iotshadow.GetShadowRequest: ('get', 'publish_get_shadow'),
+    iotshadow.GetNamedShadowRequest: ('get', 'publish_get_named_shadow'),
+    iotshadow.UpdateShadowRequest: ('update', 'publish_update_shadow'),
+    iotshadow.UpdateNamedShadowRequest: ('update', 'publish_update_named_shadow'),
+    iotshadow.DeleteShadowRequest: ('delete', 'publish_delete_shadow'),
+    iotshadow.DeleteNamedShadowRequest: ('delete', 'publish_delete_named_shadow'),
+}
+
+
+class ShadowRequestError(Exception):
+    """
+    The Device Shadow service rejected a request.
+    """
+
+    def __init__(self, error_response: iotshadow.ErrorResponse):
+        super().__init__('{} {}'.format(error_response.code, error_response.message))
+        #: `awsiot.iotshadow.ErrorResponse` sent by the service
+        self.error_response = error_response  # type: iotshadow.ErrorResponse
+
+
+class _PendingRequest:
+    __slots__ = ['future', 'operation']
+
+    def __init__(self, future: Future, operation: str):
+        self.future = future
+        self.operation = operation
+
+
+class ShadowRequestClient:
+    """
+    Makes shadow requests over shared wildcard subscriptions and resolves
+    them from the responses.
+
+    Args:
+        shadow_client: `awsiot.iotshadow.IotShadowClient` to use.
+        qos: Quality of Service of the subscriptions and requests.
+        timeout: Default number of seconds to wait for a response.
+        per_connection: If true, subscribe once for all things
+            (``$aws/things/+/shadow/...``) instead of once per thing.
+    """
+
+    def __init__(self,
+                 shadow_client: iotshadow.IotShadowClient,
+                 qos: int = mqtt.QoS.AT_LEAST_ONCE,
+                 timeout: float = 10.0,
+                 per_connection: bool = False):
+        self.shadow_client = shadow_client
+        self.qos = qos
+        self.timeout = timeout
+        self.per_connection = per_connection
+
+        self._lock = threading.Lock()
+        self._pending = {}  # type: Dict[str, _PendingRequest]
+        self._subscriptions = {}  # type: Dict[str, Future]
+        self._listeners = {}  # type: Dict[Tuple[str, Optional[str]], List[Callable]]
+        self._decode = shadow_client.codec.decode
+
+        self._deadlines = []  # type: List[Tuple[float, str]]
+        self._deadline_changed = threading.Condition(self._lock)
+        self._timeout_thread = None  # type: Optional[threading.Thread]
+        self._closed = False
+
+    def get_shadow(self, request, timeout: Optional[float] = None) -> Future:
+        """
+        Get a shadow.
+
+        Args:
+            request: `GetShadowRequest` or `GetNamedShadowRequest`.
+            timeout: (Optional) Seconds to wait for the response,
+                defaults to the client's timeout.
+
+        Returns:
+            A `Future` whose result is the `GetShadowResponse`. See :meth:`request`.
+        """
+        return self.request(request, timeout)
+
+    def update_shadow(self, request, timeout: Optional[float] = None) -> Future:
+        """
+        Update a shadow.
+
+        Args:
+            request: `UpdateShadowRequest` or `UpdateNamedShadowRequest`.
+            timeout: (Optional) Seconds to wait for the response,
+                defaults to the client's timeout.
+
+        Returns:
+            A `Future` whose result is the `UpdateShadowResponse`. See :meth:`request`.
+        """
+        return self.request(request, timeout)
+
+    def delete_shadow(self, request, timeout: Optional[float] = None) -> Future:
+        """
+        Delete a shadow.
+
+        Args:
+            request: `DeleteShadowRequest` or `DeleteNamedShadowRequest`.
+            timeout: (Optional) Seconds to wait for the response,
+                defaults to the client's timeout.
+
+        Returns:
+            A `Future` whose result is the `DeleteShadowResponse`. See :meth:`request`.
+        """
+        return self.request(request, timeout)
+
+    def request(self, request, timeout: Optional[float] = None) -> Future:
+        """
+        Make a get, update or delete request, classic or named.
+
+        A client token is generated and set on the request if it has none.
+        The wildcard subscription covering the thing is made first if needed.
+
+        Args:
+            request: Any of the get, update or delete request classes of
+                :mod:`awsiot.iotshadow`.
+            timeout: (Optional) Seconds to wait for the response,
+                defaults to the client's timeout.
+
+        Returns:
+            A `Future` whose result is the accepted response. Its exception
+            is a :class:`ShadowRequestError` if the request was rejected, a
+            `concurrent.futures.TimeoutError` if no response came in time,
+            or the error of the subscribe or publish.
+        """
+        try:
+            operation, publish_name = _OPERATIONS[type(request)]
+        except KeyError:
+            raise TypeError("unsupported shadow request: {}".format(type(request).__name__))
+        if not request.thing_name:
+            raise ValueError("request.thing_name is required")
+        named = hasattr(request, 'shadow_name')
+        if named and not request.shadow_name:
+            raise ValueError("request.shadow_name is required")
+        if self._closed:
+            raise RuntimeError("ShadowRequestClient is closed")
+
+        if request.client_token is None:
+            request.client_token = uuid.uuid4().hex
+        token = request.client_token
+        future = Future()  # type: Future
+        with self._lock:
+            if token in self._pending:
+                raise ValueError("a request with client token {} is already pending".format(token))
+            self._pending[token] = _PendingRequest(future, operation)
+            self._add_deadline(time.monotonic() + (self.timeout if timeout is None else timeout), token)
+
+        def publish(suback_future):
+            if suback_future.exception() is not None:
+                self._fail(token, suback_future.exception())
+                return
+            try:
+                pub_future = getattr(self.shadow_client, publish_name)(request, self.qos)
+            except Exception as e:
+                self._fail(token, e)
+                return
+            pub_future.add_done_callback(on_puback)
+
+        def on_puback(pub_future):
+            if pub_future.exception() is not None:
+                self._fail(token, pub_future.exception())
+
+        self._subscription(request.thing_name, named).add_done_callback(publish)
+        return future
+
+    def add_listener(self,
+                     thing_name: str,
+                     shadow_name: Optional[str],
+                     callback: Callable[[str, str, Dict[str, Any]], None]) -> Future:
+        """
+        Observe every message of one shadow received on the shared
+        subscriptions, including responses to other clients' requests.
+
+        Args:
+            thing_name: Name of the thing.
+            shadow_name: Name of the shadow, None for the classic shadow.
+            callback: Invoked with the operation (``"get"``, ``"update"``
+                or ``"delete"``), the last topic segment (``"accepted"``,
+                ``"rejected"``, ``"delta"`` or ``"documents"``) and the
+                decoded payload of each message.
+
+        Returns:
+            A `Future` which completes once the subscription covering the
+            shadow is acknowledged.
+        """
+        with self._lock:
+            key = (thing_name, shadow_name)
+            # copied, not appended to, so _on_message can iterate without the lock
+            self._listeners[key] = self._listeners.get(key, []) + [callback]
+        return self._subscription(thing_name, shadow_name is not None)
+
+    def remove_listener(self,
+                        thing_name: str,
+                        shadow_name: Optional[str],
+                        callback: Callable[[str, str, Dict[str, Any]], None]):
+        """
+        Stop invoking a callback added with :meth:`add_listener`.
+        """
+        key = (thing_name, shadow_name)
+        with self._lock:
+            listeners = [c for c in self._listeners.get(key, []) if c is not callback]
+            if listeners:
+                self._listeners[key] = listeners
+            else:
+                self._listeners.pop(key, None)
+
+    def close(self):
+        """
+        Fail all pending requests and unsubscribe.
+        """
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+            subscriptions, self._subscriptions = self._subscriptions, {}
+            self._deadline_changed.notify()
+        for request in pending.values():
+            request.future.set_exception(RuntimeError("ShadowRequestClient closed"))
+        for topic in subscriptions:
+            self.shadow_client.unsubscribe(topic)
+
+    def _subscription(self, thing_name: str, named: bool) -> Future:
+        if self.per_connection:
+            thing_name = '+'
+        if named:
+            topic = '$aws/things/{}/shadow/name/+/+/+'.format(thing_name)
+        else:
+            topic = '$aws/things/{}/shadow/+/+'.format(thing_name)
+        with self._lock:
+            future = self._subscriptions.get(topic)
+            if future is not None:
+                return future
+            future = Future()
+            self._subscriptions[topic] = future
+
+        def on_suback(suback_future):
+            if suback_future.exception() is not None:
+                # let the next request try again
+                with self._lock:
+                    if self._subscriptions.get(topic) is future:
+                        del self._subscriptions[topic]
+                future.set_exception(suback_future.exception())
+            else:
+                future.set_result(suback_future.result())
+
+        try:
+            suback_future, _ = self.shadow_client.subscribe_raw(topic, self.qos, self._on_message)
+        except Exception as e:
+            suback_future = Future()
+            suback_future.set_exception(e)
+        suback_future.add_done_callback(on_suback)
+        return future
+
+    def _on_message(self, topic: str, payload):
+        # $aws/things/<thing>/shadow[/name/<shadow>]/<operation>/<result>
+        parts = topic.split('/')
+        operation, result = parts[-2], parts[-1]
+        listeners = self._listeners.get((parts[2], parts[5] if len(parts) == 8 else None))
+        is_response = result in ('accepted', 'rejected')
+        if not is_response and not listeners:
+            return
+        try:
+            payload_obj = self._decode(payload)
+        except Exception:
+            return
+
+        if is_response:
+            self._resolve(operation, result, payload_obj)
+        if listeners:
+            for callback in listeners:
+                try:
+                    callback(operation, result, payload_obj)
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+
+    def _resolve(self, operation: str, result: str, payload_obj: Dict[str, Any]):
+        token = payload_obj.get('clientToken')
+        with self._lock:
+            request = self._pending.get(token)
+            if request is None or request.operation != operation:
+                # someone else's request, or already timed out
+                return
+            del self._pending[token]
+
+        try:
+            if result == 'accepted':
+                request.future.set_result(_RESPONSE_CLASSES[operation].from_payload(payload_obj))
+            else:
+                request.future.set_exception(ShadowRequestError(iotshadow.ErrorResponse.from_payload(payload_obj)))
+        except Exception as e:
+            request.future.set_exception(e)
+
+    def _fail(self, token: str, exception: BaseException):
+        with self._lock:
+            request = self._pending.pop(token, None)
+        if request is not None:
+            request.future.set_exception(exception)
+
+    def _add_deadline(self, deadline: float, token: str):
+        # called with the lock held
+        heapq.heappush(self._deadlines, (deadline, token))
+        if self._timeout_thread is None:
+            self._timeout_thread = threading.Thread(
+                target=self._expire_requests, name='ShadowRequestClient', daemon=True)
+            self._timeout_thread.start()
+        elif self._deadlines[0][1] == token:
+            self._deadline_changed.notify()
+
+    def _expire_requests(self):
+        deadlines = self._deadlines
+        closed = False
+        while not closed:
+            expired = []
+            with self._lock:
+                while not expired and not self._closed:
+                    now = time.monotonic()
+                    while deadlines and deadlines[0][0] <= now:
+                        _, token = heapq.heappop(deadlines)
+                        request = self._pending.pop(token, None)
+                        if request is not None:
+                            expired.append(request)
+                    if not expired:
+                        self._deadline_changed.wait(deadlines[0][0] - now if deadlines else None)
+                closed = self._closed
+            for request in expired:
+                request.future.set_exception(TimeoutError("no response to shadow request"))
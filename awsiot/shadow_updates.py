@@ -0,0 +1,226 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Coalescing of shadow reported-state updates.
+
+Devices that report often, such as a meter's current flow rate, would
+otherwise publish one update per change. :class:`ReportedStateCoalescer`
+merges the reported patches made within a window into a single update and
+leaves out values the shadow already has::
+
+    reporter = ReportedStateCoalescer(shadow_client, 'meter', window=2.0)
+    reporter.report({'flowrate': 1.5})
+    reporter.report({'flowrate': 1.7, 'valve': 'open'})  # sent with the previous one
+"""
+
+__all__ = [
+    'ReportedStateCoalescer',
+]
+
+from awscrt import mqtt
+from awsiot import iotshadow
+from awsiot.shadow_cache import merge_state
+from awsiot.shadow_requests import ShadowRequestClient
+from concurrent.futures import Future
+import copy
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+Document = Dict[str, Any]
+
+
+def _merge_patch(patch: Document, newer: Document) -> Document:
+    # like merge_state(), but keeps None so the merged patch still deletes
+    merged = dict(patch)
+    for key, value in newer.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_patch(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _prune(patch: Document, reported: Document) -> Document:
+    # the part of the patch that changes `reported`
+    pruned = {}
+    for key, value in patch.items():
+        if value is None:
+            if key in reported:
+                pruned[key] = None
+        elif isinstance(value, dict) and isinstance(reported.get(key), dict):
+            sub_patch = _prune(value, reported[key])
+            if sub_patch:
+                pruned[key] = sub_patch
+        elif key not in reported or reported[key] != value:
+            pruned[key] = value
+    return pruned
+
+
+def _complete(futures: List[Future], error: Optional[BaseException], result: Any = None):
+    for future in futures:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+class ReportedStateCoalescer:
+    """
+    Merges reported-state patches of one shadow and publishes them at most
+    once per window.
+
+    Args:
+        shadow_client: `awsiot.iotshadow.IotShadowClient` to publish with.
+        thing_name: Name of the thing.
+        shadow_name: (Optional) Name of the shadow, None for the classic shadow.
+        window: Seconds between the first patch of a window and the publish
+            of the merged update.
+        qos: Quality of Service of the updates.
+        requests: (Optional) :class:`~awsiot.shadow_requests.ShadowRequestClient`.
+            If given, updates are sent through it and a value is only
+            considered reported once the service accepted the update,
+            otherwise once the update is published.
+        reported: (Optional) Reported state the shadow is known to have,
+            used to leave out values that didn't change.
+
+    Values are also left out when an update still in flight sets them. If
+    that update fails, a patch left out entirely fails with it, but values
+    left out of an update that was sent are not sent again.
+
+    Attributes:
+        sent (int): Updates published.
+        saved (int): Patches that didn't need an update of their own,
+            because they were merged into another one or changed nothing.
+    """
+
+    def __init__(self,
+                 shadow_client: iotshadow.IotShadowClient,
+                 thing_name: str,
+                 shadow_name: Optional[str] = None,
+                 window: float = 1.0,
+                 qos: int = mqtt.QoS.AT_LEAST_ONCE,
+                 requests: Optional[ShadowRequestClient] = None,
+                 reported: Optional[Document] = None):
+        if window < 0:
+            raise ValueError("window must not be negative")
+        self.shadow_client = shadow_client
+        self.thing_name = thing_name
+        self.shadow_name = shadow_name
+        self.window = window
+        self.qos = qos
+        self.requests = requests
+        self.sent = 0
+        self.saved = 0
+
+        self._lock = threading.Lock()
+        self._reported = reported or {}  # type: Document
+        self._patch = None  # type: Optional[Document]
+        self._futures = []  # type: List[Future]
+        # patches sent and not completed yet, with a future completed along with them
+        self._in_flight = []  # type: List[Tuple[Document, Future]]
+        self._timer = None  # type: Optional[threading.Timer]
+
+    @property
+    def reported(self) -> Document:
+        """
+        Reported state as last sent successfully, not modified in place.
+        """
+        return self._reported
+
+    def report(self, patch: Document) -> Future:
+        """
+        Add a reported-state patch. Nested objects are merged, None removes
+        a value, like in an update request. The patch is copied, the caller
+        may change it afterwards.
+
+        Returns:
+            A `Future` which completes once the update containing the patch
+            is sent. Its result is the `UpdateShadowResponse` when a
+            `ShadowRequestClient` is used, otherwise None. It is None too if
+            the patch changed nothing and no update was needed.
+        """
+        future = Future()  # type: Future
+        patch = copy.deepcopy(patch)
+        with self._lock:
+            self._patch = patch if self._patch is None else _merge_patch(self._patch, patch)
+            self._futures.append(future)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def flush(self):
+        """
+        Send the merged patches now.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            patch, self._patch = self._patch, None
+            futures, self._futures = self._futures, []
+            if patch is None:
+                return
+            patch = _prune(patch, self._expected())
+            if patch:
+                self.sent += 1
+                self.saved += len(futures) - 1
+                in_flight = (patch, Future())  # type: Tuple[Document, Future]
+                self._in_flight.append(in_flight)
+            else:
+                self.saved += len(futures)
+                # the shadow has the values, or will once the last update in flight completes
+                sent = self._in_flight[-1][1] if self._in_flight else None
+
+        if not patch:
+            if sent is None:
+                for future in futures:
+                    future.set_result(None)
+            else:
+                sent.add_done_callback(lambda sent: _complete(futures, sent.exception()))
+            return
+
+        def on_done(update_future):
+            error = update_future.exception()
+            with self._lock:
+                self._in_flight.remove(in_flight)
+                if error is None:
+                    self._reported = merge_state(self._reported, patch)
+            _complete(futures, error, None if error else update_future.result())
+            _complete([in_flight[1]], error)
+
+        try:
+            self._send(patch).add_done_callback(on_done)
+        except Exception as e:
+            with self._lock:
+                self._in_flight.remove(in_flight)
+            _complete(futures + [in_flight[1]], e)
+
+    def close(self):
+        """
+        Send any pending patches.
+        """
+        self.flush()
+
+    def _expected(self) -> Document:
+        # reported state once the updates in flight are accepted, called with the lock held
+        expected = self._reported
+        for patch, _ in self._in_flight:
+            expected = merge_state(expected, patch)
+        return expected
+
+    def _send(self, patch: Document) -> Future:
+        state = iotshadow.ShadowState(reported=patch)
+        if self.shadow_name is None:
+            request = iotshadow.UpdateShadowRequest(thing_name=self.thing_name, state=state)
+        else:
+            request = iotshadow.UpdateNamedShadowRequest(
+                thing_name=self.thing_name, shadow_name=self.shadow_name, state=state)
+
+        if self.requests is not None:
+            return self.requests.update_shadow(request)
+        if self.shadow_name is None:
+            return self.shadow_client.publish_update_shadow(request, self.qos)
+        return self.shadow_client.publish_update_named_shadow(request, self.qos)
@@ -0,0 +1,173 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+TLS contexts shared by the connections built from the same credentials.
+
+Building a connection with :mod:`awsiot.mqtt_connection_builder` or
+:mod:`awsiot.mqtt5_client_builder` used to read the certificate, private
+key and CA files again, and create a new :class:`awscrt.io.ClientTlsContext`
+parsing them, every time. Both builders now get their contexts from
+:data:`default_cache`, which reads a file again only once its modification
+time or size changes, and creates a context only for options it has not seen,
+compared by the SHA-256 of the credentials rather than by file name.
+
+A certificate rotated in place is picked up by the next connection built,
+unless it was replaced within the resolution of file modification times.
+To be sure, after rotating::
+
+    tls_context_cache.invalidate(cert_filepath)
+
+Builders take a ``tls_context_cache`` argument to use another cache, such as
+``TlsContextCache(maxsize=0)``, which caches nothing.
+"""
+
+__all__ = [
+    'TlsContextCache',
+    'default_cache',
+    'invalidate',
+]
+
+from awscrt import io
+import collections
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+# options a context can't be cached by, since they refer to things outside the process
+_UNCACHEABLE = ('pkcs12_filepath', '_pkcs11_lib', '_windows_cert_store_path')
+
+
+class _File:
+    __slots__ = ['mtime_ns', 'size', 'contents', 'digest']
+
+    def __init__(self, mtime_ns: int, size: int, contents: bytes):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.contents = contents
+        self.digest = hashlib.sha256(contents).digest()
+
+
+def _digest(buffer: Optional[bytes]) -> Optional[bytes]:
+    return None if buffer is None else hashlib.sha256(buffer).digest()
+
+
+class TlsContextCache:
+    """
+    Caches credential files and the :class:`awscrt.io.ClientTlsContext`
+    built from them.
+
+    Args:
+        maxsize: Most contexts kept, the least recently used being dropped
+            first. 0 caches nothing.
+
+    Attributes:
+        hits (int): Contexts returned from the cache.
+        misses (int): Contexts created.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._files = {}  # type: Dict[str, _File]
+        self._contexts = collections.OrderedDict()  # type: collections.OrderedDict
+
+    def read(self, path: str) -> bytes:
+        """
+        Return the contents of the file at `path`, read again only if its
+        modification time or size changed since it was last read.
+        """
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+                return cached.contents
+        with open(path, mode='rb') as file:
+            contents = file.read()
+        if self.maxsize <= 0:
+            return contents
+        read = _File(stat.st_mtime_ns, stat.st_size, contents)
+        with self._lock:
+            if cached is not None and read.digest != cached.digest:
+                # rotated, contexts with the old contents won't be asked for again
+                self._drop(cached.digest)
+            self._files[path] = read
+        return contents
+
+    def get(self, tls_ctx_options: io.TlsContextOptions) -> io.ClientTlsContext:
+        """
+        Return a context built from options equal to `tls_ctx_options`,
+        creating it if there is none.
+        """
+        key = self._key(tls_ctx_options)
+        if key is None or self.maxsize <= 0:
+            self.misses += 1
+            return io.ClientTlsContext(tls_ctx_options)
+        with self._lock:
+            tls_ctx = self._contexts.get(key)
+            if tls_ctx is not None:
+                self._contexts.move_to_end(key)
+                self.hits += 1
+                return tls_ctx
+        tls_ctx = io.ClientTlsContext(tls_ctx_options)
+        with self._lock:
+            self.misses += 1
+            self._contexts[key] = tls_ctx
+            while len(self._contexts) > self.maxsize:
+                self._contexts.popitem(last=False)
+        return tls_ctx
+
+    def invalidate(self, path: Optional[str] = None):
+        """
+        Forget the file at `path` and the contexts built from its contents,
+        or from a CA directory at `path`. Forget everything if `path` is None.
+        """
+        with self._lock:
+            if path is None:
+                self._files.clear()
+                self._contexts.clear()
+                return
+            cached = self._files.pop(path, None)
+            if cached is not None:
+                self._drop(cached.digest)
+            for key in [key for key in self._contexts if key[2] == path]:
+                del self._contexts[key]
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def _drop(self, digest: bytes):
+        for key in [key for key in self._contexts if digest in key]:
+            del self._contexts[key]
+
+    @staticmethod
+    def _key(options: io.TlsContextOptions) -> Optional[Tuple]:
+        if any(getattr(options, name) is not None for name in _UNCACHEABLE):
+            return None
+        ca_dirpath_mtime_ns = None
+        if options.ca_dirpath is not None:
+            # certificates added to or removed from the directory
+            ca_dirpath_mtime_ns = os.stat(options.ca_dirpath).st_mtime_ns
+        return (
+            options.min_tls_ver,
+            options.cipher_pref,
+            options.ca_dirpath,
+            ca_dirpath_mtime_ns,
+            _digest(options.ca_buffer),
+            tuple(options.alpn_list) if options.alpn_list else None,
+            _digest(options.certificate_buffer),
+            _digest(options.private_key_buffer),
+            options.verify_peer,
+        )
+
+
+#: Cache used by the builders unless given another one.
+default_cache = TlsContextCache()
+
+
+def invalidate(path: Optional[str] = None):
+    """Invalidate `path`, or everything, in :data:`default_cache`"""
+    default_cache.invalidate(path)
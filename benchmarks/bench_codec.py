@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Encode/decode throughput and payload size of the awsiot.codec codecs for
+typical shadow and jobs documents.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import codec  # noqa: E402
+
+SHADOW_UPDATE = {
+    'state': {
+        'reported': {
+            'flowrate': 12.5,
+            'volume': 1532.25,
+            'valve': 'open',
+            'firmware': '1.4.2',
+            'channels': [{'name': 'ch{}'.format(i), 'volume': 100.0 + i, 'rate': [0.5, 1.2, 2.4]} for i in range(4)],
+        },
+    },
+    'clientToken': '5c3d8d0e-57c1-4d8b-9f8b-2f0f6b3c1a77',
+    'version': 1234,
+}
+
+JOB_EXECUTION = {
+    'execution': {
+        'jobId': 'ota-update-2024-02-07',
+        'thingName': 'pinot-meter-1001',
+        'status': 'QUEUED',
+        'queuedAt': 1707292800,
+        'lastUpdatedAt': 1707292800,
+        'versionNumber': 1,
+        'executionNumber': 1,
+        'statusDetails': {'step': 'download', 'progress': '0'},
+        'jobDocument': {
+            'operation': 'ota',
+            'files': [{
+                'fileName': 'firmware-{}.bin'.format(i),
+                'fileVersion': '1.4.{}'.format(i),
+                'fileLocation': {'url': 'https://example.com/firmware/1.4.{}/firmware.bin'.format(i)},
+                'checksum': 'ab' * 32,
+            } for i in range(8)],
+        },
+    },
+    'timestamp': 1707292801,
+}
+
+
+def available_codecs():
+    codecs = [('json (stdlib)', codec.JsonCodec(backend='json'))]
+    for name, factory in [('json (orjson)', lambda: codec.JsonCodec(backend='orjson')),
+                          ('cbor', codec.CborCodec),
+                          ('msgpack', codec.MsgPackCodec)]:
+        try:
+            codecs.append((name, factory()))
+        except ImportError:
+            print('{}: not installed, skipped'.format(name))
+    return codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark awsiot payload codecs")
+    parser.add_argument('--number', type=int, default=20000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    codecs = available_codecs()
+    for doc_name, document in [('shadow update', SHADOW_UPDATE), ('job execution', JOB_EXECUTION)]:
+        print('\n{}'.format(doc_name))
+        print('{:<16}{:>10}{:>16}{:>16}'.format('codec', 'bytes', 'encode ops/s', 'decode ops/s'))
+        for name, c in codecs:
+            encoded = c.encode(document)
+            encode = timeit.timeit(lambda: c.encode(document), number=args.number)
+            decode = timeit.timeit(lambda: c.decode(encoded), number=args.number)
+            print('{:<16}{:>10}{:>16,.0f}{:>16,.0f}'.format(
+                name, len(encoded), args.number / encode, args.number / decode))
+
+
+if __name__ == '__main__':
+    main()
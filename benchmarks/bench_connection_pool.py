@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+A gateway publishing for many meters through awsiot.connection_pool: time
+to build its clients, with a TLS context each or one shared by the pool,
+and publishes per second to a local MQTT 5 broker for pools of 1 to 4
+connections held to the publish TPS limit of AWS IoT Core.
+"""
+
+import argparse
+from concurrent.futures import Future
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awscrt import mqtt5  # noqa: E402
+from awsiot import mqtt5_client_builder  # noqa: E402
+from awsiot.connection_pool import ConnectionPool  # noqa: E402
+from awsiot.tls_context_cache import TlsContextCache  # noqa: E402
+from test.mqtt_broker import MqttBroker  # noqa: E402
+
+METERS = 200
+MAX_PUBLISH_TPS = 100
+PAYLOAD = b'{"state":{"reported":{"flowRate":12.5}}}'
+
+
+def build_separately(size):
+    return [mqtt5_client_builder.direct_with_custom_authorizer(
+        endpoint='example.com', auth_authorizer_name='authorizer', client_id='gateway-{}'.format(i),
+        tls_context_cache=TlsContextCache(maxsize=0))
+        for i in range(size)]
+
+
+def build_pool(size):
+    return ConnectionPool(mqtt5_client_builder.direct_with_custom_authorizer, size, 'gateway',
+                          endpoint='example.com', auth_authorizer_name='authorizer',
+                          tls_context_cache=TlsContextCache(maxsize=0))
+
+
+def publish(size, number):
+    broker = MqttBroker()
+    connected = []
+
+    def plain_builder(client_options, **kwargs):
+        future = Future()
+        connected.append(future)
+        client_options.port = broker.port
+        client_options.on_lifecycle_event_connection_success_fn = future.set_result
+        return mqtt5.Client(client_options)
+
+    pool = ConnectionPool(plain_builder, size, 'gateway', max_publish_tps=MAX_PUBLISH_TPS, endpoint='127.0.0.1')
+    pool.start()
+    for future in connected:
+        future.result(10)
+    for thing in range(METERS):
+        pool.client_for('meter-{:06d}'.format(thing))
+    start = time.perf_counter()
+    futures = []
+    for i in range(number):
+        thing = 'meter-{:06d}'.format(i % METERS)
+        futures.append(pool.publish(thing, mqtt5.PublishPacket(
+            topic='meters/{}/flow'.format(thing), payload=PAYLOAD, qos=mqtt5.QoS.AT_LEAST_ONCE)))
+    for future in futures:
+        future.result(10)
+    elapsed = time.perf_counter() - start
+    stats = pool.stats
+    pool.stop()
+    broker.close()
+    return number / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=1000, help="publishes per pool size")
+    parser.add_argument('--size', type=int, default=8, help="clients built")
+    args = parser.parse_args()
+
+    for name, build in (('tls context each', build_separately), ('shared (pool)', build_pool)):
+        seconds = min(timeit.repeat(lambda: build(args.size), number=1, repeat=3))
+        print('build {} clients, {:<18} {:8.1f} ms'.format(args.size, name + ':', seconds * 1e3))
+
+    for size in (1, 2, 4):
+        rate, stats = publish(size, args.number)
+        print('{} connection(s): {:8.0f} publishes/s, throttled {}'.format(
+            size, rate, [s.throttled for s in stats]))
+
+
+if __name__ == '__main__':
+    main()
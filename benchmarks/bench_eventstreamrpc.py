@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Inbound stream-event handling of awsiot.eventstreamrpc.ClientOperation over
+the echo test model: the two header lookups of each message, compared with
+indexing the headers once per message, then a whole continuation message
+through to the stream handler.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awscrt.eventstream import Header, HeaderType  # noqa: E402
+import awscrt.eventstream.rpc as protocol  # noqa: E402
+from awsiot import eventstreamrpc as rpc  # noqa: E402
+import test.echotestrpc.client as client  # noqa: E402
+import test.echotestrpc.model as model  # noqa: E402
+
+HEADERS = [
+    Header.from_int32(':message-type', 0),
+    Header.from_int32(':message-flags', 0),
+    Header.from_string(rpc.CONTENT_TYPE_HEADER, rpc.CONTENT_TYPE_APPLICATION_JSON),
+    Header.from_string(rpc.SERVICE_MODEL_TYPE_HEADER, model.EchoStreamingMessage._model_name()),
+]
+PAYLOAD = b'{"streamMessage": {"stringMessage": "flowrate 12.5"}}'
+
+
+SERVICE_MODEL_TYPE_KEY = rpc.SERVICE_MODEL_TYPE_HEADER.lower()
+CONTENT_TYPE_KEY = rpc.CONTENT_TYPE_HEADER.lower()
+
+
+def linear_lookups(operation):
+    return (operation._find_header(HEADERS, rpc.SERVICE_MODEL_TYPE_HEADER),
+            operation._find_header(HEADERS, rpc.CONTENT_TYPE_HEADER))
+
+
+def indexed_lookups():
+    # a case-insensitive index of the headers, the first header of a name wins
+    index = {}
+    for header in HEADERS:
+        index.setdefault(header.name.lower(), header)
+    values = []
+    for key in (SERVICE_MODEL_TYPE_KEY, CONTENT_TYPE_KEY):
+        header = index.get(key)
+        values.append(header.value if header is not None and header.type == HeaderType.STRING else None)
+    return tuple(values)
+
+
+class CountingHandler(client.EchoStreamMessagesStreamHandler):
+    def __init__(self):
+        self.events = 0
+
+    def on_stream_event(self, event):
+        self.events += 1
+
+
+def stream_operation():
+    # an operation past its initial response, without a connection
+    operation = object.__new__(client.EchoStreamMessagesOperation)
+    operation._stream_handler = CountingHandler()
+    operation._shape_index = model.SHAPE_INDEX
+    operation._message_count = 1
+    return operation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eventstream RPC inbound header handling")
+    parser.add_argument('--number', type=int, default=200000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    operation = stream_operation()
+    assert linear_lookups(operation) == indexed_lookups()
+    linear = timeit.timeit(lambda: linear_lookups(operation), number=args.number)
+    indexed = timeit.timeit(indexed_lookups, number=args.number)
+    print('{:<28}{:>14}'.format('header lookups', 'messages/s'))
+    print('{:<28}{:>14,.0f}'.format('linear scan x2', args.number / linear))
+    print('{:<28}{:>14,.0f}'.format('index + 2 lookups', args.number / indexed))
+
+    message_type = protocol.MessageType.APPLICATION_MESSAGE
+    elapsed = timeit.timeit(
+        lambda: operation._on_continuation_message(HEADERS, PAYLOAD, message_type, 0), number=args.number)
+    assert operation._stream_handler.events == args.number
+    print('{:<28}{:>14,.0f}'.format('whole stream event', args.number / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+CPU use and accuracy of FlowMeter against the old busy-wait sampling loop,
+using a simulated pulse source so it runs on any Linux box.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from samples.pinot_flow_meter import FlowMeter, SimulatedPulseSource  # noqa: E402
+
+
+def run_busy_wait(frequency, duration):
+    """The sampling loop pinot_sensor.py used to run"""
+    backend = SimulatedPulseSource(frequency)
+    state = {'count': 0}
+
+    def pulse_counter(timestamp):
+        state['count'] += 1
+
+    backend.add_pulse_listener(0, pulse_counter)
+    counted = 0
+    cpu_start = time.process_time()
+    start = old_time = time.time()
+    while time.time() - start < duration:
+        current_time = time.time()
+        if current_time - old_time > 1:
+            counted += state['count']
+            state['count'] = 0
+            old_time = current_time
+    cpu = time.process_time() - cpu_start
+    backend.cleanup()
+    counted += state['count']
+    return cpu, counted, backend.emitted[0]
+
+
+def run_flow_meter(frequency, duration, window):
+    backend = SimulatedPulseSource(frequency)
+    meter = FlowMeter(backend, 0, window=window)
+    cpu_start = time.process_time()
+    meter.start()
+    time.sleep(duration)
+    meter.stop()
+    cpu = time.process_time() - cpu_start
+    backend.cleanup()
+    return cpu, meter.total_pulses, backend.emitted[0]
+
+
+def report(name, duration, cpu, counted, emitted):
+    error = 0.0 if emitted == 0 else abs(emitted - counted) / emitted * 100.0
+    print('{:<12} cpu={:6.3f}s ({:5.1f}% of one core)  pulses={}/{}  error={:.3f}%'.format(
+        name, cpu, cpu / duration * 100.0, counted, emitted, error))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FlowMeter against busy-wait sampling")
+    parser.add_argument('--frequency', type=float, default=100.0, help="Simulated pulse frequency in Hz")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds to run each variant")
+    parser.add_argument('--window', type=float, default=1.0, help="FlowMeter sampling window in seconds")
+    parser.add_argument('--skip-busy-wait', action='store_true', help="Only run FlowMeter")
+    args = parser.parse_args()
+
+    print('frequency: {} Hz, duration: {} s'.format(args.frequency, args.duration))
+    if not args.skip_busy_wait:
+        report('busy-wait', args.duration, *run_busy_wait(args.frequency, args.duration))
+    report('FlowMeter', args.duration, *run_flow_meter(args.frequency, args.duration, args.window))
+
+
+if __name__ == '__main__':
+    main()
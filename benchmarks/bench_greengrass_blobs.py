@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Serialization of Greengrass IPC publish_to_topic requests carrying binary
+messages of increasing size: the generic path (base64 str, json.dumps(),
+encode()) against the blob-splicing path of awsiot.eventstreamrpc.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import eventstreamrpc as rpc  # noqa: E402
+from awsiot.greengrasscoreipc import model  # noqa: E402
+
+SIZES = [1024, 4096, 16 * 1024, 64 * 1024, 256 * 1024]
+
+
+def request(size):
+    return model.PublishToTopicRequest(
+        topic='meters/flow',
+        publish_message=model.PublishMessage(binary_message=model.BinaryMessage(message=os.urandom(size))))
+
+
+def generic(shape):
+    # how ClientOperation serialized every shape before
+    return json.dumps(shape._to_payload()).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Greengrass IPC binary message serialization")
+    parser.add_argument('--number', type=int, default=2000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    operation = object.__new__(rpc.ClientOperation)
+    print('{:>10}{:>16}{:>16}{:>10}'.format('bytes', 'generic µs', 'spliced µs', 'speedup'))
+    for size in SIZES:
+        shape = request(size)
+        assert generic(shape) == operation._json_payload_from_shape(shape)
+        before = timeit.timeit(lambda: generic(shape), number=args.number) / args.number
+        after = timeit.timeit(lambda: operation._json_payload_from_shape(shape), number=args.number) / args.number
+        print('{:>10}{:>16.1f}{:>16.1f}{:>9.2f}x'.format(size, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Greengrass IPC publish throughput against a local event-stream server that
+answers each request after a fixed latency: one publish at a time with
+GreengrassCoreIPCClientV2, then awsiot.greengrass_publisher.BatchPublisher
+with windows of increasing size.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import greengrasscoreipc  # noqa: E402
+from awsiot.greengrass_publisher import BatchPublisher  # noqa: E402
+from awsiot.greengrasscoreipc import model  # noqa: E402
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2  # noqa: E402
+from test.ipc_server import IpcServer  # noqa: E402
+
+WINDOWS = [1, 8, 32, 128]
+
+
+def message(i):
+    return model.PublishMessage(json_message=model.JsonMessage(message={'meter': 'm-1', 'flowRate': i * 0.5}))
+
+
+def sequential(client, number):
+    for i in range(number):
+        client.publish_to_topic(topic='meters/flow', publish_message=message(i))
+
+
+def batched(client, number, window):
+    publisher = BatchPublisher(client, max_in_flight=window)
+    requests = (model.PublishToTopicRequest(topic='meters/flow', publish_message=message(i)) for i in range(number))
+    publisher.publish_batch(requests).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipelined Greengrass IPC publishing")
+    parser.add_argument('--number', type=int, default=2000, help="Messages per measurement")
+    parser.add_argument('--latency', type=float, default=0.001, help="Server response latency in seconds")
+    args = parser.parse_args()
+
+    server = IpcServer(latency=args.latency)
+    client = GreengrassCoreIPCClientV2(greengrasscoreipc.connect(ipc_socket=server.socket_path, authtoken='bench'))
+    try:
+        print('{:<24}{:>14}'.format('latency {:g} ms'.format(args.latency * 1000), 'messages/s'))
+        started = time.perf_counter()
+        sequential(client, args.number)
+        print('{:<24}{:>14,.0f}'.format('publish_to_topic', args.number / (time.perf_counter() - started)))
+        for window in WINDOWS:
+            started = time.perf_counter()
+            batched(client, args.number, window)
+            print('{:<24}{:>14,.0f}'.format('batch, window {}'.format(window),
+                                            args.number / (time.perf_counter() - started)))
+    finally:
+        client.close()
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
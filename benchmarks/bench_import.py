@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Start-up costs, each measured in a fresh interpreter: importing awsiot and
+the Greengrass IPC package, before and after their first use, and looking
+up the SDK version sent with CONNECT through importlib.metadata and through
+pkg_resources. test/test_import_time.py checks what is imported with
+``-X importtime``.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+STATEMENTS = [
+    'import awsiot',
+    'import awsiot.greengrasscoreipc',
+    'from awsiot.greengrasscoreipc import GreengrassCoreIPCClient',
+    'import awsiot.iotshadow',
+    'from awsiot import mqtt5_client_builder',
+    'from importlib import metadata; metadata.version("awscrt")',
+    'import pkg_resources; pkg_resources.get_distribution("awscrt").version',
+]
+
+
+def measure(statement):
+    code = 'import time; start = time.perf_counter(); {}; print(time.perf_counter() - start)'.format(statement)
+    process = subprocess.run([sys.executable, '-c', code], cwd=ROOT, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, universal_newlines=True, check=True)
+    return float(process.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=10, help="interpreters started per statement")
+    args = parser.parse_args()
+
+    for statement in STATEMENTS:
+        seconds = min(measure(statement) for _ in range(args.number))
+        print('{:<72} {:8.1f} ms'.format(statement, seconds * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Decode time of job execution events with awsiot.job_documents.LazyJobDocumentCodec,
+compared to the eager JSON codec, for a handler that doesn't read the job
+document and for one that does.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import codec  # noqa: E402
+from awsiot.job_documents import LazyJobDocumentCodec  # noqa: E402
+
+DOCUMENTS = {
+    # many small objects
+    'ota manifest': {
+        'operation': 'ota',
+        'files': [{
+            'fileName': 'firmware-{}.bin'.format(i),
+            'fileVersion': '1.4.{}'.format(i),
+            'fileLocation': {'url': 'https://example.com/firmware/1.4.{}/firmware.bin'.format(i)},
+            'checksum': 'ab' * 32,
+        } for i in range(120)],
+    },
+    # mostly one long string
+    'embedded image': {
+        'operation': 'install',
+        'image': base64.b64encode(os.urandom(256 * 1024)).decode(),
+        'steps': [{'step': i} for i in range(10)],
+    },
+}
+
+
+def event(document):
+    return json.dumps({
+        'timestamp': 1707292801,
+        'execution': {
+            'jobId': 'ota-update-2024-02-07',
+            'thingName': 'pinot-meter-1001',
+            'status': 'QUEUED',
+            'statusDetails': {'step': 'download'},
+            'versionNumber': 1,
+            'executionNumber': 1,
+            'jobDocument': document,
+        },
+    }).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lazy job document decoding")
+    parser.add_argument('--number', type=int, default=500, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    backends = ['json']
+    if codec._orjson is not None:
+        backends.append('orjson')
+
+    print('{:<16}{:<8}{:>10}{:>14}{:>14}{:>14}'.format(
+        'document', 'backend', 'bytes', 'eager us', 'lazy us', 'lazy+read us'))
+    for name, document in DOCUMENTS.items():
+        payload = event(document)
+        for backend in backends:
+            eager = codec.JsonCodec(backend=backend)
+            lazy = LazyJobDocumentCodec(backend=backend)
+
+            def lazy_and_read():
+                # falls back to a dict when the scan gives up
+                dict(lazy.decode(payload)['execution']['jobDocument'])
+
+            times = [timeit.timeit(f, number=args.number) / args.number * 1e6
+                     for f in (lambda: eager.decode(payload), lambda: lazy.decode(payload), lazy_and_read)]
+            print('{:<16}{:<8}{:>10}{:>14.1f}{:>14.1f}{:>14.1f}'.format(name, backend, len(payload), *times))
+
+
+if __name__ == '__main__':
+    main()
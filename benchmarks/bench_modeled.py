@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Objects/sec of the generated ModeledClass constructors and (de)serializers,
+for realistic jobs and shadow documents. A baseline for changes to the code
+generator's templates.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import iotjobs, iotshadow  # noqa: E402
+
+JOB_EXECUTION = {
+    'executionNumber': 1,
+    'jobId': 'ota-update-2024-02-07',
+    'thingName': 'pinot-meter-1001',
+    'status': 'IN_PROGRESS',
+    'queuedAt': 1707292800,
+    'startedAt': 1707292801,
+    'lastUpdatedAt': 1707292805,
+    'versionNumber': 2,
+    'statusDetails': {'step': 'download', 'progress': '40'},
+    'jobDocument': {
+        'operation': 'ota',
+        'files': [{'fileName': 'firmware.bin', 'fileVersion': '1.4.2',
+                   'fileLocation': {'url': 'https://example.com/firmware/1.4.2/firmware.bin'}}],
+    },
+}
+
+SHADOW_STATE = {
+    'desired': {'valve': 'open', 'interval': 60},
+    'reported': {'flowrate': 12.5, 'volume': 1532.25, 'valve': 'open', 'firmware': '1.4.2'},
+}
+
+GET_SHADOW_RESPONSE = {
+    'state': dict(SHADOW_STATE, delta={'interval': 60}),
+    'metadata': {'reported': {'flowrate': {'timestamp': 1707292800}}},
+    'version': 42,
+    'timestamp': 1707292800,
+    'clientToken': '5c3d8d0e',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generated ModeledClass methods")
+    parser.add_argument('--number', type=int, default=100000, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    request = iotshadow.UpdateShadowRequest(
+        thing_name='pinot-meter-1001', client_token='5c3d8d0e', version=42,
+        state=iotshadow.ShadowState(reported=SHADOW_STATE['reported']))
+    cases = [
+        ('JobExecutionData.from_payload', lambda: iotjobs.JobExecutionData.from_payload(JOB_EXECUTION)),
+        ('ShadowState.from_payload', lambda: iotshadow.ShadowState.from_payload(SHADOW_STATE)),
+        ('GetShadowResponse.from_payload', lambda: iotshadow.GetShadowResponse.from_payload(GET_SHADOW_RESPONSE)),
+        ('ShadowState(reported=...)', lambda: iotshadow.ShadowState(reported=SHADOW_STATE['reported'])),
+        ('UpdateShadowRequest.to_payload', request.to_payload),
+    ]
+
+    print('{:<34}{:>14}'.format('', 'objects/s'))
+    for name, case in cases:
+        seconds = min(timeit.repeat(case, number=args.number, repeat=3))
+        print('{:<34}{:>14,.0f}'.format(name, args.number / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+IotShadowClient over an awscrt.mqtt5.Client, through the MQTT 3 adapter
+connection and natively through awsiot.mqtt5_router.PublishRouter, against
+a local broker that answers shadow gets: round-trip latency of one get at a
+time, then throughput of gets kept in flight.
+"""
+
+import argparse
+from concurrent.futures import Future
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awscrt import mqtt, mqtt5  # noqa: E402
+from awsiot import iotshadow  # noqa: E402
+from awsiot.mqtt5_router import PublishRouter  # noqa: E402
+from test.mqtt_broker import MqttBroker  # noqa: E402
+
+THING = 'm-1'
+GET_TOPIC = '$aws/things/{}/shadow/get'.format(THING)
+QOS = mqtt.QoS.AT_LEAST_ONCE
+
+
+def answer_get_shadow(topic, payload):
+    token = json.loads(payload)['clientToken']
+    return [(topic + '/accepted', json.dumps({'clientToken': token, 'version': 1,
+                                              'state': {'reported': {'flowRate': 12.5}}}).encode())]
+
+
+def connect(broker, native):
+    router = PublishRouter() if native else None
+    connected = Future()
+    client = mqtt5.Client(mqtt5.ClientOptions(
+        host_name='127.0.0.1', port=broker.port, on_publish_callback_fn=router,
+        on_lifecycle_event_connection_success_fn=connected.set_result))
+    if router is not None:
+        router.attach(client)
+    client.start()
+    connected.result(10)
+    return client
+
+
+class Responses:
+    def __init__(self):
+        self.count = 0
+        self.condition = threading.Condition()
+
+    def __call__(self, response):
+        with self.condition:
+            self.count += 1
+            self.condition.notify()
+
+    def wait(self, count):
+        with self.condition:
+            self.condition.wait_for(lambda: self.count >= count, 10)
+
+
+def run(broker, native, number):
+    client = connect(broker, native)
+    shadow = iotshadow.IotShadowClient(client)
+    responses = Responses()
+    shadow.subscribe_to_get_shadow_accepted(
+        iotshadow.GetShadowSubscriptionRequest(thing_name=THING), QOS, responses)[0].result(10)
+    request = iotshadow.GetShadowRequest(thing_name=THING, client_token='bench')
+
+    latencies = []
+    for i in range(number // 4):
+        started = time.perf_counter()
+        shadow.publish_get_shadow(request, QOS)
+        responses.wait(i + 1)
+        latencies.append(time.perf_counter() - started)
+
+    done = responses.count
+    started = time.perf_counter()
+    for _ in range(number):
+        shadow.publish_get_shadow(request, QOS)
+    responses.wait(done + number)
+    elapsed = time.perf_counter() - started
+    client.stop()
+
+    latencies.sort()
+    return (statistics.mean(latencies), latencies[len(latencies) * 99 // 100], number / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service clients over MQTT 5, adapter vs native")
+    parser.add_argument('--number', type=int, default=4000, help="Gets in the throughput measurement")
+    args = parser.parse_args()
+
+    broker = MqttBroker()
+    broker.responders[GET_TOPIC] = answer_get_shadow
+    try:
+        print('{:<10}{:>14}{:>14}{:>14}'.format('path', 'mean RTT µs', 'p99 RTT µs', 'gets/s'))
+        for name, native in (('adapter', False), ('native', True)):
+            mean, p99, throughput = run(broker, native, args.number)
+            print('{:<10}{:>14.0f}{:>14.0f}{:>14,.0f}'.format(name, mean * 1e6, p99 * 1e6, throughput))
+    finally:
+        broker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Bytes on the wire of a gateway publishing the telemetry of many meters,
+some much more often than others, to a local MQTT 5 broker accepting 8
+topic aliases: without aliases, with awscrt's own LRU aliasing, and with
+awsiot.mqtt5_topic_alias.TopicAliasManager. Also the cost of picking an
+alias.
+"""
+
+import argparse
+from concurrent.futures import Future
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awscrt import mqtt5  # noqa: E402
+from awsiot.mqtt5_topic_alias import LFU, LRU, TopicAliasManager  # noqa: E402
+from test.mqtt_broker import MqttBroker  # noqa: E402
+
+METERS = 40
+TOPIC_ALIAS_MAXIMUM = 8
+PAYLOAD = b'{"state":{"reported":{"flowRate":12.5}}}'
+
+
+def workload(number):
+    # Zipf-like: the meter of rank r publishes about 1/r as often as the first
+    meters = ['$aws/things/meter-{:06d}/shadow/name/flow/update'.format(i) for i in range(METERS)]
+    weights = [1 / (rank + 1) for rank in range(METERS)]
+    return random.Random(1).choices(meters, weights, k=number)
+
+
+def run(topics, outbound_behavior, manager=None):
+    broker = MqttBroker(topic_alias_maximum=TOPIC_ALIAS_MAXIMUM)
+    connected = Future()
+
+    def on_connection_success(data):
+        if manager is not None:
+            manager.on_connection_success(data)
+        connected.set_result(data)
+
+    client = mqtt5.Client(mqtt5.ClientOptions(
+        host_name='127.0.0.1', port=broker.port,
+        topic_aliasing_options=mqtt5.TopicAliasingOptions(outbound_behavior=outbound_behavior),
+        on_lifecycle_event_connection_success_fn=on_connection_success))
+    client.start()
+    connected.result(10)
+    futures = []
+    for topic in topics:
+        packet = mqtt5.PublishPacket(topic=topic, payload=PAYLOAD, qos=mqtt5.QoS.AT_LEAST_ONCE)
+        if manager is not None:
+            manager.apply(packet)
+        futures.append(client.publish(packet))
+    for future in futures:
+        future.result(10)
+    client.stop()
+    broker.close()
+    return broker.bytes_received / len(topics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MQTT 5 outbound topic aliases")
+    parser.add_argument('--number', type=int, default=20000, help="Publishes per measurement")
+    args = parser.parse_args()
+    topics = workload(args.number)
+
+    print('{:<22}{:>16}{:>18}'.format('aliases', 'bytes/publish', 'saved/publish'))
+    baseline = run(topics, mqtt5.OutboundTopicAliasBehaviorType.DISABLED)
+    print('{:<22}{:>16.1f}{:>18}'.format('none', baseline, '-'))
+    crt_lru = run(topics, mqtt5.OutboundTopicAliasBehaviorType.LRU)
+    print('{:<22}{:>16.1f}{:>18.1f}'.format('awscrt LRU', crt_lru, baseline - crt_lru))
+    for policy in (LRU, LFU):
+        manager = TopicAliasManager(policy=policy)
+        measured = run(topics, mqtt5.OutboundTopicAliasBehaviorType.MANUAL, manager)
+        print('{:<22}{:>16.1f}{:>18.1f}  (reported {:.1f})'.format(
+            'manager ' + policy, measured, baseline - measured, manager.stats.bytes_saved_per_publish))
+
+    manager = TopicAliasManager()
+    manager.reset(TOPIC_ALIAS_MAXIMUM)
+    alias = manager.alias
+    elapsed = timeit.timeit(lambda: [alias(topic) for topic in topics], number=1)
+    print('alias() {:.2f} µs per publish'.format(elapsed / len(topics) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
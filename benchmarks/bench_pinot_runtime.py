@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Runs PinotRuntime with simulated flow sensors at peak pulse rates and
+reports CPU use, scheduling latency and publish counts.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from samples.pinot_flow_meter import SimulatedPulseSource  # noqa: E402
+from samples.pinot_runtime import ChannelConfig, PinotRuntime, RuntimeConfig  # noqa: E402
+
+
+class CountingPublisher:
+
+    def __init__(self):
+        self.count = 0
+        self.payload_bytes = 0
+
+    def publish_message(self, message):
+        self.count += 1
+        self.payload_bytes += len(json.dumps(message, separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the multi-channel Pinot runtime")
+    parser.add_argument('--channels', type=int, default=16, help="Number of flow channels")
+    parser.add_argument('--frequency', type=float, default=200.0, help="Pulse frequency per channel in Hz")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run")
+    parser.add_argument('--window', type=float, default=1.0, help="Sampling window in seconds")
+    parser.add_argument('--interval', type=float, default=5.0, help="Reporting interval in seconds")
+    args = parser.parse_args()
+
+    config = RuntimeConfig(
+        [ChannelConfig('ch{}'.format(i), i) for i in range(args.channels)],
+        sample_window=args.window,
+        reporting_interval=args.interval)
+    backend = SimulatedPulseSource(args.frequency)
+    publisher = CountingPublisher()
+    runtime = PinotRuntime(config, backend, publisher)
+
+    cpu_start = time.process_time()
+    runtime.start()
+    time.sleep(args.duration)
+    runtime.stop()
+    cpu = time.process_time() - cpu_start
+    backend.cleanup()
+
+    emitted = sum(backend.emitted.values())
+    counted = sum(m.total_pulses for m in runtime.meters.values())
+    windows = max(1, runtime.windows)
+    print('channels: {}, frequency: {} Hz, duration: {} s'.format(args.channels, args.frequency, args.duration))
+    print('process cpu:   {:.3f}s ({:.1f}% of one core, includes the pulse simulator)'.format(
+        cpu, cpu / args.duration * 100.0))
+    print('scheduler cpu: {:.3f}s ({:.2f}% of one core)'.format(
+        runtime.scheduler_cpu, runtime.scheduler_cpu / args.duration * 100.0))
+    print('latency:       mean {:.3f} ms, max {:.3f} ms over {} windows'.format(
+        runtime.total_latency / windows * 1000.0, runtime.max_latency * 1000.0, runtime.windows))
+    print('pulses:        {}/{} counted, {} overflows'.format(
+        counted, emitted, sum(m.overflows for m in runtime.meters.values())))
+    print('publishes:     {} batched ({} bytes), {} with one message per channel per window'.format(
+        publisher.count, publisher.payload_bytes, runtime.windows * args.channels))
+
+
+if __name__ == '__main__':
+    main()
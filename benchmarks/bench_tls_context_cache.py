@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Time to build an MQTT 5 client with mqtt5_client_builder.mtls_from_path,
+certificate, key and CA files included, when every call reads the files and
+creates a TLS context, and with awsiot.tls_context_cache.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from awsiot import mqtt5_client_builder  # noqa: E402
+from awsiot.tls_context_cache import TlsContextCache  # noqa: E402
+from test.test_tls_context_cache import CERT, KEY  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=200, help="clients built per run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for name, contents in (('cert', CERT), ('key', KEY)):
+            paths[name] = os.path.join(directory, name + '.pem')
+            with open(paths[name], 'wb') as file:
+                file.write(contents)
+
+        for name, cache in (('uncached', TlsContextCache(maxsize=0)), ('cached', TlsContextCache())):
+            def build():
+                mqtt5_client_builder.mtls_from_path(
+                    cert_filepath=paths['cert'], pri_key_filepath=paths['key'], ca_filepath=paths['cert'],
+                    endpoint='example.com', client_id='meter-000001', tls_context_cache=cache)
+            seconds = min(timeit.repeat(build, number=args.number, repeat=3)) / args.number
+            print('{:<9} {:8.1f} us per client'.format(name + ':', seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,22 @@
-import RPi.GPIO as GPIO
-import time
+from samples.pinot_flow_meter import FlowMeter, RPiGpioBackend
 
 sensor_pin = 18
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-pulse_count = 0
 calibration_factor = 5.5
-flow_rate = 0.0
-flow_millilitres = 0
 total_millilitres = 0
 
-def pulse_counter(channel):
-    global pulse_count
-    pulse_count += 1
-
-GPIO.add_event_detect(sensor_pin, GPIO.FALLING, callback=pulse_counter)
-
-old_time = time.time()
+backend = RPiGpioBackend()
+flow_meter = FlowMeter(backend, sensor_pin, calibration_factor=calibration_factor, window=1.0)
 
 try:
-    while True:
-        if time.time() - old_time > 1:
-            flow_rate = (pulse_count / calibration_factor) / (time.time() - old_time) * 60
-            flow_millilitres = (flow_rate / 60) * 16700
-            total_millilitres += flow_millilitres
-            
-            print(f"Flow rate: {flow_rate:.2f} mL/min")
-            # print(f"Output Liquid Quantity: {total_millilitres:.2f} mL")
-            print(f"{total_millilitres/1000:.2f} mL")
-            
-            pulse_count = 0
-            old_time = time.time()
+    flow_meter.start()
+    # 샘플러 스레드가 1초마다 깨어나므로 busy-wait 없이 대기
+    for sample in flow_meter.samples():
+        total_millilitres += sample.volume
+
+        print(f"Flow rate: {sample.flow_rate:.2f} L/min")
+        # print(f"Output Liquid Quantity: {total_millilitres:.2f} mL")
+        print(f"{total_millilitres:.2f} mL")
 
 except KeyboardInterrupt:
-    GPIO.cleanup()
+    flow_meter.stop()
+    backend.cleanup()
@@ -1,9 +1,12 @@
 import RPi.GPIO as GPIO
-import time
 from datetime import datetime
-from samples.pinot_aws_mqtt import AwsIotPublisher 
+from samples.pinot_aggregator import FlowAggregator
+from samples.pinot_aws_mqtt import AwsIotPublisher, DEFAULT_QUEUE_FILE
+from samples.pinot_flow_meter import FlowMeter, RPiGpioBackend
 import os
 import argparse
+import logging
+import time
 
 # GPIO 핀 번호 설정 모드
 GPIO.setmode(GPIO.BCM)
@@ -16,6 +19,10 @@ parser.add_argument('--cert_file', required=True, help='Path to certificate file
 parser.add_argument('--key_file', required=True, help='Path to private key file')
 parser.add_argument('--client_id', required=True, help='MQTT client ID')
 parser.add_argument('--topic', required=True, help='MQTT topic to publish')
+parser.add_argument('--queue_file', default=DEFAULT_QUEUE_FILE, help='Path to the offline message queue database')
+parser.add_argument('--summary_interval', type=float, default=300, help='Seconds between two published flow summaries')
+parser.add_argument('--session_detail', action='store_true', help='Include every flow session in the summaries')
+parser.add_argument('--verbose', action='store_true', help='Log the flow rate of every sample')
 
 # 입력받은 파라미터를 args 변수에 저장
 args = parser.parse_args()
@@ -27,6 +34,9 @@ cert_file = os.path.expanduser(args.cert_file)
 key_file = os.path.expanduser(args.key_file)
 client_id = args.client_id
 topic = args.topic
+queue_file = os.path.expanduser(args.queue_file)
+
+logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
 
 # AWS IoT Core 연결 정보
 # endpoint = "a1abb207ddrmxk-ats.iot.ap-northeast-2.amazonaws.com"
@@ -37,13 +47,13 @@ topic = args.topic
 # topic = "device/1001/data"
 
 # AwsIotPublisher 인스턴스 생성
-publisher = AwsIotPublisher(endpoint, ca_file, cert_file, key_file, client_id, topic)
+publisher = AwsIotPublisher(endpoint, ca_file, cert_file, key_file, client_id, topic, queue_file=queue_file)
 
-# MQTT 연결 시도
-if publisher.connect():
+# MQTT 연결 시도 (연결되지 않아도 백그라운드에서 계속 재시도)
+if publisher.connect(timeout=10):
     print("Connected to AWS IoT Core")
 else:
-    print("Failed to connect to AWS IoT Core")
+    print("Not connected to AWS IoT Core yet, retrying in the background")
 
 # LED 핀 설정
 pins = {'R': 17, 'G': 27, 'B': 22}
@@ -73,66 +83,52 @@ def get_current_time_str():
 
 # 유량 센서 설정
 sensor_pin = 18
-GPIO.setup(sensor_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-pulse_count = 0
 calibration_factor = 5.5
-total_millilitres = 0
 
-def pulse_counter(channel):
-    global pulse_count
-    pulse_count += 1
+# 펄스는 GPIO 콜백에서 타임스탬프로 버퍼에 쌓이고,
+# 샘플러 스레드가 1초마다 깨어나 유량을 계산
+flow_meter = FlowMeter(RPiGpioBackend(), sensor_pin, calibration_factor=calibration_factor, window=1.0)
 
-GPIO.add_event_detect(sensor_pin, GPIO.FALLING, callback=pulse_counter)
+# 세션별 메시지 대신 분/시간 단위로 집계해 summary_interval 마다 한 번만 전송
+flow_stop_delay = 3  # 물 흐름이 멈춘 것으로 간주하기 전에 기다릴 시간 (초)
+aggregator = FlowAggregator(['flow'], session_gap=flow_stop_delay, include_sessions=args.session_detail)
+next_summary = time.monotonic() + args.summary_interval
 
-old_time = time.time()
 
-# 물 흐름이 시작되었는지와 마지막으로 물이 흐른 시간을 추적하는 변수를 추가
-flow_started = False
-last_flow_time = 0
-flow_stop_delay = 3  # 물 흐름이 멈춘 것으로 간주하기 전에 기다릴 시간 (초)
+def publish_summary():
+    summary = aggregator.summary(time.time())
+    summary['time'] = get_current_time_str()
+    # 연결이 끊겨 있어도 큐에 저장되고 재연결 후 전송됨
+    publisher.publish_message(summary)
+    logging.info(f"Summary sent: {summary['channels']['flow']['volume']:.2f} mL")
+
 
 try:
-    while True:
-        current_time = time.time()
-        if current_time - old_time > 1:
-            flow_rate = (pulse_count / calibration_factor) / (current_time - old_time) * 60
-            flow_millilitres = (flow_rate / 60) * 16.700
-            # total_millilitres += flow_millilitres
-
-            if flow_rate > 0:
-                if not flow_started:
-                    flow_started = True
-                    total_millilitres = 0  # 흐름이 시작될 때 총 미리리터를 리셋
-                total_millilitres += flow_millilitres
-                last_flow_time = current_time
-                set_color(100, 0, 100)  # 초록색
+    flow_meter.start()
+    # samples()는 다음 샘플이 나올 때까지 블록되므로 CPU를 사용하지 않음
+    for sample in flow_meter.samples():
+        aggregator.add('flow', sample, time.time())
+
+        if sample.pulses > 0:
+            set_color(100, 0, 100)  # 초록색
+        else:
+            set_color(0, 100, 100)  # 빨간색
+
+        if sample.timestamp >= next_summary:
+            if aggregator.has_flow():
+                publish_summary()
             else:
-                set_color(0, 100, 100)  # 빨간색
-
-            # 물 흐름이 있었고, 정해진 시간 동안 물 흐름이 없었을 때 MQTT 메시지 전송
-            if flow_started and (current_time - last_flow_time >= flow_stop_delay):
-                if not publisher.is_connected():
-                    print("Reconnecting to AWS IoT Core")
-                    publisher.connect()
-                publisher.publish_message({
-                    "flowrate": round(total_millilitres, 2),
-                    "time": get_current_time_str(),
-                    'temperature': -5,
-                    'humidity': 30,
-                    'barometer': 200
-                })
-                print(f"Total volume sent: {total_millilitres:.2f} mL")
-                flow_started = False  # 메시지 전송 후 흐름 상태 리셋
-
-            print(f"Flow rate: {flow_rate:.2f} mL/min")
-            print(f"Current volume: {total_millilitres:.2f} mL")
-
-            pulse_count = 0
-            old_time = current_time
+                aggregator.summary(time.time())  # 물 흐름이 없던 기간은 전송하지 않음
+            next_summary += args.summary_interval
+
+        logging.debug(f"Flow rate: {sample.flow_rate:.2f} L/min")
 
 except KeyboardInterrupt:
     # 프로그램 종료
+    flow_meter.stop()
+    if aggregator.has_flow():
+        publish_summary()
+    publisher.close()  # 전송하지 못한 메시지는 큐 파일에 남아 다음 실행 때 전송됨
     R.stop()
     G.stop()
     B.stop()
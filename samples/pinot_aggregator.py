@@ -0,0 +1,197 @@
+# pinot_aggregator.py
+"""
+On-device aggregation of flow samples into compact periodic summaries.
+
+Instead of one message per flow session, the meter keeps rolling per-minute
+and per-hour volume buckets in `array` ring buffers plus min/max/mean flow rate
+and session counts for the current reporting period, and publishes one summary
+per period. Per-session detail can optionally be included.
+"""
+
+from array import array
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+from samples.pinot_flow_meter import FlowSample
+
+MINUTES_KEPT = 60
+HOURS_KEPT = 24
+
+
+class _RollingBuckets:
+    """
+    Fixed number of consecutive time buckets, e.g. the last 60 minutes.
+    """
+
+    __slots__ = ['size', 'width', 'values', 'last_index']
+
+    def __init__(self, size: int, width: float):
+        self.size = size
+        self.width = width
+        self.values = array('d', bytes(8 * size))
+        self.last_index = None  # type: Optional[int]
+
+    def _advance(self, index: int):
+        last = self.last_index
+        if last is not None and index > last:
+            # clear the buckets skipped since the last update
+            for i in range(last + 1, min(index, last + self.size) + 1):
+                self.values[i % self.size] = 0.0
+        if last is None or index > last:
+            self.last_index = index
+
+    def add(self, timestamp: float, value: float):
+        index = int(timestamp // self.width)
+        self._advance(index)
+        if index > self.last_index - self.size:
+            self.values[index % self.size] += value
+
+    def total(self, timestamp: float) -> float:
+        self._advance(int(timestamp // self.width))
+        return sum(self.values)
+
+    def recent(self, timestamp: float, count: int) -> List[float]:
+        """
+        Values of the `count` most recent buckets up to `timestamp`, oldest first.
+        """
+        index = int(timestamp // self.width)
+        self._advance(index)
+        count = min(count, self.size)
+        return [self.values[i % self.size] for i in range(index - count + 1, index + 1)]
+
+
+class _ChannelAggregate:
+
+    def __init__(self, session_gap: float, include_sessions: bool):
+        self.session_gap = session_gap
+        self.include_sessions = include_sessions
+        self.minutes = _RollingBuckets(MINUTES_KEPT, 60.0)
+        self.hours = _RollingBuckets(HOURS_KEPT, 3600.0)
+        self.reset()
+        # state of the session in progress, kept across periods
+        self.session_start = None  # type: Optional[float]
+        self.session_last_flow = 0.0
+        self.session_volume = 0.0
+
+    def reset(self):
+        self.pulses = 0
+        self.volume = 0.0
+        self.rate_min = math.inf
+        self.rate_max = 0.0
+        self.rate_sum = 0.0
+        self.rate_count = 0
+        self.sessions = 0
+        self.session_detail = array('d')  # flat (start, duration, volume) triples
+
+    def _end_session(self):
+        if self.include_sessions:
+            self.session_detail.extend((
+                self.session_start,
+                self.session_last_flow - self.session_start,
+                self.session_volume))
+        self.session_start = None
+        self.session_volume = 0.0
+
+    def add(self, sample: FlowSample, now: float):
+        if self.session_start is not None and not sample.pulses and \
+                now - self.session_last_flow >= self.session_gap:
+            self._end_session()
+        if not sample.pulses:
+            return
+
+        self.pulses += sample.pulses
+        self.volume += sample.volume
+        self.minutes.add(now, sample.volume)
+        self.hours.add(now, sample.volume)
+        rate = sample.flow_rate
+        if rate < self.rate_min:
+            self.rate_min = rate
+        if sample.peak_flow_rate > self.rate_max:
+            self.rate_max = sample.peak_flow_rate
+        self.rate_sum += rate
+        self.rate_count += 1
+
+        if self.session_start is None:
+            self.session_start = now - sample.elapsed
+            self.sessions += 1
+        self.session_last_flow = now
+        self.session_volume += sample.volume
+
+    def summary(self, now: float, period_start: float) -> Dict[str, Any]:
+        # every minute bucket the period touched
+        minutes = min(MINUTES_KEPT, int(now // 60.0) - int(period_start // 60.0) + 1)
+        summary = {
+            'pulses': self.pulses,
+            'volume': round(self.volume, 2),
+            # [min, mean, max] in L/min over the windows with flow
+            'rate': [
+                round(self.rate_min, 3) if self.rate_count else 0.0,
+                round(self.rate_sum / self.rate_count, 3) if self.rate_count else 0.0,
+                round(self.rate_max, 3),
+            ],
+            'sessions': self.sessions,
+            'minutes': [round(v, 1) for v in self.minutes.recent(now, minutes)],
+            'last_hour': round(self.minutes.total(now), 2),
+            'last_day': round(self.hours.total(now), 2),
+        }
+        if self.include_sessions:
+            detail = self.session_detail
+            summary['detail'] = [
+                [round(detail[i], 3), round(detail[i + 1], 3), round(detail[i + 2], 2)]
+                for i in range(0, len(detail), 3)]
+        return summary
+
+
+class FlowAggregator:
+    """
+    Aggregates the `FlowSample`s of one or more channels between summaries.
+
+    Args:
+        channels: Channel names.
+        session_gap: Seconds without flow after which a session is over.
+        include_sessions: Add the start time (epoch seconds), duration
+            (seconds) and volume (mL) of every session that ended in the
+            period to the summary.
+    """
+
+    def __init__(self, channels: Iterable[str], session_gap: float = 3.0, include_sessions: bool = False):
+        self.session_gap = session_gap
+        self.include_sessions = include_sessions
+        self._channels = {name: _ChannelAggregate(session_gap, include_sessions) for name in channels}
+        self._period_start = None  # type: Optional[float]
+
+    def add(self, channel: str, sample: FlowSample, now: float):
+        """
+        Add the sample of one window.
+
+        Args:
+            channel: Channel name.
+            sample: `FlowSample` of the window.
+            now: Wall clock time (`time.time()`) at the end of the window.
+        """
+        if self._period_start is None:
+            self._period_start = now - sample.elapsed
+        self._channels[channel].add(sample, now)
+
+    def has_flow(self) -> bool:
+        """
+        Whether any channel saw flow, or ended a session, in the current period.
+        """
+        return any(c.pulses or len(c.session_detail) for c in self._channels.values())
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        """
+        Summary of the current period, which is then reset.
+
+        Args:
+            now: Wall clock time (`time.time()`) ending the period.
+        """
+        period_start = self._period_start if self._period_start is not None else now
+        summary = {
+            'period': round(now - period_start, 3),
+            'channels': {name: c.summary(now, period_start) for name, c in self._channels.items()},
+        }
+        for c in self._channels.values():
+            c.reset()
+        self._period_start = now
+        return summary
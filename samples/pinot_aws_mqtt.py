@@ -1,9 +1,13 @@
 # aws_iot_publisher.py
-import json
-import socket
+import concurrent.futures
+import threading
+import time
 from awscrt import mqtt
 from awsiot import mqtt_connection_builder
 import logging
+import os
+from samples.pinot_connection import CONNECTED, ConnectionSupervisor
+from samples.pinot_event_queue import EventQueue, RateLimiter
 
 from datetime import datetime
 
@@ -12,16 +16,61 @@ def get_current_time_str():
     # ISO 8601 형식 (예: 2024-02-07T15:00:00)
     return datetime.now().isoformat()
 
+# 전송 대기 중인 이벤트를 저장하는 기본 경로
+DEFAULT_QUEUE_FILE = os.path.expanduser("~/.pinot/outbox.db")
+
+# PUBACK을 기다리는 중 종료 요청을 확인하는 간격 (초)
+ACK_POLL_INTERVAL = 0.1
+
+
 class AwsIotPublisher:
-    def __init__(self, endpoint, ca_file, cert_file, key_file, client_id, topic):
+    """
+    모든 메시지는 먼저 디스크 큐(EventQueue)에 기록되고, 백그라운드 스레드가
+    연결되어 있을 때 batch_size 단위로 전송한 뒤 PUBACK을 받은 메시지만 큐에서 삭제한다.
+    연결은 ConnectionSupervisor가 백그라운드에서 관리하므로 호출하는 쪽은 블록되지 않는다.
+
+    Args:
+        queue_file: 큐 데이터베이스 경로
+        batch_size: 한 번에 전송 중(in-flight)일 수 있는 최대 메시지 수
+        max_publish_rate: 초당 최대 전송 수 (None이면 제한 없음)
+        ack_timeout: 배치의 PUBACK을 기다리는 최대 시간 (초)
+        commit_every, commit_interval, synchronous: EventQueue의 fsync 배치 설정
+        min_backoff, max_backoff: 재연결 시도 간격 (초, 지터 적용)
+    """
+
+    def __init__(self, endpoint, ca_file, cert_file, key_file, client_id, topic,
+                 queue_file=DEFAULT_QUEUE_FILE, batch_size=10, max_publish_rate=20.0, ack_timeout=30.0,
+                 commit_every=16, commit_interval=5.0, synchronous='NORMAL',
+                 min_backoff=1.0, max_backoff=60.0):
         self.endpoint = endpoint
         self.ca_file = ca_file
         self.cert_file = cert_file
         self.key_file = key_file
         self.client_id = client_id
         self.topic = topic
-        self.mqtt_connection = self.create_mqtt_connection()
+        self.batch_size = batch_size
+        self.ack_timeout = ack_timeout
         self.is_connected_flag = False
+        # 연결 상태는 awscrt 콜백으로 추적 (네트워크 프로브 없음)
+        self.supervisor = ConnectionSupervisor(
+            min_backoff=min_backoff,
+            max_backoff=max_backoff,
+            on_state_change=self._on_state_change)
+        self.mqtt_connection = self.create_mqtt_connection()
+        self.supervisor.connect = self.mqtt_connection.connect
+
+        self.queue = EventQueue(
+            queue_file,
+            commit_every=commit_every,
+            commit_interval=commit_interval,
+            synchronous=synchronous)
+        self.published_count = 0
+        self.acked_count = 0
+        self._rate_limiter = RateLimiter(max_publish_rate)
+        self._drain_event = threading.Event()
+        self._closing = False
+        self._drain_thread = threading.Thread(target=self._drain_loop, name='AwsIotPublisher-drain', daemon=True)
+        self._drain_thread.start()
     
     def create_mqtt_connection(self):
         return mqtt_connection_builder.mtls_from_path(
@@ -31,43 +80,119 @@ class AwsIotPublisher:
             ca_filepath=self.ca_file,
             client_id=self.client_id,
             clean_session=False,
-            keep_alive_secs=30)
-
-    def is_wifi_connected(self, hostname="8.8.8.8", port=53, timeout=3):
-        try:
-            socket.setdefaulttimeout(timeout)
-            socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((hostname, port))
-            return True
-        except socket.error as ex:
-            logging.error(f"Wi-Fi 연결 실패: {ex}")
-            return False
+            keep_alive_secs=30,
+            on_connection_success=self.supervisor.on_connection_success,
+            on_connection_failure=self.supervisor.on_connection_failure,
+            on_connection_interrupted=self.supervisor.on_connection_interrupted,
+            on_connection_resumed=self.supervisor.on_connection_resumed,
+            on_connection_closed=self.supervisor.on_connection_closed)
+
+    def _on_state_change(self, state):
+        logging.info(f"MQTT connection state: {state}")
+        self.is_connected_flag = state == CONNECTED
+        if self.is_connected_flag:
+            self._drain_event.set()  # 오프라인 동안 쌓인 메시지 전송
 
     def publish_message(self, message):
-        logging.info(f"Publishing message to topic '{self.topic}': {message}")
-        message_json = json.dumps(message)
-        self.mqtt_connection.publish(
-            topic=self.topic,
-            payload=message_json,
-            qos=mqtt.QoS.AT_LEAST_ONCE)
-        
-    def connect(self):
-        if self.is_wifi_connected():
-            logging.info("Wi-Fi connected, connecting to MQTT...")
-            connect_future = self.mqtt_connection.connect()
-            connect_future.result()  # wait for connection to be established
-            self.is_connected_flag = True  # 연결 성공 시 플래그 업데이트
-            logging.info("MQTT connection established")
-            return True
-        else:
-            logging.error("Wi-Fi is not connected")
+        # 먼저 큐에 저장하고, 실제 전송은 백그라운드 스레드가 담당
+        logging.info(f"Queueing message for topic '{self.topic}': {message}")
+        self.queue.put(message)
+        self._drain_event.set()
+
+    def flush(self):
+        # 큐에 버퍼링된 메시지를 즉시 디스크에 기록
+        self.queue.flush()
+
+    def _drain_loop(self):
+        while not self._closing:
+            # commit_interval 마다 깨어나 버퍼링된 메시지를 커밋
+            self._drain_event.wait(self.queue.commit_interval)
+            self._drain_event.clear()
+            self.queue.maybe_commit()
+            while not self._closing and self.is_connected_flag:
+                if not self._send_batch():
+                    break
+
+    def _send_batch(self):
+        # 가장 오래된 메시지부터 batch_size 개를 전송하고 PUBACK을 기다림
+        batch = self.queue.peek(self.batch_size)
+        if not batch:
             return False
 
+        futures = []
+        for event_id, payload in batch:
+            if self._closing:
+                break
+            delay = self._rate_limiter.delay()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                future, _ = self.mqtt_connection.publish(
+                    topic=self.topic,
+                    payload=payload,
+                    qos=mqtt.QoS.AT_LEAST_ONCE)
+            except Exception as ex:
+                logging.error(f"Publish failed: {ex}")
+                break
+            self.published_count += 1
+            futures.append((event_id, future))
+
+        # 순서 유지를 위해 처음 실패한 메시지 앞까지만 삭제하고,
+        # 나머지는 다음 배치에서 재전송
+        delivered = []
+        for event_id, future in futures:
+            if not self._wait_for_puback(event_id, future):
+                break
+            delivered.append(event_id)
+
+        self.queue.ack(delivered)
+        self.acked_count += len(delivered)
+        logging.info(f"Delivered {len(delivered)}/{len(batch)} queued messages, {len(self.queue)} remaining")
+        # 일부라도 실패하면 다음 트리거까지 대기
+        # (순서 유지를 위해 재전송은 다음 배치에서)
+        return len(delivered) == len(batch)
+
+    def _wait_for_puback(self, event_id, future):
+        # close()가 ack_timeout 동안 막히지 않도록 짧게 나누어 기다림
+        deadline = time.monotonic() + self.ack_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                future.result(max(0.0, min(remaining, ACK_POLL_INTERVAL)))
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._closing or remaining <= ACK_POLL_INTERVAL:
+                    logging.error(f"No PUBACK for queued event {event_id} before "
+                                  f"{'close' if self._closing else 'timeout'}")
+                    return False
+            except Exception as ex:
+                logging.error(f"No PUBACK for queued event {event_id}: {ex}")
+                return False
+
+    def connect(self, timeout=0):
+        # 백그라운드 연결을 시작하고, timeout 초 동안만 연결을 기다림
+        # (기본값: 기다리지 않음)
+        self.supervisor.start()
+        if timeout:
+            return self.supervisor.wait_connected(timeout)
+        return self.is_connected()
+
     def disconnect(self):
         logging.info("Disconnecting from MQTT...")
+        self.supervisor.stop()
+        self.is_connected_flag = False
         disconnect_future = self.mqtt_connection.disconnect()
         disconnect_future.result()
         logging.info("Disconnected from MQTT")
 
+    def close(self):
+        # 전송 스레드를 멈추고 남은 메시지를 디스크에 기록
+        self.supervisor.stop()
+        self._closing = True
+        self._drain_event.set()
+        self._drain_thread.join()
+        self.queue.close()
+
     def is_connected(self):
         # 연결 상태 플래그 반환
         return self.is_connected_flag
@@ -0,0 +1,178 @@
+# pinot_connection.py
+"""
+Background supervision of the MQTT connection.
+
+The link state is tracked from the awscrt connection callbacks instead of
+probing the network, and connection attempts run on the supervisor thread
+with jittered exponential backoff so callers never block on them.
+
+awscrt reconnects on its own once a connection has been established and
+is then interrupted, so the supervisor only drives the initial connect and
+retries after a failed or closed connection.
+"""
+
+from concurrent.futures import Future
+import logging
+import random
+import threading
+from typing import Callable, Optional
+
+DISCONNECTED = 'DISCONNECTED'
+CONNECTING = 'CONNECTING'
+CONNECTED = 'CONNECTED'
+INTERRUPTED = 'INTERRUPTED'
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionSupervisor:
+    """
+    Keeps an MQTT connection up from a background thread.
+
+    Pass the `on_connection_*` methods of this object to
+    `mqtt_connection_builder` so it sees every state change.
+
+    Args:
+        connect: Function starting a connection attempt and returning its
+            `Future`, e.g. `mqtt_connection.connect`. May be set after
+            construction, before `start()`.
+        min_backoff: Upper bound of the first retry delay, in seconds.
+        max_backoff: Upper bound of any retry delay, in seconds.
+        on_state_change: (Optional) Callback invoked with the new state
+            (one of DISCONNECTED, CONNECTING, CONNECTED, INTERRUPTED).
+            Called from awscrt or supervisor threads, keep it short.
+    """
+
+    def __init__(self,
+                 connect: Optional[Callable[[], Future]] = None,
+                 min_backoff: float = 1.0,
+                 max_backoff: float = 60.0,
+                 on_state_change: Optional[Callable[[str], None]] = None):
+        self.connect = connect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.on_state_change = on_state_change
+        self.attempts = 0
+        self.failures = 0
+
+        self._state = DISCONNECTED
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._connected = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def is_connected(self) -> bool:
+        return self._state == CONNECTED
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until connected or `timeout` seconds have passed.
+        Returns whether the connection is up.
+        """
+        return self._connected.wait(timeout)
+
+    def start(self):
+        """
+        Start supervising. Does nothing if already started.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='ConnectionSupervisor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the supervisor thread. The connection itself is left as is.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        thread.join()
+
+    # awscrt connection callbacks
+
+    def on_connection_success(self, connection, callback_data):
+        self._set_state(CONNECTED)
+
+    def on_connection_failure(self, connection, callback_data):
+        if self._state == INTERRUPTED:
+            # a failed automatic reconnect, awscrt keeps trying
+            return
+        self._set_state(DISCONNECTED)
+
+    def on_connection_interrupted(self, connection, error, **kwargs):
+        logger.warning("Connection interrupted: %s", error)
+        self._set_state(INTERRUPTED)
+
+    def on_connection_resumed(self, connection, return_code, session_present, **kwargs):
+        logger.info("Connection resumed: %s, session present: %s", return_code, session_present)
+        self._set_state(CONNECTED)
+
+    def on_connection_closed(self, connection, callback_data):
+        self._set_state(DISCONNECTED)
+
+    def _set_state(self, state: str):
+        with self._lock:
+            if state == self._state:
+                return
+            self._state = state
+        if state == CONNECTED:
+            self._connected.set()
+        else:
+            self._connected.clear()
+        if state == DISCONNECTED:
+            # let the supervisor thread retry
+            self._wakeup.set()
+        if self.on_state_change is not None:
+            self.on_state_change(state)
+
+    def _backoff(self, failures: int) -> float:
+        # "full jitter": uniform in [0, min(max, min * 2^n)] so a fleet doesn't reconnect in lockstep
+        ceiling = min(self.max_backoff, self.min_backoff * (2 ** min(failures, 32)))
+        return random.uniform(0, ceiling)
+
+    def _run(self):
+        consecutive_failures = 0
+        while not self._stopping.is_set():
+            if self._state != DISCONNECTED:
+                # connected, connecting or awscrt is reconnecting, wait for a state change
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            self.attempts += 1
+            self._set_state(CONNECTING)
+            try:
+                future = self.connect()
+                # awscrt fails the attempt itself on timeout, don't start another one meanwhile
+                future.add_done_callback(lambda _: self._wakeup.set())
+                while not future.done() and not self._stopping.is_set():
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                if not future.done():
+                    return
+                future.result()
+                consecutive_failures = 0
+                self._set_state(CONNECTED)
+                continue
+            except Exception as e:
+                logger.warning("Connection attempt failed: %s", e)
+                self.failures += 1
+                if self._state == CONNECTING:
+                    self._set_state(DISCONNECTED)
+
+            delay = self._backoff(consecutive_failures)
+            consecutive_failures += 1
+            self._stopping.wait(delay)
+            self._wakeup.clear()
@@ -0,0 +1,175 @@
+# pinot_event_queue.py
+"""
+Durable store-and-forward queue for flow events.
+
+Every event is written to a SQLite database in WAL mode before it is
+published, and only removed once the broker has acknowledged it, so events
+survive Wi-Fi outages and process restarts.
+
+To spare the SD card, writes are group-committed: events are buffered in
+memory and committed in one transaction once `commit_every` events are pending
+or `commit_interval` seconds have passed, whichever comes first. `synchronous`
+selects how hard SQLite syncs each commit (see the SQLite PRAGMA docs); the
+default "NORMAL" only fsyncs the WAL at checkpoints.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class EventQueue:
+    """
+    FIFO queue of JSON events persisted in SQLite.
+
+    Args:
+        path: Database file. Parent directories are created if needed.
+            ":memory:" gives a non-durable queue, useful for tests.
+        commit_every: Number of pending events that triggers a commit.
+            1 commits every event immediately.
+        commit_interval: Maximum number of seconds an event stays uncommitted.
+            Checked whenever the queue is used; call `flush()` to force it.
+        synchronous: SQLite synchronous mode, one of OFF, NORMAL, FULL, EXTRA.
+    """
+
+    def __init__(self,
+                 path: str,
+                 commit_every: int = 16,
+                 commit_interval: float = 5.0,
+                 synchronous: str = 'NORMAL'):
+        if commit_every < 1:
+            raise ValueError("commit_every must be at least 1")
+        synchronous = synchronous.upper()
+        if synchronous not in _SYNCHRONOUS_MODES:
+            raise ValueError("synchronous must be one of {}".format(', '.join(_SYNCHRONOUS_MODES)))
+
+        if path != ':memory:':
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+
+        self._lock = threading.RLock()
+        self._pending = []  # type: List[Tuple[float, bytes]]
+        self._oldest_pending = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous={}'.format(synchronous))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'created REAL NOT NULL, '
+            'payload BLOB NOT NULL)')
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._db.execute('SELECT COUNT(*) FROM events').fetchone()
+            return count + len(self._pending)
+
+    def put(self, message: Dict[str, Any]):
+        """
+        Append an event. It becomes durable at the next commit.
+        """
+        payload = json.dumps(message, separators=(',', ':')).encode()
+        with self._lock:
+            now = time.time()
+            if not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.append((now, payload))
+            self._maybe_commit()
+
+    def flush(self):
+        """
+        Commit all buffered events to disk.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT INTO events (created, payload) VALUES (?, ?)', self._pending)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._pending = []
+
+    def peek(self, limit: int) -> List[Tuple[int, bytes]]:
+        """
+        Return up to `limit` of the oldest events as (id, payload) pairs,
+        without removing them. Buffered events are committed first.
+        """
+        with self._lock:
+            self.flush()
+            return self._db.execute('SELECT id, payload FROM events ORDER BY id LIMIT ?', (limit,)).fetchall()
+
+    def ack(self, ids: List[int]):
+        """
+        Remove delivered events.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('DELETE FROM events WHERE id = ?', [(i,) for i in ids])
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+    def maybe_commit(self):
+        """
+        Commit buffered events if `commit_interval` has elapsed.
+        """
+        with self._lock:
+            self._maybe_commit()
+
+    def _maybe_commit(self):
+        if not self._pending:
+            return
+        if len(self._pending) >= self.commit_every or \
+                time.monotonic() - self._oldest_pending >= self.commit_interval:
+            self.flush()
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how many messages are published per second.
+
+    Args:
+        rate: Messages per second, None or 0 disables the limit.
+        burst: Maximum number of tokens that can accumulate.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def delay(self, count: int = 1) -> float:
+        """
+        Take `count` tokens and return how many seconds to wait before using them.
+        """
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= count
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
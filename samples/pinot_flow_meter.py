@@ -0,0 +1,452 @@
+# pinot_flow_meter.py
+"""
+Interrupt-driven flow sampling for the Pinot water meter.
+
+Pulse edges are delivered by a GPIO backend callback and stored as
+monotonic timestamps in a `PulseCapture` ring buffer. A sampler thread sleeps
+until the end of each reporting window (or until it is woken up by
+`FlowMeter.stop()`), drains the buffer and reports the flow rate and volume of
+that window. Nothing polls the clock, so an idle meter costs no CPU.
+
+The flow rate is derived from the intervals between pulses rather than from
+the pulse count of the window, so a burst that straddles a window boundary is
+neither lost nor aliased into the wrong window.
+
+The GPIO access is pluggable: `RPiGpioBackend` talks to a Raspberry Pi and
+`SimulatedPulseSource` generates pulses in software so the meter can be
+exercised and benchmarked on any Linux box.
+"""
+
+from array import array
+import collections
+import operator
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+PulseCallback = Callable[[float], None]
+
+# 1 L = 1000 mL
+MILLILITRES_PER_LITRE = 1000.0
+
+
+class GpioBackend:
+    """
+    Base class for the source of flow sensor pulses.
+
+    Subclasses call the registered callback with a `time.monotonic()`
+    timestamp for every falling edge on the watched pin.
+    """
+
+    def add_pulse_listener(self, pin: int, callback: PulseCallback):
+        raise NotImplementedError()
+
+    def remove_pulse_listener(self, pin: int):
+        raise NotImplementedError()
+
+    def cleanup(self):
+        pass
+
+
+class RPiGpioBackend(GpioBackend):
+    """
+    Pulse source backed by the RPi.GPIO edge detection thread.
+
+    Args:
+        bouncetime: (Optional) Debounce time in milliseconds passed to
+            `GPIO.add_event_detect()`.
+    """
+
+    def __init__(self, bouncetime: Optional[int] = None):
+        # imported here so the rest of the module works off the Pi
+        import RPi.GPIO as GPIO
+        self._gpio = GPIO
+        self._bouncetime = bouncetime
+        GPIO.setmode(GPIO.BCM)
+
+    def add_pulse_listener(self, pin: int, callback: PulseCallback):
+        GPIO = self._gpio
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+        def on_edge(channel, _now=time.monotonic):
+            callback(_now())
+
+        kwargs = {}
+        if self._bouncetime is not None:
+            kwargs['bouncetime'] = self._bouncetime
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=on_edge, **kwargs)
+
+    def remove_pulse_listener(self, pin: int):
+        self._gpio.remove_event_detect(pin)
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+class SimulatedPulseSource(GpioBackend):
+    """
+    Software pulse source for testing and benchmarking without hardware.
+
+    Each registered pin gets its own thread that emits pulses at the
+    configured frequency, timestamped the same way `RPiGpioBackend` does.
+
+    Args:
+        frequency_hz: Initial pulse frequency for every pin, 0 means no flow.
+    """
+
+    def __init__(self, frequency_hz: float = 0.0):
+        self._default_frequency = frequency_hz
+        self._frequencies = {}  # type: Dict[int, float]
+        self._threads = {}  # type: Dict[int, threading.Thread]
+        self._stop_events = {}  # type: Dict[int, threading.Event]
+        self._wakeups = {}  # type: Dict[int, threading.Event]
+        self._lock = threading.Lock()
+        self.emitted = collections.Counter()
+
+    def set_frequency(self, frequency_hz: float, pin: Optional[int] = None):
+        """
+        Change the pulse frequency of one pin, or of every pin if `pin` is None.
+        """
+        with self._lock:
+            pins = list(self._frequencies) if pin is None else [pin]
+            if pin is None:
+                self._default_frequency = frequency_hz
+            for p in pins:
+                self._frequencies[p] = frequency_hz
+                wakeup = self._wakeups.get(p)
+                if wakeup is not None:
+                    wakeup.set()
+
+    def add_pulse_listener(self, pin: int, callback: PulseCallback):
+        with self._lock:
+            if pin in self._threads:
+                raise ValueError("pin {} already has a listener".format(pin))
+            self._frequencies.setdefault(pin, self._default_frequency)
+            stop_event = threading.Event()
+            wakeup = threading.Event()
+            thread = threading.Thread(
+                target=self._run,
+                args=(pin, callback, stop_event, wakeup),
+                name='SimulatedPulseSource-{}'.format(pin),
+                daemon=True)
+            self._threads[pin] = thread
+            self._stop_events[pin] = stop_event
+            self._wakeups[pin] = wakeup
+        thread.start()
+
+    def remove_pulse_listener(self, pin: int):
+        with self._lock:
+            thread = self._threads.pop(pin, None)
+            stop_event = self._stop_events.pop(pin, None)
+            wakeup = self._wakeups.pop(pin, None)
+        if thread is None:
+            return
+        stop_event.set()
+        wakeup.set()
+        thread.join()
+
+    def cleanup(self):
+        for pin in list(self._threads):
+            self.remove_pulse_listener(pin)
+
+    def _run(self, pin, callback, stop_event, wakeup):
+        next_pulse = time.monotonic()
+        while not stop_event.is_set():
+            frequency = self._frequencies.get(pin, 0.0)
+            if frequency <= 0:
+                # no flow, sleep until the frequency changes
+                wakeup.wait()
+                wakeup.clear()
+                next_pulse = time.monotonic()
+                continue
+
+            next_pulse += 1.0 / frequency
+            delay = next_pulse - time.monotonic()
+            if delay > 0:
+                if wakeup.wait(delay):
+                    wakeup.clear()
+                    next_pulse = time.monotonic()
+                    continue
+            else:
+                # fell behind (e.g. the host was busy), don't try to catch up with a burst
+                next_pulse = time.monotonic()
+            callback(next_pulse)
+            self.emitted[pin] += 1
+
+
+class PulseCapture:
+    """
+    Preallocated single-producer/single-consumer ring buffer of pulse timestamps.
+
+    `push()` is called from the GPIO callback thread and `drain()` from the
+    sampler thread. Each side only ever writes its own index, and the producer
+    stores the timestamp before publishing the new head, so no lock is needed
+    and a pulse arriving while the consumer drains is kept for the next drain
+    instead of being lost.
+
+    When the buffer is full new pulses are dropped and counted in `overflows`.
+
+    Args:
+        capacity: Maximum number of timestamps held between two drains.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.overflows = 0
+        self._timestamps = array('d', bytes(8 * capacity))
+        # total number of pulses written (producer) and read (consumer)
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, timestamp: float):
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.overflows += 1
+            return
+        self._timestamps[head % self.capacity] = timestamp
+        self._head = head + 1
+
+    def drain(self) -> array:
+        """
+        Remove and return all captured timestamps, oldest first.
+        """
+        head = self._head
+        tail = self._tail
+        if head == tail:
+            return array('d')
+        start = tail % self.capacity
+        end = head % self.capacity
+        if start < end:
+            pulses = self._timestamps[start:end]
+        else:
+            pulses = self._timestamps[start:] + self._timestamps[:end]
+        self._tail = head
+        return pulses
+
+
+def pulse_intervals(timestamps: array, previous: Optional[float] = None) -> array:
+    """
+    Intervals between consecutive pulses, in seconds.
+
+    Args:
+        timestamps: Pulse timestamps, oldest first.
+        previous: (Optional) Timestamp of the pulse preceding `timestamps`,
+            e.g. the last pulse of the previous window.
+    """
+    if previous is not None and len(timestamps):
+        timestamps = array('d', (previous,)) + timestamps
+    return array('d', map(operator.sub, timestamps[1:], timestamps[:-1]))
+
+
+class FlowSample:
+    """
+    Flow measured over one sampling window.
+
+    Attributes:
+        timestamp (float): `time.monotonic()` at the end of the window.
+        elapsed (float): Length of the window in seconds.
+        pulses (int): Number of pulses counted in the window.
+        flow_rate (float): Mean flow rate in litres per minute, computed from
+            the intervals between the pulses of the window.
+        peak_flow_rate (float): Highest flow rate seen between two
+            consecutive pulses in the window, in litres per minute.
+        volume (float): Volume that flowed during the window, in millilitres.
+    """
+
+    __slots__ = ['timestamp', 'elapsed', 'pulses', 'flow_rate', 'peak_flow_rate', 'volume']
+
+    def __init__(self, timestamp, elapsed, pulses, flow_rate, volume, peak_flow_rate=None):
+        self.timestamp = timestamp
+        self.elapsed = elapsed
+        self.pulses = pulses
+        self.flow_rate = flow_rate
+        self.peak_flow_rate = flow_rate if peak_flow_rate is None else peak_flow_rate
+        self.volume = volume
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join('{}={!r}'.format(slot, getattr(self, slot)) for slot in self.__slots__))
+
+
+class FlowMeter:
+    """
+    Turns the pulses of one flow sensor into per-window flow samples.
+
+    Args:
+        backend: `GpioBackend` delivering the sensor pulses.
+        pin: BCM pin the sensor is wired to.
+        calibration_factor: Pulse frequency (Hz) per litre/minute of flow.
+            5.5 for the sensors used by the Pinot meter.
+        window: Length of a sampling window in seconds.
+        on_sample: (Optional) Callback invoked from the sampler thread with
+            each `FlowSample`. If not set, samples are queued and can be read
+            with `samples()`.
+        buffer_size: Number of pulse timestamps the `PulseCapture` holds
+            between two windows. Pulses arriving while it is full are dropped,
+            which is counted in `overflows`.
+    """
+
+    def __init__(self,
+                 backend: GpioBackend,
+                 pin: int,
+                 calibration_factor: float = 5.5,
+                 window: float = 1.0,
+                 on_sample: Optional[Callable[[FlowSample], None]] = None,
+                 buffer_size: int = 4096):
+        if calibration_factor <= 0:
+            raise ValueError("calibration_factor must be positive")
+        if window <= 0:
+            raise ValueError("window must be positive")
+
+        self.backend = backend
+        self.pin = pin
+        self.calibration_factor = calibration_factor
+        self.window = window
+        self.total_pulses = 0
+
+        self._on_sample = on_sample
+        self._samples = queue.Queue()  # type: queue.Queue
+        self._capture = PulseCapture(buffer_size)
+        self._last_pulse = None  # type: Optional[float]
+        self._window_start = None  # type: Optional[float]
+        self._stop_event = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def overflows(self) -> int:
+        """
+        Number of pulses dropped because the capture buffer was full
+        """
+        return self._capture.overflows
+
+    def attach(self):
+        """
+        Register with the GPIO backend without starting a sampler thread.
+        The caller is then responsible for calling `sample()` once per window,
+        which lets one scheduler drive many meters.
+        """
+        self._window_start = time.monotonic()
+        self.backend.add_pulse_listener(self.pin, self._on_pulse)
+
+    def detach(self):
+        """
+        Unregister from the GPIO backend.
+        """
+        self.backend.remove_pulse_listener(self.pin)
+
+    def sample(self, now: Optional[float] = None) -> FlowSample:
+        """
+        Close the current window and return its `FlowSample`.
+
+        Args:
+            now: (Optional) `time.monotonic()` timestamp closing the window.
+        """
+        if now is None:
+            now = time.monotonic()
+        window_start = self._window_start if self._window_start is not None else now
+        timestamps = self._capture.drain()
+        self.total_pulses += len(timestamps)
+        self._window_start = now
+        return self._make_sample(now, now - window_start, timestamps)
+
+    def start(self):
+        """
+        Register with the GPIO backend and start the sampler thread.
+        """
+        if self._thread is not None:
+            raise RuntimeError("FlowMeter already started")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='FlowMeter-{}'.format(self.pin), daemon=True)
+        self.attach()
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the sampler thread and unregister from the GPIO backend.
+        Any queued samples can still be read with `samples()`.
+        """
+        if self._thread is None:
+            return
+        self.detach()
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        # unblock readers of samples()
+        self._samples.put(None)
+
+    def samples(self, timeout: Optional[float] = None) -> Iterator[FlowSample]:
+        """
+        Iterate over flow samples as they are produced.
+
+        Blocks until the next window closes. Iteration ends after `stop()`,
+        or when no sample arrives within `timeout` seconds.
+        """
+        while True:
+            try:
+                sample = self._samples.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if sample is None:
+                return
+            yield sample
+
+    def _on_pulse(self, timestamp: float):
+        # runs on the backend's callback thread, keep it short
+        self._capture.push(timestamp)
+
+    def _make_sample(self, now: float, elapsed: float, timestamps: array) -> FlowSample:
+        pulses = len(timestamps)
+        litres = pulses / self.calibration_factor / 60.0
+        flow_rate = 0.0
+        peak_flow_rate = 0.0
+        if pulses:
+            intervals = pulse_intervals(timestamps, self._last_pulse)
+            total = sum(intervals)
+            if total > 0:
+                # mean frequency over the pulses of this window, anchored on the
+                # last pulse of the previous one so boundary pulses are not aliased
+                flow_rate = len(intervals) / total / self.calibration_factor
+                shortest = min(intervals)
+                peak_flow_rate = 1.0 / shortest / self.calibration_factor if shortest > 0 else flow_rate
+            elif elapsed > 0:
+                # a single pulse after a pause, or pulses all stamped alike,
+                # all we know is the count
+                flow_rate = peak_flow_rate = pulses / elapsed / self.calibration_factor
+            self._last_pulse = timestamps[-1]
+        elif self._last_pulse is not None and now - self._last_pulse > self.window:
+            # flow stopped, don't measure the next pulse against this stale one
+            self._last_pulse = None
+
+        return FlowSample(
+            timestamp=now,
+            elapsed=elapsed,
+            pulses=pulses,
+            flow_rate=flow_rate,
+            peak_flow_rate=peak_flow_rate,
+            volume=litres * MILLILITRES_PER_LITRE)
+
+    def _run(self):
+        deadline = self._window_start + self.window
+        while True:
+            # sleep until the window closes, stop() wakes us up early
+            stopped = self._stop_event.wait(max(0.0, deadline - time.monotonic()))
+            now = time.monotonic()
+            sample = self.sample(now)
+            if self._on_sample is not None:
+                self._on_sample(sample)
+            else:
+                self._samples.put(sample)
+            if stopped:
+                return
+
+            deadline += self.window
+            if deadline <= now:
+                # missed whole windows (e.g. a long callback), realign instead of bursting
+                deadline = now + self.window
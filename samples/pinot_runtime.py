@@ -0,0 +1,284 @@
+# pinot_runtime.py
+"""
+Config-driven runtime for Pinot water meters with several flow sensors.
+
+All channels share one scheduler thread, one MQTT connection and one
+offline queue. Every `sample_window` seconds the scheduler closes the window
+of every channel and feeds it to a `FlowAggregator`; every
+`reporting_interval` seconds it publishes a single compact summary of all
+channels for that interval.
+
+Run on the Pi with:
+
+    python3 -m samples.pinot_runtime --config site.json --endpoint ... \\
+        --ca_file ... --cert_file ... --key_file ... --client_id ... --topic ...
+
+See `samples/pinot_runtime_config.json` for the config format.
+"""
+
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from samples.pinot_aggregator import FlowAggregator
+from samples.pinot_flow_meter import FlowMeter, FlowSample, GpioBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelConfig:
+    """
+    One flow sensor.
+
+    Args:
+        name: Channel name used in published payloads.
+        pin: BCM pin the sensor is wired to.
+        calibration_factor: Pulse frequency (Hz) per litre/minute of flow.
+    """
+
+    __slots__ = ['name', 'pin', 'calibration_factor']
+
+    def __init__(self, name: str, pin: int, calibration_factor: float = 5.5):
+        self.name = name
+        self.pin = pin
+        self.calibration_factor = calibration_factor
+
+
+class RuntimeConfig:
+    """
+    Configuration of a `PinotRuntime`.
+
+    Args:
+        channels: List of `ChannelConfig`.
+        sample_window: Seconds between two samples of every channel.
+        reporting_interval: Seconds between two published summaries.
+        buffer_size: Pulse capture buffer size of each channel.
+        session_gap: Seconds without flow after which a session is over.
+        include_sessions: Include per-session detail in the summaries.
+    """
+
+    def __init__(self,
+                 channels: List[ChannelConfig],
+                 sample_window: float = 1.0,
+                 reporting_interval: float = 60.0,
+                 buffer_size: int = 4096,
+                 session_gap: float = 3.0,
+                 include_sessions: bool = False):
+        if not channels:
+            raise ValueError("at least one channel is required")
+        names = [c.name for c in channels]
+        if len(set(names)) != len(names):
+            raise ValueError("channel names must be unique")
+        pins = [c.pin for c in channels]
+        if len(set(pins)) != len(pins):
+            raise ValueError("channel pins must be unique")
+        if sample_window <= 0:
+            raise ValueError("sample_window must be positive")
+        if reporting_interval < sample_window:
+            raise ValueError("reporting_interval must be at least sample_window")
+
+        self.channels = channels
+        self.sample_window = sample_window
+        self.reporting_interval = reporting_interval
+        self.buffer_size = buffer_size
+        self.session_gap = session_gap
+        self.include_sessions = include_sessions
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'RuntimeConfig':
+        default_factor = config.get('calibration_factor', 5.5)
+        channels = [
+            ChannelConfig(
+                name=c.get('name', str(c['pin'])),
+                pin=c['pin'],
+                calibration_factor=c.get('calibration_factor', default_factor))
+            for c in config['channels']]
+        return cls(
+            channels,
+            sample_window=config.get('sample_window', 1.0),
+            reporting_interval=config.get('reporting_interval', 60.0),
+            buffer_size=config.get('buffer_size', 4096),
+            session_gap=config.get('session_gap', 3.0),
+            include_sessions=config.get('include_sessions', False))
+
+    @classmethod
+    def load(cls, path: str) -> 'RuntimeConfig':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class PinotRuntime:
+    """
+    Samples every configured channel from one scheduler thread and publishes
+    one summary message per reporting interval.
+
+    Args:
+        config: `RuntimeConfig`.
+        backend: `GpioBackend` shared by all channels.
+        publisher: Object with a `publish_message(dict)` method, normally
+            an `AwsIotPublisher`.
+        on_sample: (Optional) Callback invoked from the scheduler thread
+            with the channel name and `FlowSample` of every window.
+
+    Attributes:
+        publish_count (int): Number of messages handed to the publisher.
+        windows (int): Number of sampling windows closed.
+        max_latency (float): Largest delay, in seconds, between the end of a
+            window and the scheduler sampling it.
+        total_latency (float): Sum of those delays over all windows.
+        scheduler_cpu (float): CPU seconds used by the scheduler thread.
+    """
+
+    def __init__(self,
+                 config: RuntimeConfig,
+                 backend: GpioBackend,
+                 publisher,
+                 on_sample: Optional[Callable[[str, FlowSample], None]] = None):
+        self.config = config
+        self.backend = backend
+        self.publisher = publisher
+        self.on_sample = on_sample
+        self.meters = {
+            c.name: FlowMeter(
+                backend,
+                c.pin,
+                calibration_factor=c.calibration_factor,
+                window=config.sample_window,
+                buffer_size=config.buffer_size)
+            for c in config.channels}
+
+        self.publish_count = 0
+        self.windows = 0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.scheduler_cpu = 0.0
+
+        self.aggregator = FlowAggregator(
+            self.meters,
+            session_gap=config.session_gap,
+            include_sessions=config.include_sessions)
+        self._stop_event = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self):
+        if self._thread is not None:
+            raise RuntimeError("PinotRuntime already started")
+        self._stop_event.clear()
+        for meter in self.meters.values():
+            meter.attach()
+        self._thread = threading.Thread(target=self._run, name='PinotRuntime', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and publish the totals of the unfinished interval.
+        """
+        if self._thread is None:
+            return
+        # detach first so the final sample includes every captured pulse
+        for meter in self.meters.values():
+            meter.detach()
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _report(self):
+        summary = self.aggregator.summary(time.time())
+        summary['time'] = datetime.now().isoformat()
+        self.publisher.publish_message(summary)
+        self.publish_count += 1
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        window = self.config.sample_window
+        windows_per_report = max(1, int(round(self.config.reporting_interval / window)))
+        deadline = time.monotonic() + window
+        window_count = 0
+        while True:
+            stopped = self._stop_event.wait(max(0.0, deadline - time.monotonic()))
+            now = time.monotonic()
+            if not stopped:
+                latency = now - deadline
+                self.total_latency += latency
+                if latency > self.max_latency:
+                    self.max_latency = latency
+
+            wall_now = time.time()
+            for name, meter in self.meters.items():
+                sample = meter.sample(now)
+                self.aggregator.add(name, sample, wall_now)
+                if self.on_sample is not None:
+                    self.on_sample(name, sample)
+            self.windows += 1
+            window_count += 1
+
+            if stopped:
+                # flush the unfinished interval, unless nothing flowed
+                report = self.aggregator.has_flow()
+            else:
+                report = window_count >= windows_per_report
+            if report:
+                try:
+                    self._report()
+                except Exception as e:
+                    logger.error("Failed to publish report: %s", e)
+                window_count = 0
+
+            self.scheduler_cpu = time.thread_time() - cpu_start
+            if stopped:
+                return
+
+            deadline += window
+            if deadline <= now:
+                # missed whole windows, realign instead of bursting
+                deadline = now + window
+
+
+def main():
+    # imported here so the runtime can be used without the Pi and AWS dependencies
+    from samples.pinot_aws_mqtt import AwsIotPublisher, DEFAULT_QUEUE_FILE
+    from samples.pinot_flow_meter import RPiGpioBackend
+
+    parser = argparse.ArgumentParser(description='Pinot multi-channel water meter')
+    parser.add_argument('--config', required=True, help='Path to the runtime config JSON file')
+    parser.add_argument('--endpoint', required=True, help='AWS IoT Core endpoint')
+    parser.add_argument('--ca_file', required=True, help='Path to CA file')
+    parser.add_argument('--cert_file', required=True, help='Path to certificate file')
+    parser.add_argument('--key_file', required=True, help='Path to private key file')
+    parser.add_argument('--client_id', required=True, help='MQTT client ID')
+    parser.add_argument('--topic', required=True, help='MQTT topic to publish')
+    parser.add_argument('--queue_file', default=DEFAULT_QUEUE_FILE, help='Path to the offline message queue database')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = RuntimeConfig.load(os.path.expanduser(args.config))
+    publisher = AwsIotPublisher(
+        args.endpoint,
+        os.path.expanduser(args.ca_file),
+        os.path.expanduser(args.cert_file),
+        os.path.expanduser(args.key_file),
+        args.client_id,
+        args.topic,
+        queue_file=os.path.expanduser(args.queue_file))
+    publisher.connect()
+
+    backend = RPiGpioBackend()
+    runtime = PinotRuntime(config, backend, publisher)
+    runtime.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.stop()
+        publisher.close()
+        backend.cleanup()
+
+
+if __name__ == '__main__':
+    main()
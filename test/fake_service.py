@@ -0,0 +1,65 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+import queue
+import threading
+
+from test.test_service_client import FakeConnection
+
+TIMEOUT = 10.0  # seconds
+
+
+def topic_matches(topic_filter, topic):
+    """Whether `topic` matches `topic_filter`, with its + and # wildcards"""
+    filter_levels = topic_filter.split('/')
+    levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(levels) or (level != '+' and level != levels[i]):
+            return False
+    return len(levels) == len(filter_levels)
+
+
+class FakeService(FakeConnection):
+    """
+    FakeConnection answering the requests published on it from another
+    thread, one at a time and in order, like an AWS IoT service.
+    Subclasses answer in handle().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def publish(self, topic, payload, qos, retain=False):
+        self._requests.put((self.handle, (topic, json.loads(payload))))
+        return super().publish(topic, payload, qos, retain)
+
+    def call(self, function, *args):
+        """Call `function` on the service thread, after the requests published so far"""
+        self._requests.put((function, args))
+
+    def respond(self, topic, payload):
+        """Deliver `payload` as JSON to the subscription matching `topic`"""
+        subscription = next(f for f in list(self.subscriptions) if topic_matches(f, topic))
+        self.deliver(topic, json.dumps(payload).encode(), subscription)
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join(TIMEOUT)
+
+    def handle(self, topic, payload):
+        """Answer a request published to `topic`, `payload` being its decoded JSON"""
+        raise NotImplementedError()
+
+    def _serve(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            function, args = request
+            function(*args)
@@ -0,0 +1,180 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Minimal event-stream RPC server on a Unix domain socket, standing in for
+the Greengrass nucleus: it accepts any CONNECT and answers the first message
+of each stream with an empty ``<operation>Response``.
+"""
+
+import binascii
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+MESSAGE_TYPE_APPLICATION_MESSAGE = 0
+MESSAGE_TYPE_PING = 2
+MESSAGE_TYPE_PING_RESPONSE = 3
+MESSAGE_TYPE_CONNECT = 4
+MESSAGE_TYPE_CONNECT_ACK = 5
+FLAG_CONNECTION_ACCEPTED = 1
+FLAG_TERMINATE_STREAM = 2
+
+HEADER_INT32 = 4
+HEADER_STRING = 7
+# value sizes of the fixed-size header types, by type
+_FIXED_SIZES = {0: 0, 1: 0, 2: 1, 3: 2, 4: 4, 5: 8, 8: 8, 9: 16}
+
+
+def encode_message(headers, payload=b''):
+    """Encode a message, `headers` maps names to int32 or string values"""
+    encoded = []
+    for name, value in headers.items():
+        name = name.encode()
+        encoded.append(struct.pack('>B', len(name)) + name)
+        if isinstance(value, int):
+            encoded.append(struct.pack('>Bi', HEADER_INT32, value))
+        else:
+            value = value.encode()
+            encoded.append(struct.pack('>BH', HEADER_STRING, len(value)) + value)
+    encoded_headers = b''.join(encoded)
+    prelude = struct.pack('>II', 16 + len(encoded_headers) + len(payload), len(encoded_headers))
+    message = prelude + struct.pack('>I', binascii.crc32(prelude)) + encoded_headers + payload
+    return message + struct.pack('>I', binascii.crc32(message))
+
+
+def decode_headers(data):
+    headers = {}
+    pos = 0
+    while pos < len(data):
+        name_length = data[pos]
+        name = data[pos + 1:pos + 1 + name_length].decode()
+        header_type = data[pos + 1 + name_length]
+        pos += 2 + name_length
+        if header_type in (6, 7):
+            value_length, = struct.unpack_from('>H', data, pos)
+            value = data[pos + 2:pos + 2 + value_length]
+            headers[name] = value.decode() if header_type == HEADER_STRING else value
+            pos += 2 + value_length
+        else:
+            size = _FIXED_SIZES[header_type]
+            headers[name] = int.from_bytes(data[pos:pos + size], 'big', signed=True) if size else header_type == 0
+            pos += size
+    return headers
+
+
+class IpcServer:
+    """
+    Serves connections until closed. Responses are sent `latency` seconds
+    after their request was received, in order.
+
+    Attributes:
+        socket_path (str): Path of the Unix domain socket.
+        requests (List[Tuple[str, bytes]]): Operation and payload of the
+            requests received.
+        max_outstanding (int): Highest number of requests received but not
+            answered yet.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.max_outstanding = 0
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        self._directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self._directory.name, 'ipc.socket')
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen()
+        self._connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self._listener.close()
+        for connection in self._connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        self._directory.cleanup()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return
+            self._connections.append(connection)
+            responses = queue.Queue()
+            threading.Thread(target=self._read, args=(connection, responses), daemon=True).start()
+            threading.Thread(target=self._write, args=(connection, responses), daemon=True).start()
+
+    def _read(self, connection, responses):
+        buffer = b''
+        streams = set()
+        try:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while len(buffer) >= 12:
+                    total_length, headers_length = struct.unpack_from('>II', buffer)
+                    if len(buffer) < total_length:
+                        break
+                    headers = decode_headers(buffer[12:12 + headers_length])
+                    payload = buffer[12 + headers_length:total_length - 4]
+                    buffer = buffer[total_length:]
+                    self._on_message(headers, payload, streams, responses)
+        except OSError:
+            pass
+        responses.put(None)
+
+    def _on_message(self, headers, payload, streams, responses):
+        message_type = headers.get(':message-type')
+        if message_type == MESSAGE_TYPE_CONNECT:
+            responses.put((0, encode_message({
+                ':message-type': MESSAGE_TYPE_CONNECT_ACK,
+                ':message-flags': FLAG_CONNECTION_ACCEPTED,
+                ':stream-id': 0})))
+        elif message_type == MESSAGE_TYPE_PING:
+            responses.put((0, encode_message({':message-type': MESSAGE_TYPE_PING_RESPONSE, ':message-flags': 0,
+                                              ':stream-id': 0})))
+        elif message_type == MESSAGE_TYPE_APPLICATION_MESSAGE:
+            stream_id = headers[':stream-id']
+            if stream_id in streams:
+                return
+            streams.add(stream_id)
+            with self._lock:
+                self.requests.append((headers['operation'], payload))
+                self._outstanding += 1
+                self.max_outstanding = max(self.max_outstanding, self._outstanding)
+            responses.put((time.monotonic() + self.latency, encode_message({
+                ':message-type': MESSAGE_TYPE_APPLICATION_MESSAGE,
+                ':message-flags': FLAG_TERMINATE_STREAM,
+                ':stream-id': stream_id,
+                ':content-type': 'application/json',
+                'service-model-type': headers['operation'] + 'Response'}, b'{}')))
+
+    def _write(self, connection, responses):
+        while True:
+            response = responses.get()
+            if response is None:
+                return
+            due, message = response
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if due:
+                with self._lock:
+                    self._outstanding -= 1
+            try:
+                connection.sendall(message)
+            except OSError:
+                return
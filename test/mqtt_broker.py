@@ -0,0 +1,260 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+"""
+Minimal MQTT 5 broker on localhost, standing in for AWS IoT Core: plain TCP,
+QoS 0 and 1, no sessions or retained messages. Services can be simulated by
+`responders`, which answer messages published to a topic.
+"""
+
+import socket
+import struct
+import threading
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+PROPERTY_TOPIC_ALIAS = 0x23
+PROPERTY_TOPIC_ALIAS_MAXIMUM = 0x22
+# property identifier -> encoding of its value
+_PROPERTY_TYPES = {
+    0x01: 'byte', 0x02: 'int32', 0x03: 'string', 0x08: 'string', 0x09: 'binary', 0x0B: 'varint',
+    0x23: 'int16', 0x26: 'pair',
+}
+
+
+def encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        encoded.append(byte | 0x80 if value else byte)
+        if not value:
+            return bytes(encoded)
+
+
+def decode_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def encode_string(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return struct.pack('>H', len(value)) + value
+
+
+def decode_string(data, pos):
+    length, = struct.unpack_from('>H', data, pos)
+    return bytes(data[pos + 2:pos + 2 + length]), pos + 2 + length
+
+
+def encode_packet(packet_type, flags, body):
+    return bytes([packet_type << 4 | flags]) + encode_varint(len(body)) + body
+
+
+def decode_properties(data, pos):
+    """Return the properties as a list of (identifier, raw bytes) and the position after them"""
+    length, pos = decode_varint(data, pos)
+    end = pos + length
+    properties = []
+    while pos < end:
+        identifier = data[pos]
+        start = pos + 1
+        kind = _PROPERTY_TYPES[identifier]
+        if kind == 'byte':
+            pos = start + 1
+        elif kind == 'int16':
+            pos = start + 2
+        elif kind == 'int32':
+            pos = start + 4
+        elif kind == 'varint':
+            _, pos = decode_varint(data, start)
+        elif kind == 'pair':
+            _, pos = decode_string(data, start)
+            _, pos = decode_string(data, pos)
+        else:
+            _, pos = decode_string(data, start)
+        properties.append((identifier, bytes(data[start:pos])))
+    return properties, end
+
+
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class MqttBroker:
+    """
+    Serves MQTT 5 clients on a free localhost port until closed.
+
+    Args:
+        topic_alias_maximum: Topic aliases each client may use when
+            publishing, 0 for none.
+
+    Attributes:
+        port (int): Port to connect to.
+        responders (Dict[str, Callable[[str, bytes], List[Tuple[str, bytes]]]]):
+            Functions answering the messages published to a topic with
+            messages to publish in return.
+        published (List[Tuple[str, bytes, List[Tuple[int, bytes]]]]): Topic,
+            payload and properties of each message clients published.
+        bytes_received (int): Bytes of all the PUBLISH packets received.
+    """
+
+    def __init__(self, topic_alias_maximum=0):
+        self.topic_alias_maximum = topic_alias_maximum
+        self.responders = {}
+        self.published = []
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # type: dict
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen()
+        self.port = self._listener.getsockname()[1]
+        self._connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self._listener.close()
+        for connection in self._connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections.append(connection)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        state = {'aliases': {}, 'lock': threading.Lock()}
+        buffer = b''
+        try:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while len(buffer) >= 2:
+                    try:
+                        length, start = decode_varint(buffer, 1)
+                    except IndexError:
+                        break
+                    if len(buffer) < start + length:
+                        break
+                    header = buffer[0]
+                    body = buffer[start:start + length]
+                    if header >> 4 == PUBLISH:
+                        self.bytes_received += start + length
+                    buffer = buffer[start + length:]
+                    if not self._on_packet(connection, state, header >> 4, header & 0x0F, body):
+                        return
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                for subscribers in self._subscriptions.values():
+                    subscribers.pop(connection, None)
+
+    def _send(self, connection, state, packet):
+        with state['lock']:
+            connection.sendall(packet)
+
+    def _on_packet(self, connection, state, packet_type, flags, body):
+        if packet_type == CONNECT:
+            properties = b''
+            if self.topic_alias_maximum:
+                properties = bytes([PROPERTY_TOPIC_ALIAS_MAXIMUM]) + struct.pack('>H', self.topic_alias_maximum)
+            body = b'\x00\x00' + encode_varint(len(properties)) + properties
+            self._send(connection, state, encode_packet(CONNACK, 0, body))
+        elif packet_type == SUBSCRIBE:
+            packet_id = body[:2]
+            _, pos = decode_properties(body, 2)
+            reason_codes = bytearray()
+            with self._lock:
+                while pos < len(body):
+                    topic_filter, pos = decode_string(body, pos)
+                    options = body[pos]
+                    pos += 1
+                    self._subscriptions.setdefault(topic_filter.decode(), {})[connection] = (options & 0x03, state)
+                    reason_codes.append(options & 0x03)
+            self._send(connection, state, encode_packet(SUBACK, 0, packet_id + b'\x00' + bytes(reason_codes)))
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = body[:2]
+            _, pos = decode_properties(body, 2)
+            count = 0
+            with self._lock:
+                while pos < len(body):
+                    topic_filter, pos = decode_string(body, pos)
+                    self._subscriptions.get(topic_filter.decode(), {}).pop(connection, None)
+                    count += 1
+            self._send(connection, state, encode_packet(UNSUBACK, 0, packet_id + b'\x00' + b'\x00' * count))
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic, pos = decode_string(body, 0)
+            packet_id = None
+            if qos:
+                packet_id = body[pos:pos + 2]
+                pos += 2
+            properties, pos = decode_properties(body, pos)
+            topic = topic.decode()
+            alias = [struct.unpack('>H', value)[0] for identifier, value in properties
+                     if identifier == PROPERTY_TOPIC_ALIAS]
+            if alias:
+                if topic:
+                    state['aliases'][alias[0]] = topic
+                else:
+                    topic = state['aliases'][alias[0]]
+            forwarded = [(identifier, value) for identifier, value in properties if identifier != PROPERTY_TOPIC_ALIAS]
+            payload = bytes(body[pos:])
+            self.published.append((topic, payload, forwarded))
+            if qos:
+                self._send(connection, state, encode_packet(PUBACK, 0, packet_id))
+            self._route(topic, payload, forwarded)
+            responder = self.responders.get(topic)
+            if responder is not None:
+                for response_topic, response_payload in responder(topic, payload):
+                    self._route(response_topic, response_payload, [])
+        elif packet_type == PINGREQ:
+            self._send(connection, state, encode_packet(PINGRESP, 0, b''))
+        elif packet_type == DISCONNECT:
+            return False
+        return True
+
+    def _route(self, topic, payload, properties):
+        with self._lock:
+            deliveries = [(subscriber, qos, state)
+                          for topic_filter, subscribers in self._subscriptions.items()
+                          if topic_matches(topic_filter, topic)
+                          for subscriber, (qos, state) in subscribers.items()]
+        encoded_properties = b''.join(bytes([identifier]) + value for identifier, value in properties)
+        for subscriber, qos, state in deliveries:
+            # delivered at QoS 0, the client has nothing to acknowledge
+            body = encode_string(topic) + encode_varint(len(encoded_properties)) + encoded_properties + payload
+            try:
+                self._send(subscriber, state, encode_packet(PUBLISH, 0, body))
+            except OSError:
+                pass
@@ -0,0 +1,105 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import asyncio
+from awscrt import mqtt
+import json
+from unittest import TestCase
+
+from awsiot import aio, iotjobs, iotshadow
+from test.fake_service import FakeService
+from test.test_service_client import FakeConnection
+
+TIMEOUT = 10.0  # seconds
+
+
+class AsyncServiceClientTest(TestCase):
+
+    def test_operations_are_coroutines(self):
+        for name in ['publish_update_shadow', 'subscribe_to_shadow_delta_updated_events']:
+            self.assertTrue(asyncio.iscoroutinefunction(getattr(aio.AsyncIotShadowClient, name)))
+        self.assertTrue(hasattr(aio.AsyncIotJobsClient, 'publish_start_next_pending_job_execution'))
+        self.assertTrue(hasattr(aio.AsyncIotIdentityClient, 'publish_register_thing'))
+        self.assertFalse(hasattr(aio.AsyncIotJobsClient, 'publish_update_shadow'))
+
+    def test_wraps_existing_client(self):
+        client = iotshadow.IotShadowClient(FakeConnection())
+        self.assertIs(client, aio.AsyncIotShadowClient(client).client)
+
+    def test_publish(self):
+        connection = FakeConnection()
+
+        async def run():
+            shadow = aio.AsyncIotShadowClient(connection)
+            result = await shadow.publish_get_shadow(
+                iotshadow.GetShadowRequest(thing_name='meter'), mqtt.QoS.AT_LEAST_ONCE)
+            self.assertIsNone(result)
+
+        asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+        self.assertEqual('$aws/things/meter/shadow/get', connection.published[0][0])
+
+    def test_subscription_iterates_events_from_other_threads(self):
+        connection = FakeService()
+        self.addCleanup(connection.close)
+
+        async def run():
+            jobs = aio.AsyncIotJobsClient(connection)
+            subscription = await jobs.subscribe_to_next_job_execution_changed_events(
+                iotjobs.NextJobExecutionChangedSubscriptionRequest(thing_name='meter'),
+                mqtt.QoS.AT_LEAST_ONCE)
+
+            def deliver():
+                # undecodable, skipped; sent first so all are delivered before the loop breaks and unsubscribes
+                connection.deliver(subscription.topic, b'not json')
+                for i in range(3):
+                    payload = {'execution': {'jobId': 'job-{}'.format(i)}}
+                    connection.deliver(subscription.topic, json.dumps(payload).encode())
+
+            connection.call(deliver)
+            job_ids = []
+            async with subscription:
+                async for event in subscription:
+                    job_ids.append(event.execution.job_id)
+                    if len(job_ids) == 3:
+                        break
+            self.assertEqual(['job-0', 'job-1', 'job-2'], job_ids)
+            self.assertEqual({}, connection.subscriptions)
+
+            # iteration is over once unsubscribed
+            self.assertEqual([], [event async for event in subscription])
+
+        asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+
+    def test_subscription_drops_oldest(self):
+        connection = FakeConnection()
+
+        async def run():
+            shadow = aio.AsyncIotShadowClient(connection)
+            subscription = await shadow.subscribe_to_shadow_delta_updated_events(
+                iotshadow.ShadowDeltaUpdatedSubscriptionRequest(thing_name='meter'),
+                mqtt.QoS.AT_LEAST_ONCE,
+                max_pending=2)
+            for i in range(4):
+                connection.deliver(subscription.topic, '{{"version": {}}}'.format(i).encode())
+            connection.deliver(subscription.topic, b'not json')
+            await asyncio.sleep(0)
+            await subscription.unsubscribe()
+
+            self.assertEqual([2, 3], [event.version async for event in subscription])
+            self.assertEqual(2, subscription.dropped)
+            self.assertEqual(1, subscription.invalid)
+
+        asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+
+    def test_message_after_loop_closed(self):
+        connection = FakeConnection()
+
+        async def run():
+            shadow = aio.AsyncIotShadowClient(connection)
+            return await shadow.subscribe_to_shadow_delta_updated_events(
+                iotshadow.ShadowDeltaUpdatedSubscriptionRequest(thing_name='meter'), mqtt.QoS.AT_LEAST_ONCE)
+
+        # never unsubscribed, asyncio.run() closes the loop
+        subscription = asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+        connection.deliver(subscription.topic, b'{"version": 1}')
+        self.assertEqual(1, subscription.dropped)
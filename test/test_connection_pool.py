@@ -0,0 +1,111 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import io, mqtt5
+from concurrent.futures import Future, TimeoutError
+import time
+from unittest import TestCase
+
+from awsiot import mqtt5_client_builder
+from awsiot.connection_pool import ConnectionPool
+from test.mqtt_broker import MqttBroker
+
+TIMEOUT = 10.0  # seconds
+
+
+def packet(thing_name, qos=mqtt5.QoS.AT_LEAST_ONCE):
+    return mqtt5.PublishPacket(topic='meters/{}/flow'.format(thing_name), payload=b'12.5', qos=qos)
+
+
+class ConnectionPoolTest(TestCase):
+
+    def _pool(self, size, **kwargs):
+        broker = MqttBroker()
+        self.addCleanup(broker.close)
+        connected = []
+
+        def plain_builder(client_options, **kwargs):
+            # no TLS, like the broker
+            future = Future()
+            connected.append(future)
+            client_options.port = broker.port
+            client_options.on_lifecycle_event_connection_success_fn = future.set_result
+            return mqtt5.Client(client_options)
+
+        pool = ConnectionPool(plain_builder, size, 'gateway', endpoint='127.0.0.1', **kwargs)
+        pool.start()
+        self.addCleanup(pool.stop)
+        for future in connected:
+            future.result(TIMEOUT)
+        return broker, pool
+
+    def test_spreads_things(self):
+        broker, pool = self._pool(3)
+        things = ['meter-{:06d}'.format(i) for i in range(6)]
+        futures = [pool.publish(thing, packet(thing)) for _ in range(2) for thing in things]
+        for future in futures:
+            future.result(TIMEOUT)
+
+        # the first three things got a connection each
+        self.assertEqual(pool.clients, [pool.client_for(thing) for thing in things[:3]])
+        stats = pool.stats
+        self.assertEqual(['gateway-0', 'gateway-1', 'gateway-2'], [s.client_id for s in stats])
+        self.assertEqual([2, 2, 2], [s.things for s in stats])
+        self.assertEqual([4, 4, 4], [s.published for s in stats])
+        self.assertEqual([0, 0, 0], [s.in_flight for s in stats])
+        self.assertEqual([0, 0, 0], [s.failed for s in stats])
+        self.assertTrue(all(s.throughput > 0 for s in stats))
+        self.assertEqual(12, len(broker.published))
+
+    def test_publish_tps_limit(self):
+        broker, pool = self._pool(2, max_publish_tps=20)
+        start = time.monotonic()
+        futures = [pool.publish('meter-000001', packet('meter-000001')) for _ in range(25)]
+        for future in futures:
+            future.result(TIMEOUT)
+        # a second's worth at once, then 5 more at 20 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        stats = pool.stats
+        self.assertEqual((25, 5), (stats[0].published, stats[0].throttled))
+        self.assertEqual((0, 0), (stats[1].published, stats[1].throttled))
+
+        pool.timeout = 0.01
+        with self.assertRaises(TimeoutError):
+            for _ in range(25):
+                pool.publish('meter-000001', packet('meter-000001'))
+        # other things still get the other connection
+        pool.publish('meter-000002', packet('meter-000002')).result(TIMEOUT)
+
+
+class ConnectionPoolBuilderTest(TestCase):
+
+    def test_shares_tls_context_and_bootstrap(self):
+        options = []
+
+        def builder(**kwargs):
+            options.append(kwargs['client_options'])
+            return mqtt5_client_builder.direct_with_custom_authorizer(**kwargs)
+
+        client_options = mqtt5.ClientOptions(host_name='example.com')
+        pool = ConnectionPool(builder, 3, 'gateway', endpoint='example.com', client_options=client_options,
+                              auth_authorizer_name='authorizer')
+        self.assertIsNotNone(pool.tls_ctx)
+        self.assertEqual([pool.tls_ctx] * 3, [o.tls_ctx for o in options])
+        self.assertEqual(1, len({id(o.bootstrap) for o in options}))
+        self.assertEqual(['gateway-0', 'gateway-1', 'gateway-2'], [o.connect_options.client_id for o in options])
+        # the options given to the pool are left alone
+        self.assertIsNone(client_options.tls_ctx)
+        self.assertIsNone(client_options.connect_options)
+
+    def test_builder_takes_tls_ctx(self):
+        tls_ctx = io.ClientTlsContext(io.TlsContextOptions())
+        # as before, a context set in client_options is replaced
+        options = mqtt5.ClientOptions(host_name='example.com', tls_ctx=tls_ctx)
+        mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_options=options)
+        self.assertIsNot(tls_ctx, options.tls_ctx)
+
+        options = mqtt5.ClientOptions(host_name='example.com')
+        mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_options=options, tls_ctx=tls_ctx)
+        self.assertIs(tls_ctx, options.tls_ctx)
@@ -0,0 +1,164 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from concurrent.futures import Future, TimeoutError
+import json
+import threading
+import time
+from unittest import TestCase
+
+from awsiot import greengrasscoreipc
+from awsiot.greengrass_publisher import BatchPublisher, PublishBatchError
+from awsiot.greengrasscoreipc import model
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+from test.ipc_server import IpcServer
+
+TIMEOUT = 10.0  # seconds
+
+
+class FakeOperation:
+    def __init__(self, response):
+        self.write_future = Future()
+        self.response_future = Future()
+        self.response = response
+
+    def activate(self, request):
+        self.request = request
+        return self.write_future
+
+    def get_response(self):
+        return self.response_future
+
+
+class FakeIpcClient:
+    """Operations complete when the test says so"""
+
+    def __init__(self):
+        self.operations = []
+
+    def new_publish_to_topic(self):
+        self.operations.append(FakeOperation(model.PublishToTopicResponse()))
+        return self.operations[-1]
+
+    def new_publish_to_iot_core(self):
+        self.operations.append(FakeOperation(model.PublishToIoTCoreResponse()))
+        return self.operations[-1]
+
+
+class BatchPublisherTest(TestCase):
+
+    def test_pipelines_over_ipc(self):
+        server = IpcServer(latency=0.005)
+        self.addCleanup(server.close)
+        client = GreengrassCoreIPCClientV2(greengrasscoreipc.connect(ipc_socket=server.socket_path, authtoken='x'))
+        self.addCleanup(client.close)
+        publisher = BatchPublisher(client, max_in_flight=4)
+
+        batch = publisher.publish_batch(publisher.topic_request('meters/flow', {'reading': i}) for i in range(40))
+        responses = batch.result(TIMEOUT)
+        self.assertEqual(40, len(responses))
+        self.assertTrue(all(isinstance(r, model.PublishToTopicResponse) for r in responses))
+        self.assertEqual(4, publisher.peak_in_flight)
+        self.assertEqual(4, server.max_outstanding)
+
+        response = publisher.publish_to_iot_core('meters/flow', b'\x00' * 5000).result(TIMEOUT)
+        self.assertIsInstance(response, model.PublishToIoTCoreResponse)
+        self.assertTrue(publisher.close(TIMEOUT))
+        self.assertEqual(41, publisher.published)
+
+        readings = [json.loads(payload)['publishMessage']['jsonMessage']['message']['reading']
+                    for operation, payload in server.requests[:40]]
+        self.assertEqual(list(range(40)), readings)
+        self.assertEqual('aws.greengrass#PublishToIoTCore', server.requests[40][0])
+
+    def test_flow_control(self):
+        client = FakeIpcClient()
+        publisher = BatchPublisher(client, max_in_flight=2, timeout=0.05)
+        first = publisher.publish_to_topic('a', b'1')
+        publisher.publish_to_topic('a', b'2')
+        with self.assertRaises(TimeoutError):
+            publisher.publish_to_topic('a', b'3')
+        self.assertEqual(2, len(client.operations))
+
+        client.operations[0].write_future.set_result(None)
+        client.operations[0].response_future.set_result(client.operations[0].response)
+        self.assertIs(client.operations[0].response, first.result(TIMEOUT))
+        publisher.publish_to_topic('a', b'3')
+        self.assertEqual(2, publisher.in_flight)
+        self.assertFalse(publisher.flush(0.01))
+
+    def test_batch_failures(self):
+        client = FakeIpcClient()
+        publisher = BatchPublisher(client)
+        requests = [publisher.iot_core_request('a', b'1'), publisher.topic_request('a', {'x': 1})]
+        batch = publisher.publish_batch(requests)
+        tolerant = publisher.publish_batch(requests, return_exceptions=True)
+
+        write_error = ConnectionError('write failed')
+        for i, operation in enumerate(client.operations):
+            if i % 2:
+                operation.write_future.set_exception(write_error)
+                operation.response_future.set_exception(RuntimeError('stream closed'))
+            else:
+                operation.write_future.set_result(None)
+                operation.response_future.set_result(operation.response)
+
+        with self.assertRaises(PublishBatchError) as raised:
+            batch.result(TIMEOUT)
+        self.assertIsInstance(raised.exception.results[0], model.PublishToIoTCoreResponse)
+        self.assertIs(write_error, raised.exception.results[1])
+        self.assertIs(write_error, tolerant.result(TIMEOUT)[1])
+        self.assertEqual((2, 2, 0), (publisher.published, publisher.failed, publisher.in_flight))
+
+        with self.assertRaises(TypeError):
+            publisher.publish(model.PublishToTopicResponse())
+        publisher.close()
+        with self.assertRaises(RuntimeError):
+            publisher.publish_to_topic('a', b'1')
+
+    def test_batch_timeout(self):
+        client = FakeIpcClient()
+        publisher = BatchPublisher(client, max_in_flight=2, timeout=0.05)
+        batch = publisher.publish_batch(publisher.topic_request('a', {'x': i}) for i in range(4))
+        # the third request found no room, the fourth wasn't sent
+        self.assertEqual(2, len(client.operations))
+        self.assertFalse(batch.done())
+
+        for operation in client.operations:
+            operation.write_future.set_result(None)
+            operation.response_future.set_result(operation.response)
+        with self.assertRaises(PublishBatchError) as raised:
+            batch.result(TIMEOUT)
+        self.assertEqual(3, len(raised.exception.results))
+        self.assertIsInstance(raised.exception.results[2], TimeoutError)
+        self.assertEqual(0, publisher.in_flight)
+
+    def _wait_for_waiters(self, publisher, count):
+        deadline = time.monotonic() + TIMEOUT
+        while len(publisher._room._waiters) < count and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def test_flush_and_publisher_both_wake_up(self):
+        # flush() waits first, woken alone it would leave the publisher waiting
+        client = FakeIpcClient()
+        publisher = BatchPublisher(client, max_in_flight=1)
+        publisher.publish_to_topic('a', b'1')
+
+        flushed = []
+        flush_thread = threading.Thread(target=lambda: flushed.append(publisher.flush(TIMEOUT)), daemon=True)
+        flush_thread.start()
+        self._wait_for_waiters(publisher, 1)
+        published = []
+        publish_thread = threading.Thread(target=lambda: published.append(publisher.publish_to_topic('a', b'2')),
+                                          daemon=True)
+        publish_thread.start()
+        self._wait_for_waiters(publisher, 2)
+
+        client.operations[0].write_future.set_result(None)
+        client.operations[0].response_future.set_result(client.operations[0].response)
+        publish_thread.join(TIMEOUT)
+        self.assertEqual(1, len(published))
+        client.operations[1].write_future.set_result(None)
+        client.operations[1].response_future.set_result(client.operations[1].response)
+        flush_thread.join(TIMEOUT)
+        self.assertEqual([True], flushed)
@@ -0,0 +1,64 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(code):
+    """
+    Run `code` in a new interpreter with ``-X importtime`` and return the
+    cumulative import time of each module imported by an import statement,
+    in microseconds, and the names of all the modules loaded in the end,
+    importlib.import_module() included.
+    """
+    code += '; import sys; print(" ".join(sys.modules))'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative)
+    return times, set(process.stdout.split())
+
+
+class ImportTimeTest(TestCase):
+
+    def test_import_awsiot(self):
+        times, modules = import_times('import awsiot')
+        for module in ('awscrt.mqtt', 'awscrt.mqtt5', 'awsiot.mqtt5_router', 'inspect', 'awsiot.iotshadow'):
+            self.assertNotIn(module, modules)
+        # report the time, for comparing runs
+        print('import awsiot: {:.1f} ms'.format(times['awsiot'] / 1e3), file=sys.stderr)
+
+    def test_submodules_on_first_use(self):
+        _, modules = import_times('import awsiot; awsiot.iotshadow.IotShadowClient')
+        self.assertIn('awsiot.iotshadow', modules)
+        _, modules = import_times('import awsiot; awsiot.mqtt5.Client')
+        self.assertIn('awscrt.mqtt5', modules)
+        with self.assertRaises(subprocess.CalledProcessError):
+            import_times('import awsiot; awsiot.no_such_module')
+
+    def test_import_greengrasscoreipc(self):
+        _, modules = import_times('import awsiot.greengrasscoreipc')
+        for module in ('awscrt.mqtt', 'awsiot.greengrasscoreipc.client', 'awsiot.greengrasscoreipc.model'):
+            self.assertNotIn(module, modules)
+
+        _, modules = import_times(
+            'import awsiot.greengrasscoreipc as ipc; '
+            'assert ipc.model.SHAPE_INDEX._shapes_type_by_name is None; '
+            'assert ipc.model.SHAPE_INDEX.find_shape_type("aws.greengrass#UserProperty") is ipc.model.UserProperty; '
+            'ipc.GreengrassCoreIPCClient')
+        self.assertIn('awsiot.greengrasscoreipc.client', modules)
+
+    def test_metrics_without_pkg_resources(self):
+        _, modules = import_times('from awsiot import mqtt5_client_builder; mqtt5_client_builder._get_metrics_str()')
+        if sys.version_info >= (3, 8):
+            self.assertNotIn('pkg_resources', modules)
@@ -0,0 +1,105 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import mqtt
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from awsiot import iotjobs
+from awsiot.job_documents import LazyJobDocument, LazyJobDocumentCodec
+from test.test_service_client import FakeConnection
+
+DOCUMENT = {
+    'operation': 'ota',
+    'note': 'quotes \\" and "brackets" {[}]\\',
+    'files': [{'fileName': 'firmware-{}.bin'.format(i), 'size': i * 1.5, 'signed': True} for i in range(100)],
+}
+
+
+def execution_event(**execution):
+    execution.setdefault('jobDocument', DOCUMENT)
+    payload = {'timestamp': 1707292801, 'execution': dict(jobId='ota', status='QUEUED', **execution)}
+    return json.dumps(payload).encode()
+
+
+class LazyJobDocumentCodecTest(TestCase):
+
+    def setUp(self):
+        self.codecs = [LazyJobDocumentCodec(backend='json', min_size=0, bytes_per_token=1)]
+        try:
+            self.codecs.append(LazyJobDocumentCodec(backend='orjson', min_size=0, bytes_per_token=1))
+        except ImportError:
+            pass
+
+    def test_execution_document_is_lazy(self):
+        for codec in self.codecs:
+            payload = codec.decode(memoryview(execution_event(statusDetails={'step': 'download'})))
+            document = payload['execution']['jobDocument']
+            self.assertIsInstance(document, LazyJobDocument)
+            self.assertFalse(document.loaded)
+            self.assertEqual('QUEUED', payload['execution']['status'])
+            self.assertEqual({'step': 'download'}, payload['execution']['statusDetails'])
+            self.assertEqual(1707292801, payload['timestamp'])
+
+            self.assertEqual('ota', document['operation'])
+            self.assertTrue(document.loaded)
+            self.assertEqual(DOCUMENT, document)
+            self.assertEqual(DOCUMENT, document.value)
+            self.assertEqual(json.loads(document.raw), DOCUMENT)
+
+    def test_top_level_document(self):
+        payload = {'clientToken': 'abc', 'jobDocument': DOCUMENT, 'executionState': {'status': 'IN_PROGRESS'}}
+        for codec in self.codecs:
+            decoded = codec.decode(json.dumps(payload, indent=2).encode())
+            self.assertIsInstance(decoded['jobDocument'], LazyJobDocument)
+            self.assertEqual(payload, {**decoded, 'jobDocument': decoded['jobDocument'].value})
+
+    def test_decodes_eagerly_otherwise(self):
+        codec = LazyJobDocumentCodec(backend='json', min_size=0, bytes_per_token=1)
+        # small message
+        small = LazyJobDocumentCodec(backend='json').decode(execution_event(jobDocument={'operation': 'reboot'}))
+        self.assertIsInstance(small['execution']['jobDocument'], dict)
+        # too many values for the size of the message, seen before scanning the document
+        with patch('awsiot.job_documents._object_end') as object_end:
+            many = LazyJobDocumentCodec(backend='json', min_size=0).decode(execution_event())
+        object_end.assert_not_called()
+        self.assertEqual(DOCUMENT, many['execution']['jobDocument'])
+        self.assertIsInstance(many['execution']['jobDocument'], dict)
+        # the key inside a string
+        payload = {'note': '"jobDocument": {', 'jobDocument': {'a': 1}}
+        self.assertEqual({'a': 1}, dict(codec.decode(json.dumps(payload).encode())['jobDocument']))
+        # a key in another place
+        payload = codec.decode(json.dumps({'other': {'jobDocument': {'a': 1}}, 'x': 1}).encode())
+        self.assertEqual({'other': {'jobDocument': {'a': 1}}, 'x': 1}, payload)
+        # not an object
+        payload = codec.decode(json.dumps({'jobDocument': None}).encode())
+        self.assertEqual({'jobDocument': None}, payload)
+        # malformed
+        with self.assertRaises(ValueError):
+            codec.decode(b'{"jobDocument": {"a": "')
+
+    def test_stream(self):
+        codec = LazyJobDocumentCodec(min_size=0, bytes_per_token=1)
+        document = codec.decode(execution_event())['execution']['jobDocument']
+        try:
+            files = list(document.stream('files.item'))
+        except ImportError:
+            self.skipTest("ijson not installed")
+        self.assertEqual(DOCUMENT['files'], files)
+        self.assertFalse(document.loaded)
+
+    def test_jobs_client(self):
+        connection = FakeConnection()
+        jobs = iotjobs.IotJobsClient(connection, codec=LazyJobDocumentCodec(min_size=0, bytes_per_token=1))
+        events = []
+        future, topic = jobs.subscribe_to_next_job_execution_changed_events(
+            iotjobs.NextJobExecutionChangedSubscriptionRequest(thing_name='meter'),
+            mqtt.QoS.AT_LEAST_ONCE,
+            events.append)
+        connection.deliver(topic, execution_event())
+
+        execution = events[0].execution
+        self.assertEqual('ota', execution.job_id)
+        self.assertFalse(execution.job_document.loaded)
+        self.assertEqual('ota', execution.job_document['operation'])
@@ -0,0 +1,215 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+import threading
+import time
+from unittest import TestCase
+
+from awsiot import iotjobs
+from awsiot.job_runner import JobRunner
+from test.fake_service import FakeService
+
+TIMEOUT = 10.0  # seconds
+
+
+class FakeJobsService(FakeService):
+    """Answers the jobs requests published on it, like the AWS IoT Jobs service"""
+
+    def __init__(self, job_ids, hold_final_updates=False):
+        super().__init__()
+        self.jobs = {job_id: {'status': 'QUEUED', 'version': 1, 'document': {'meter': job_id}} for job_id in job_ids}
+        self.updates = []
+        # claimed by another device between listing and claiming
+        self.stolen = set()
+        # final status updates left unanswered until release_final_updates()
+        self.hold_final_updates = hold_final_updates
+        self.held = []
+
+    def add_job(self, job_id):
+        self.call(self._add_job, job_id)
+
+    def release_final_updates(self):
+        self.call(self._release_final_updates)
+
+    def _add_job(self, job_id):
+        self.jobs[job_id] = {'status': 'QUEUED', 'version': 1, 'document': {'meter': job_id}}
+        self.respond('$aws/things/gateway/jobs/notify', {'jobs': {}})
+
+    def _release_final_updates(self):
+        self.hold_final_updates = False
+        held, self.held = self.held, []
+        for topic, payload in held:
+            self._update(topic, payload)
+
+    def handle(self, topic, payload):
+        if topic.endswith('/jobs/get'):
+            summaries = {'QUEUED': [], 'IN_PROGRESS': []}
+            for job_id, job in self.jobs.items():
+                if job['status'] in summaries:
+                    summaries[job['status']].append({'jobId': job_id, 'versionNumber': job['version']})
+            self.respond(topic + '/accepted', {
+                'clientToken': payload['clientToken'],
+                'queuedJobs': summaries['QUEUED'],
+                'inProgressJobs': summaries['IN_PROGRESS'],
+            })
+        elif topic.endswith('/update'):
+            if self.hold_final_updates and payload['status'] in ('SUCCEEDED', 'FAILED'):
+                self.held.append((topic, payload))
+            else:
+                self._update(topic, payload)
+
+    def _update(self, topic, payload):
+        self.updates.append(payload)
+        job_id = topic.split('/')[-2]
+        job = self.jobs[job_id]
+        expected = payload.get('expectedVersion')
+        if expected is not None and (expected != job['version'] or job_id in self.stolen):
+            self.respond(topic + '/rejected', {'clientToken': payload['clientToken'], 'code': 'VersionMismatch'})
+            return
+        job['status'] = payload['status']
+        job['version'] += 1
+        if 'statusDetails' in payload:
+            job['statusDetails'] = payload['statusDetails']
+        response = {'clientToken': payload['clientToken']}
+        if payload.get('includeJobDocument'):
+            response['jobDocument'] = job['document']
+        self.respond(topic + '/accepted', response)
+
+
+class JobRunnerTest(TestCase):
+
+    def _runner(self, service, handler, **kwargs):
+        runner = JobRunner(iotjobs.IotJobsClient(service), 'gateway', handler, **kwargs)
+        self.addCleanup(service.close)
+        self.addCleanup(runner.stop)
+        return runner
+
+    def _wait(self, runner):
+        self.assertTrue(runner.wait_idle(TIMEOUT))
+
+    def test_runs_jobs_concurrently(self):
+        service = FakeJobsService(['job-{}'.format(i) for i in range(6)])
+        # only passes once 3 jobs run at the same time
+        barrier = threading.Barrier(3, timeout=TIMEOUT)
+
+        def handler(job):
+            barrier.wait()
+            return {'meter': job.document['meter']}
+
+        runner = self._runner(service, handler, max_workers=3, prefetch=1)
+        response = runner.start().result(TIMEOUT)
+        self.assertEqual(6, len(response.queued_jobs))
+        self._wait(runner)
+
+        self.assertEqual(6, runner.succeeded)
+        self.assertEqual(6, runner.claimed)
+        for job_id, job in service.jobs.items():
+            self.assertEqual('SUCCEEDED', job['status'])
+            self.assertEqual({'meter': job_id}, job['statusDetails'])
+        claims = [u for u in service.updates if u['status'] == 'IN_PROGRESS']
+        self.assertEqual([1] * 6, [u['expectedVersion'] for u in claims])
+        self.assertTrue(all(u['includeJobDocument'] for u in claims))
+
+    def test_failure_heartbeats_and_reports(self):
+        service = FakeJobsService(['job-0'])
+
+        def handler(job):
+            job.report({'step': 'download'})
+            job.report({'progress': '50'})
+            deadline = time.monotonic() + TIMEOUT
+            while runner.heartbeats < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            job.report({'step': 'install'})
+            raise RuntimeError('disk full')
+
+        runner = self._runner(service, handler, step_timeout_in_minutes=1, heartbeat_interval=0.02)
+        runner.start()
+        self._wait(runner)
+        runner.stop()
+
+        self.assertEqual(1, runner.failed)
+        self.assertEqual(1, runner.reports_merged)
+        heartbeats = [u for u in service.updates if u['status'] == 'IN_PROGRESS' and 'expectedVersion' not in u]
+        self.assertEqual({'step': 'download', 'progress': '50'}, heartbeats[0]['statusDetails'])
+        self.assertTrue(all(u['stepTimeoutInMinutes'] == 1 for u in heartbeats))
+        final = service.updates[-1]
+        self.assertEqual('FAILED', final['status'])
+        self.assertEqual({'step': 'install', 'reason': 'RuntimeError: disk full'}, final['statusDetails'])
+
+    def test_no_heartbeat_after_final_update(self):
+        finish = threading.Event()
+        final_published = threading.Event()
+
+        class Service(FakeJobsService):
+            def publish(self, topic, payload, qos, retain=False):
+                update = json.loads(payload)
+                if update.get('status') == 'IN_PROGRESS' and 'expectedVersion' not in update:
+                    # the job finishes while its heartbeat is being published
+                    finish.set()
+                    final_published.wait(0.5)
+                elif update.get('status') == 'SUCCEEDED':
+                    final_published.set()
+                return super().publish(topic, payload, qos, retain)
+
+        def handler(job):
+            finish.wait(TIMEOUT)
+
+        service = Service(['job-0'])
+        runner = self._runner(service, handler, step_timeout_in_minutes=1, heartbeat_interval=0.02)
+        runner.start()
+        self.assertTrue(finish.wait(TIMEOUT))
+        self._wait(runner)
+        runner.stop()
+
+        self.assertEqual('SUCCEEDED', service.updates[-1]['status'])
+        self.assertEqual('SUCCEEDED', service.jobs['job-0']['status'])
+
+    def test_rejected_claim_is_skipped(self):
+        service = FakeJobsService(['job-0', 'job-1'])
+        service.stolen.add('job-0')
+        ran = []
+        runner = self._runner(service, lambda job: ran.append(job.job_id), max_workers=1)
+        runner.start()
+        self._wait(runner)
+        self.assertEqual(['job-1'], ran)
+        self.assertEqual(1, runner.claimed)
+        self.assertEqual('QUEUED', service.jobs['job-0']['status'])
+
+    def test_notify_lists_new_jobs(self):
+        service = FakeJobsService([])
+        ran = []
+        runner = self._runner(service, lambda job: ran.append(job.job_id))
+        self.assertEqual([], runner.start().result(TIMEOUT).queued_jobs)
+        self._wait(runner)
+
+        service.add_job('job-new')
+        deadline = time.monotonic() + TIMEOUT
+        while not (ran and runner.wait_idle(0.01)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(['job-new'], ran)
+        self.assertEqual('SUCCEEDED', service.jobs['job-new']['status'])
+
+    def test_waits_for_final_status_update(self):
+        service = FakeJobsService(['job-0'], hold_final_updates=True)
+        ran = threading.Event()
+        runner = self._runner(service, lambda job: ran.set())
+        runner.start()
+        self.assertTrue(ran.wait(TIMEOUT))
+        self.assertFalse(runner.wait_idle(0.1))
+
+        service.release_final_updates()
+        self._wait(runner)
+        self.assertEqual('SUCCEEDED', service.jobs['job-0']['status'])
+
+    def test_subscribes_to_response_and_notify_topics(self):
+        service = FakeJobsService([])
+        runner = self._runner(service, lambda job: None)
+        runner.start().result(TIMEOUT)
+        self.assertEqual({
+            '$aws/things/gateway/jobs/get/+',
+            '$aws/things/gateway/jobs/+/update/+',
+            '$aws/things/gateway/jobs/notify',
+        }, set(service.subscriptions))
+        runner.stop()
+        self.assertEqual({}, service.subscriptions)
@@ -0,0 +1,178 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import mqtt, mqtt5
+from concurrent.futures import Future
+import contextlib
+import io
+import json
+import queue
+from unittest import TestCase
+
+from awsiot import iotshadow, mqtt5_client_builder
+from awsiot.mqtt5_router import PublishRouter
+from test.mqtt_broker import MqttBroker
+
+TIMEOUT = 10.0  # seconds
+
+
+def received(topic, payload=b''):
+    return mqtt5.PublishReceivedData(publish_packet=mqtt5.PublishPacket(topic=topic, payload=payload))
+
+
+def answer_get_shadow(topic, payload):
+    token = json.loads(payload)['clientToken']
+    return [(topic + '/accepted', json.dumps({'clientToken': token, 'version': 3,
+                                              'state': {'reported': {'flowRate': 12.5}}}).encode())]
+
+
+class PublishRouterTest(TestCase):
+
+    def test_routes_by_topic_filter(self):
+        everything = []
+        router = PublishRouter(everything.append)
+        calls = []
+        router.add('meters/m-1/flow', lambda packet: calls.append(('exact', packet.topic)))
+        router.add('meters/+/flow', lambda packet: calls.append(('plus', packet.topic)))
+        router.add('$aws/things/m-1/shadow/#', lambda packet: calls.append(('hash', packet.topic)))
+        router.add('#', lambda packet: calls.append(('all', packet.topic)))
+
+        for topic in ('meters/m-1/flow', 'meters/m-2/flow', 'meters/m-2', '$aws/things/m-1/shadow/get/accepted'):
+            router(received(topic))
+        self.assertEqual([
+            ('exact', 'meters/m-1/flow'), ('plus', 'meters/m-1/flow'), ('all', 'meters/m-1/flow'),
+            ('plus', 'meters/m-2/flow'), ('all', 'meters/m-2/flow'),
+            ('all', 'meters/m-2'),
+            ('hash', '$aws/things/m-1/shadow/get/accepted'),
+        ], calls)
+        self.assertEqual(4, len(everything))
+
+        calls.clear()
+        router.remove('#')
+        router.remove('meters/m-1/flow')
+        router.add('meters/+/flow', lambda packet: calls.append(('replaced', packet.topic)))
+        router(received('meters/m-1/flow'))
+        router(received('meters/m-2'))
+        self.assertEqual([('replaced', 'meters/m-1/flow')], calls)
+        self.assertEqual((5, 1), (router.routed, router.unrouted))
+
+    def test_callbacks_of_several_owners(self):
+        router = PublishRouter()
+        calls = []
+        for topic_filter in ('meters/m-1/flow', 'meters/+/flow'):
+            router.add(topic_filter, lambda packet: calls.append('first'), owner='first')
+            router.add(topic_filter, lambda packet: calls.append('second'), owner='second')
+            router(received('meters/m-1/flow'))
+            self.assertEqual(['first', 'second'], calls)
+
+            calls.clear()
+            self.assertFalse(router.remove(topic_filter, owner='first'))
+            router(received('meters/m-1/flow'))
+            self.assertEqual(['second'], calls)
+            self.assertTrue(router.remove(topic_filter, owner='second'))
+            calls.clear()
+        router(received('meters/m-1/flow'))
+        self.assertEqual([], calls)
+        self.assertEqual(({}, ()), (router._exact, router._wildcards))
+
+    def test_failing_callback(self):
+        router = PublishRouter()
+        calls = []
+        router.add('a/b', lambda packet: 1 / 0)
+        router.add('a/+', calls.append)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            router(received('a/b'))
+        self.assertEqual(1, len(calls))
+        self.assertIn('ZeroDivisionError', stderr.getvalue())
+
+    def test_builder_attaches_router(self):
+        client = mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_id='meter')
+        self.assertIsNone(PublishRouter.of(client))
+
+        client = mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_id='meter', publish_router=True)
+        self.assertIsInstance(PublishRouter.of(client), PublishRouter)
+
+        client_options = mqtt5.ClientOptions(host_name='example.com', on_publish_callback_fn=print)
+        client = mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_options=client_options,
+            publish_router=True)
+        self.assertIsNone(PublishRouter.of(client))
+
+
+class NativeServiceClientTest(TestCase):
+
+    def _client(self, router):
+        broker = MqttBroker()
+        self.addCleanup(broker.close)
+        broker.responders['$aws/things/m-1/shadow/get'] = answer_get_shadow
+        connected = Future()
+        client = mqtt5.Client(mqtt5.ClientOptions(
+            host_name='127.0.0.1', port=broker.port, on_publish_callback_fn=router,
+            on_lifecycle_event_connection_success_fn=connected.set_result))
+        if router is not None:
+            router.attach(client)
+        client.start()
+        self.addCleanup(client.stop)
+        connected.result(TIMEOUT)
+        return broker, client
+
+    def _get_shadow(self, shadow):
+        responses = queue.Queue()
+        subscribed, topic = shadow.subscribe_to_get_shadow_accepted(
+            iotshadow.GetShadowSubscriptionRequest(thing_name='m-1'), mqtt.QoS.AT_LEAST_ONCE, responses.put)
+        self.assertEqual(mqtt.QoS.AT_LEAST_ONCE, subscribed.result(TIMEOUT))
+        shadow.publish_get_shadow(
+            iotshadow.GetShadowRequest(thing_name='m-1', client_token='t-1'), mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        response = responses.get(timeout=TIMEOUT)
+        self.assertEqual('t-1', response.client_token)
+        self.assertEqual({'flowRate': 12.5}, response.state.reported)
+        return topic
+
+    def test_native(self):
+        everything = []
+        router = PublishRouter(everything.append)
+        broker, client = self._client(router)
+        shadow = iotshadow.IotShadowClient(client)
+        self.assertIs(client, shadow.mqtt5_client)
+        self.assertIsNone(shadow._mqtt_connection)
+
+        topic = self._get_shadow(shadow)
+        self.assertEqual(1, router.routed)
+        self.assertEqual(1, len(everything))
+        self.assertEqual('$aws/things/m-1/shadow/get', broker.published[0][0])
+
+        shadow.unsubscribe(topic).result(TIMEOUT)
+        self.assertIsNone(router._exact.get(topic))
+        # the adapter is still there for whoever asks for it
+        self.assertIsInstance(shadow.mqtt_connection, mqtt.Connection)
+
+    def test_service_clients_share_subscriptions(self):
+        broker, client = self._client(PublishRouter())
+        shadows = [iotshadow.IotShadowClient(client), iotshadow.IotShadowClient(client)]
+        responses = [queue.Queue(), queue.Queue()]
+        for shadow, received_responses in zip(shadows, responses):
+            request = iotshadow.GetShadowSubscriptionRequest(thing_name='m-1')
+            subscribed, topic = shadow.subscribe_to_get_shadow_accepted(
+                request, mqtt.QoS.AT_LEAST_ONCE, received_responses.put)
+            subscribed.result(TIMEOUT)
+
+        # the second client still has the subscription the first one gave up
+        shadows[0].unsubscribe(topic).result(TIMEOUT)
+        shadows[1].publish_get_shadow(
+            iotshadow.GetShadowRequest(thing_name='m-1', client_token='t-1'), mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        self.assertEqual('t-1', responses[1].get(timeout=TIMEOUT).client_token)
+        self.assertTrue(responses[0].empty())
+
+    def test_native_with_executor(self):
+        broker, client = self._client(PublishRouter())
+        shadow = iotshadow.IotShadowClient(client, executor=True)
+        self.addCleanup(shadow.shutdown)
+        self._get_shadow(shadow)
+
+    def test_adapter_without_router(self):
+        broker, client = self._client(None)
+        shadow = iotshadow.IotShadowClient(client)
+        self.assertIsInstance(shadow._mqtt_connection, mqtt.Connection)
+        self._get_shadow(shadow)
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import mqtt, mqtt5
+from concurrent.futures import Future
+from unittest import TestCase
+
+from awsiot import iotshadow, mqtt5_client_builder
+from awsiot.mqtt5_router import PublishRouter
+from awsiot.mqtt5_topic_alias import LRU, TopicAliasManager
+from test.mqtt_broker import MqttBroker
+
+TIMEOUT = 10.0  # seconds
+
+HOT = '$aws/things/meter-000001/shadow/name/flow/update'
+WARM = 'device/meter-000001/data'
+COLD = 'device/meter-000001/events'
+
+
+class TopicAliasManagerTest(TestCase):
+
+    def test_lfu(self):
+        aliases = TopicAliasManager(min_publishes=2)
+        self.assertIsNone(aliases.alias('device/meter-000002/data'), "no aliases before connecting")
+        aliases.reset(2)
+
+        self.assertEqual([None, 1, 1], [aliases.alias(HOT) for _ in range(3)])
+        self.assertEqual([None, 2], [aliases.alias(WARM) for _ in range(2)])
+        # as frequent as WARM, not more
+        self.assertEqual([None, None], [aliases.alias(COLD) for _ in range(2)])
+        self.assertEqual([2], [aliases.alias(COLD)])
+        self.assertEqual({HOT: 1, COLD: 2}, aliases.aliases)
+
+        stats = aliases.stats
+        self.assertEqual((9, 1, 3, 1), (stats.publishes, stats.aliased, stats.bindings, stats.evictions))
+        self.assertEqual(len(HOT) - 3 - 3 * 3, stats.bytes_saved)
+        self.assertAlmostEqual(stats.bytes_saved / 9, stats.bytes_saved_per_publish)
+
+        # a new connection binds them again
+        aliases.reset(1)
+        self.assertEqual({}, aliases.aliases)
+        self.assertEqual(1, aliases.alias(HOT))
+        self.assertEqual(4, stats.bindings)
+
+    def test_lru_and_limits(self):
+        aliases = TopicAliasManager(policy=LRU, maximum=1, min_publishes=1)
+        aliases.reset(8)
+        self.assertEqual(1, aliases.alias(HOT))
+        self.assertEqual(1, aliases.alias(WARM))
+        self.assertEqual({WARM: 1}, aliases.aliases)
+        self.assertIsNone(aliases.alias('a/b'), "too short to be worth it")
+
+        with self.assertRaises(ValueError):
+            TopicAliasManager(policy='fifo')
+
+    def test_decay(self):
+        aliases = TopicAliasManager(min_publishes=3, decay_interval=4)
+        aliases.reset(1)
+        for _ in range(2):
+            aliases.alias(COLD)
+        aliases.alias(HOT)
+        aliases.alias(HOT)
+        # counts were halved, COLD is back to 1
+        self.assertIsNone(aliases.alias(COLD))
+
+
+class TopicAliasPublishTest(TestCase):
+
+    def test_service_client_publishes(self):
+        broker = MqttBroker(topic_alias_maximum=2)
+        self.addCleanup(broker.close)
+        aliases = TopicAliasManager()
+        router = PublishRouter()
+        connected = Future()
+
+        def on_connection_success(data):
+            aliases.on_connection_success(data)
+            connected.set_result(data)
+
+        client = mqtt5.Client(mqtt5.ClientOptions(
+            host_name='127.0.0.1', port=broker.port, on_publish_callback_fn=router,
+            topic_aliasing_options=mqtt5.TopicAliasingOptions(
+                outbound_behavior=mqtt5.OutboundTopicAliasBehaviorType.MANUAL),
+            on_lifecycle_event_connection_success_fn=on_connection_success))
+        router.attach(client)
+        aliases.attach(client)
+        client.start()
+        self.addCleanup(client.stop)
+        connected.result(TIMEOUT)
+
+        shadow = iotshadow.IotShadowClient(client)
+        request = iotshadow.UpdateShadowRequest(
+            thing_name='meter-000001', state=iotshadow.ShadowState(reported={'flowRate': 12.5}))
+        shadow.publish_update_shadow(request, mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        unaliased = broker.bytes_received
+        for _ in range(9):
+            shadow.publish_update_shadow(request, mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+
+        topic = '$aws/things/meter-000001/shadow/update'
+        self.assertEqual([topic] * 10, [published[0] for published in broker.published])
+        self.assertEqual((10, 8, 1), (aliases.stats.publishes, aliases.stats.aliased, aliases.stats.bindings))
+        self.assertEqual(10 * unaliased - aliases.stats.bytes_saved, broker.bytes_received)
+
+    def test_builder_attaches_manager(self):
+        aliases = TopicAliasManager()
+        client = mqtt5_client_builder.direct_with_custom_authorizer(
+            endpoint='example.com', auth_authorizer_name='authorizer', client_id='meter',
+            topic_alias_manager=aliases)
+        self.assertIs(aliases, TopicAliasManager.of(client))
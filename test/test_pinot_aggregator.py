@@ -0,0 +1,84 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+from unittest import TestCase
+
+from samples.pinot_aggregator import FlowAggregator
+from samples.pinot_flow_meter import FlowSample
+
+START = 1700000000.0  # a whole hour, in epoch seconds
+
+
+def flow(pulses, rate=1.0, peak=None, elapsed=1.0):
+    return FlowSample(timestamp=0.0, elapsed=elapsed, pulses=pulses, flow_rate=rate,
+                      volume=pulses * 10.0, peak_flow_rate=peak)
+
+
+def no_flow():
+    return flow(0, rate=0.0)
+
+
+class FlowAggregatorTest(TestCase):
+
+    def test_rates_and_volume(self):
+        agg = FlowAggregator(['a'])
+        agg.add('a', flow(1, rate=1.0, peak=1.5), START + 1)
+        agg.add('a', flow(2, rate=3.0), START + 2)
+        agg.add('a', no_flow(), START + 3)
+        summary = agg.summary(START + 3)['channels']['a']
+
+        self.assertEqual(3, summary['pulses'])
+        self.assertEqual(30.0, summary['volume'])
+        self.assertEqual([1.0, 2.0, 3.0], summary['rate'])
+
+    def test_sessions(self):
+        agg = FlowAggregator(['a'], session_gap=3.0, include_sessions=True)
+        t = START
+        for sample in [flow(1), flow(1), no_flow(), flow(1), no_flow(), no_flow(), no_flow(), no_flow(), flow(2)]:
+            t += 1
+            agg.add('a', sample, t)
+        summary = agg.summary(t)['channels']['a']
+
+        # the short pause doesn't split the first session, the long one does
+        self.assertEqual(2, summary['sessions'])
+        self.assertEqual([[START, 4.0, 30.0]], summary['detail'])
+
+        # the session in progress carries over into the next period
+        agg.add('a', no_flow(), t + 5)
+        summary = agg.summary(t + 5)['channels']['a']
+        self.assertEqual(0, summary['sessions'])
+        self.assertEqual([[t - 1, 1.0, 20.0]], summary['detail'])
+
+    def test_rolling_minutes_and_hours(self):
+        agg = FlowAggregator(['a'])
+        agg.add('a', flow(1), START + 30)
+        agg.add('a', flow(2), START + 90)
+        agg.add('a', flow(3), START + 150)
+        summary = agg.summary(START + 180)['channels']['a']
+        # the period started in the first minute and ends in the fourth
+        self.assertEqual([10.0, 20.0, 30.0, 0.0], summary['minutes'])
+        self.assertEqual(60.0, summary['last_hour'])
+        self.assertEqual(60.0, summary['last_day'])
+
+        # an hour later the minutes have rolled over but the day still counts them
+        agg.add('a', flow(4), START + 3600 + 150)
+        summary = agg.summary(START + 3600 + 180)['channels']['a']
+        self.assertEqual(40.0, summary['last_hour'])
+        self.assertEqual(100.0, summary['last_day'])
+
+        # and after a day everything has rolled over
+        agg.add('a', no_flow(), START + 2 * 86400)
+        summary = agg.summary(START + 2 * 86400)['channels']['a']
+        self.assertEqual(0.0, summary['last_day'])
+
+    def test_summary_is_compact(self):
+        agg = FlowAggregator(['a', 'b'])
+        for i in range(3600):
+            agg.add('a', flow(5), START + i + 1)
+            agg.add('b', no_flow(), START + i + 1)
+        summary = agg.summary(START + 3600)
+        self.assertEqual(60, len(summary['channels']['a']['minutes']))
+        self.assertEqual(3600.0, summary['period'])
+        self.assertLess(len(json.dumps(summary)), 2048)
+        self.assertFalse(agg.has_flow())
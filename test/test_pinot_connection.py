@@ -0,0 +1,97 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from concurrent.futures import Future
+import threading
+from unittest import TestCase
+
+from samples.pinot_connection import CONNECTED, CONNECTING, DISCONNECTED, INTERRUPTED, ConnectionSupervisor
+
+TIMEOUT = 10.0  # seconds
+
+
+class FakeConnector:
+    """Connection attempts fail `failures` times, then succeed"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.called = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        future = Future()
+        if self.calls <= self.failures:
+            future.set_exception(RuntimeError("no route to host"))
+        else:
+            future.set_result({'session_present': False})
+        self.called.set()
+        return future
+
+
+class ConnectionSupervisorTest(TestCase):
+
+    def test_connects_in_background(self):
+        states = []
+        supervisor = ConnectionSupervisor(FakeConnector(), on_state_change=states.append)
+        supervisor.start()
+        self.assertTrue(supervisor.wait_connected(TIMEOUT))
+        supervisor.stop()
+
+        self.assertTrue(supervisor.is_connected())
+        self.assertEqual([CONNECTING, CONNECTED], states)
+
+    def test_retries_with_backoff(self):
+        connector = FakeConnector(failures=3)
+        supervisor = ConnectionSupervisor(connector, min_backoff=0.01, max_backoff=0.05)
+        supervisor.start()
+        self.assertTrue(supervisor.wait_connected(TIMEOUT))
+        supervisor.stop()
+
+        self.assertEqual(4, connector.calls)
+        self.assertEqual(3, supervisor.failures)
+
+    def test_backoff_is_jittered_and_capped(self):
+        supervisor = ConnectionSupervisor(min_backoff=1.0, max_backoff=8.0)
+        delays = [supervisor._backoff(10) for _ in range(100)]
+        self.assertTrue(all(0 <= d <= 8.0 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_interruption_is_left_to_awscrt(self):
+        connector = FakeConnector()
+        supervisor = ConnectionSupervisor(connector)
+        supervisor.start()
+        self.assertTrue(supervisor.wait_connected(TIMEOUT))
+
+        supervisor.on_connection_interrupted(None, RuntimeError("socket closed"))
+        self.assertEqual(INTERRUPTED, supervisor.state)
+        self.assertFalse(supervisor.is_connected())
+        # failed automatic reconnects don't make the supervisor connect again
+        supervisor.on_connection_failure(None, None)
+        self.assertEqual(INTERRUPTED, supervisor.state)
+        supervisor.on_connection_resumed(None, 0, True)
+        self.assertTrue(supervisor.is_connected())
+        supervisor.stop()
+
+        self.assertEqual(1, connector.calls)
+
+    def test_reconnects_after_close(self):
+        connector = FakeConnector()
+        supervisor = ConnectionSupervisor(connector, min_backoff=0.01)
+        supervisor.start()
+        self.assertTrue(supervisor.wait_connected(TIMEOUT))
+
+        connector.called.clear()
+        supervisor.on_connection_closed(None, None)
+        self.assertTrue(connector.called.wait(TIMEOUT))
+        self.assertTrue(supervisor.wait_connected(TIMEOUT))
+        supervisor.stop()
+
+        self.assertEqual(2, connector.calls)
+
+    def test_stop_while_connecting(self):
+        pending = Future()
+        supervisor = ConnectionSupervisor(lambda: pending)
+        supervisor.start()
+        supervisor.stop()
+        self.assertIn(supervisor.state, (DISCONNECTED, CONNECTING))
@@ -0,0 +1,201 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from concurrent.futures import Future
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from samples.pinot_aws_mqtt import AwsIotPublisher
+from samples.pinot_event_queue import EventQueue, RateLimiter
+
+TIMEOUT = 10.0  # seconds
+
+
+class FakeConnection:
+    """Stands in for awscrt.mqtt.Connection, PUBACKs are completed by the test"""
+
+    def __init__(self, auto_ack=True):
+        self.auto_ack = auto_ack
+        self.published = []
+        self.futures = []
+        self.lock = threading.Lock()
+        self.publish_event = threading.Event()
+
+    def connect(self):
+        future = Future()
+        future.set_result({'session_present': False})
+        return future
+
+    def publish(self, topic, payload, qos):
+        future = Future()
+        with self.lock:
+            self.published.append((topic, payload))
+            self.futures.append(future)
+        if self.auto_ack:
+            future.set_result({'packet_id': len(self.published)})
+        self.publish_event.set()
+        return future, len(self.published)
+
+
+class EventQueueTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'sub', 'outbox.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fifo_and_ack(self):
+        q = EventQueue(self.path, commit_every=1)
+        for i in range(5):
+            q.put({'n': i})
+        batch = q.peek(3)
+        self.assertEqual([{'n': 0}, {'n': 1}, {'n': 2}], [json.loads(p) for _, p in batch])
+        q.ack([event_id for event_id, _ in batch])
+        self.assertEqual(2, len(q))
+        self.assertEqual([{'n': 3}, {'n': 4}], [json.loads(p) for _, p in q.peek(10)])
+        q.close()
+
+    def test_survives_reopen(self):
+        q = EventQueue(self.path, commit_every=100)
+        q.put({'flowrate': 1.5})
+        q.close()
+
+        q = EventQueue(self.path)
+        self.assertEqual([{'flowrate': 1.5}], [json.loads(p) for _, p in q.peek(10)])
+        q.close()
+
+    def test_group_commit(self):
+        q = EventQueue(self.path, commit_every=3, commit_interval=3600)
+        q.put({'n': 0})
+        q.put({'n': 1})
+
+        # a second reader only sees committed events
+        other = EventQueue(self.path)
+        self.assertEqual(0, len(other))
+        q.put({'n': 2})
+        self.assertEqual(3, len(other))
+        other.close()
+        q.close()
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            EventQueue(':memory:', commit_every=0)
+        with self.assertRaises(ValueError):
+            EventQueue(':memory:', synchronous='SOMETIMES')
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(10.0, burst=2)
+        self.assertEqual(0.0, limiter.delay())
+        self.assertEqual(0.0, limiter.delay())
+        self.assertGreater(limiter.delay(), 0.0)
+        self.assertEqual(0.0, RateLimiter(None).delay(100))
+
+
+class AwsIotPublisherQueueTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'outbox.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _publisher(self, connection, **kwargs):
+        with patch.object(AwsIotPublisher, 'create_mqtt_connection', return_value=connection):
+            return AwsIotPublisher('endpoint', 'ca', 'cert', 'key', 'client', 'device/1/data',
+                                   queue_file=self.path, max_publish_rate=None, **kwargs)
+
+    def _wait_for(self, predicate):
+        done = threading.Event()
+        for _ in range(int(TIMEOUT / 0.01)):
+            if predicate():
+                return
+            done.wait(0.01)
+        self.fail("timed out")
+
+    def test_offline_messages_are_kept(self):
+        connection = FakeConnection()
+        publisher = self._publisher(connection)
+        publisher.publish_message({'flowrate': 1})
+        publisher.publish_message({'flowrate': 2})
+        publisher.close()
+
+        self.assertEqual([], connection.published)
+        q = EventQueue(self.path)
+        self.assertEqual(2, len(q))
+        q.close()
+
+    def test_replay_after_connect(self):
+        connection = FakeConnection()
+        publisher = self._publisher(connection, batch_size=2, commit_every=1)
+        for i in range(5):
+            publisher.publish_message({'flowrate': i})
+
+        self.assertTrue(publisher.connect(timeout=TIMEOUT))
+        self._wait_for(lambda: publisher.acked_count == 5)
+        publisher.close()
+
+        self.assertEqual([{'flowrate': i} for i in range(5)], [json.loads(p) for _, p in connection.published])
+        q = EventQueue(self.path)
+        self.assertEqual(0, len(q))
+        q.close()
+
+    def test_failed_puback_keeps_message(self):
+        connection = FakeConnection(auto_ack=False)
+        publisher = self._publisher(connection, batch_size=2, commit_every=1)
+        publisher.publish_message({'flowrate': 1})
+        publisher.publish_message({'flowrate': 2})
+        publisher.is_connected_flag = True
+        publisher._drain_event.set()
+        self._wait_for(lambda: len(connection.futures) == 2)
+
+        connection.futures[0].set_result({})
+        connection.futures[1].set_exception(RuntimeError("connection lost"))
+        self._wait_for(lambda: publisher.acked_count == 1)
+        publisher.is_connected_flag = False
+        publisher.close()
+
+        q = EventQueue(self.path)
+        self.assertEqual([{'flowrate': 2}], [json.loads(p) for _, p in q.peek(10)])
+        q.close()
+
+    def test_only_messages_before_a_failure_are_removed(self):
+        connection = FakeConnection(auto_ack=False)
+        publisher = self._publisher(connection, batch_size=3, commit_every=1)
+        for i in range(3):
+            publisher.publish_message({'flowrate': i})
+        publisher.is_connected_flag = True
+        publisher._drain_event.set()
+        self._wait_for(lambda: len(connection.futures) == 3)
+
+        connection.futures[2].set_result({})
+        connection.futures[1].set_exception(RuntimeError("rejected"))
+        connection.futures[0].set_result({})
+        self._wait_for(lambda: publisher.acked_count == 1)
+        publisher.is_connected_flag = False
+        publisher.close()
+
+        q = EventQueue(self.path)
+        self.assertEqual([{'flowrate': 1}, {'flowrate': 2}], [json.loads(p) for _, p in q.peek(10)])
+        q.close()
+
+    def test_close_does_not_wait_for_pubacks(self):
+        connection = FakeConnection(auto_ack=False)
+        publisher = self._publisher(connection, commit_every=1, ack_timeout=60.0)
+        publisher.publish_message({'flowrate': 1})
+        publisher.is_connected_flag = True
+        publisher._drain_event.set()
+        self._wait_for(lambda: len(connection.futures) == 1)
+
+        start = time.monotonic()
+        publisher.close()
+        self.assertLess(time.monotonic() - start, TIMEOUT)
+        self.assertEqual(0, publisher.acked_count)
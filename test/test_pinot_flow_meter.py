@@ -0,0 +1,216 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from array import array
+import threading
+import time
+from unittest import TestCase
+
+from samples.pinot_flow_meter import FlowMeter, GpioBackend, PulseCapture, SimulatedPulseSource, pulse_intervals
+
+TIMEOUT = 10.0  # seconds
+
+
+class ManualBackend(GpioBackend):
+    """Backend whose pulses are injected by the test"""
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def add_pulse_listener(self, pin, callback):
+        self.callbacks[pin] = callback
+
+    def remove_pulse_listener(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def pulse(self, pin, count=1):
+        for _ in range(count):
+            self.callbacks[pin](time.monotonic())
+
+    def pulse_at(self, pin, timestamps):
+        for timestamp in timestamps:
+            self.callbacks[pin](timestamp)
+
+
+class PulseCaptureTest(TestCase):
+
+    def test_drain_in_order(self):
+        capture = PulseCapture(capacity=4)
+        for t in (1.0, 2.0, 3.0):
+            capture.push(t)
+        self.assertEqual(3, len(capture))
+        self.assertEqual(array('d', [1.0, 2.0, 3.0]), capture.drain())
+        self.assertEqual(0, len(capture))
+        self.assertEqual(array('d'), capture.drain())
+
+    def test_wraps_around(self):
+        capture = PulseCapture(capacity=4)
+        for t in (1.0, 2.0, 3.0):
+            capture.push(t)
+        capture.drain()
+        for t in (4.0, 5.0, 6.0, 7.0):
+            capture.push(t)
+        self.assertEqual(array('d', [4.0, 5.0, 6.0, 7.0]), capture.drain())
+
+    def test_full_buffer_drops_newest(self):
+        capture = PulseCapture(capacity=2)
+        for t in (1.0, 2.0, 3.0):
+            capture.push(t)
+        self.assertEqual(1, capture.overflows)
+        self.assertEqual(array('d', [1.0, 2.0]), capture.drain())
+
+    def test_concurrent_producer_loses_nothing(self):
+        capture = PulseCapture(capacity=1 << 16)
+        total = 50000
+        drained = []
+
+        def produce():
+            for i in range(total):
+                capture.push(float(i))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive():
+            drained.extend(capture.drain())
+        producer.join()
+        drained.extend(capture.drain())
+
+        self.assertEqual(0, capture.overflows)
+        self.assertEqual([float(i) for i in range(total)], drained)
+
+    def test_pulse_intervals(self):
+        self.assertEqual(array('d', [1.0, 2.0]), pulse_intervals(array('d', [1.0, 2.0, 4.0])))
+        self.assertEqual(array('d', [0.5, 1.0]), pulse_intervals(array('d', [1.0, 2.0]), previous=0.5))
+        self.assertEqual(array('d'), pulse_intervals(array('d'), previous=0.5))
+
+
+class FlowMeterTest(TestCase):
+
+    def test_sample_from_pulses(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, calibration_factor=5.5, window=0.2)
+        meter.start()
+        backend.pulse(18, 11)
+        sample = next(meter.samples(timeout=TIMEOUT))
+        meter.stop()
+
+        self.assertEqual(11, sample.pulses)
+        # 11 pulses / 5.5 Hz per L/min = 2 L/min for one second = 1/30 L
+        self.assertAlmostEqual(1000.0 / 30.0, sample.volume)
+        self.assertGreater(sample.flow_rate, 0.0)
+        self.assertNotIn(18, backend.callbacks)
+
+    def test_rate_from_intervals(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, calibration_factor=5.5, window=60.0)
+        meter.start()
+        # 11 Hz for 10 pulses, then a burst at 110 Hz
+        now = time.monotonic()
+        steady = [now + i / 11.0 for i in range(10)]
+        burst = [steady[-1] + (i + 1) / 110.0 for i in range(11)]
+        backend.pulse_at(18, steady + burst)
+        meter.stop()
+        sample = next(meter.samples(timeout=TIMEOUT))
+
+        self.assertEqual(21, sample.pulses)
+        expected_mean = 20 / (burst[-1] - steady[0]) / 5.5
+        self.assertAlmostEqual(expected_mean, sample.flow_rate)
+        self.assertAlmostEqual(20.0, sample.peak_flow_rate, places=3)
+
+    def test_rate_is_anchored_on_previous_window(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, calibration_factor=1.0, window=0.1)
+        meter.start()
+        samples = meter.samples(timeout=TIMEOUT)
+        start = time.monotonic()
+        backend.pulse_at(18, [start, start + 0.02])
+        first = next(samples)
+        while first.pulses == 0:
+            first = next(samples)
+        # a single pulse in the next window is measured against the last one
+        backend.pulse_at(18, [start + 0.12])
+        second = next(samples)
+        meter.stop()
+
+        self.assertEqual(1, second.pulses)
+        self.assertAlmostEqual(10.0, second.flow_rate)
+
+    def test_pulses_with_the_same_timestamp(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, calibration_factor=1.0, window=60.0)
+        meter.start()
+        now = time.monotonic()
+        backend.pulse_at(18, [now, now, now])
+        meter.stop()
+        sample = next(meter.samples(timeout=TIMEOUT))
+
+        self.assertEqual(3, sample.pulses)
+        self.assertGreater(sample.flow_rate, 0.0)
+        self.assertEqual(sample.flow_rate, sample.peak_flow_rate)
+
+    def test_idle_windows_report_zero(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, window=0.05)
+        meter.start()
+        samples = meter.samples(timeout=TIMEOUT)
+        first = next(samples)
+        second = next(samples)
+        meter.stop()
+
+        self.assertEqual(0, first.pulses + second.pulses)
+        self.assertEqual(0.0, second.flow_rate)
+        self.assertGreater(second.timestamp, first.timestamp)
+
+    def test_stop_flushes_and_ends_iteration(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, window=60.0)
+        meter.start()
+        backend.pulse(18, 3)
+        meter.stop()
+
+        samples = list(meter.samples(timeout=TIMEOUT))
+        self.assertEqual(1, len(samples))
+        self.assertEqual(3, samples[0].pulses)
+        self.assertEqual(3, meter.total_pulses)
+
+    def test_overflow_is_counted(self):
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, window=60.0, buffer_size=4)
+        meter.start()
+        backend.pulse(18, 6)
+        meter.stop()
+
+        self.assertEqual(2, meter.overflows)
+        self.assertEqual(4, meter.total_pulses)
+
+    def test_on_sample_callback(self):
+        received = []
+        done = threading.Event()
+
+        def on_sample(sample):
+            received.append(sample)
+            done.set()
+
+        backend = ManualBackend()
+        meter = FlowMeter(backend, pin=18, window=0.05, on_sample=on_sample)
+        meter.start()
+        self.assertTrue(done.wait(TIMEOUT))
+        meter.stop()
+        self.assertTrue(received)
+
+    def test_simulated_pulse_source(self):
+        backend = SimulatedPulseSource(frequency_hz=200.0)
+        meter = FlowMeter(backend, pin=5, window=0.25)
+        meter.start()
+        time.sleep(1.0)
+        meter.stop()
+        backend.cleanup()
+
+        self.assertEqual(backend.emitted[5], meter.total_pulses)
+        self.assertGreater(meter.total_pulses, 100)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            FlowMeter(ManualBackend(), pin=18, calibration_factor=0)
+        with self.assertRaises(ValueError):
+            FlowMeter(ManualBackend(), pin=18, window=0)
@@ -0,0 +1,92 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+import os
+import threading
+from unittest import TestCase
+
+from samples.pinot_runtime import ChannelConfig, PinotRuntime, RuntimeConfig
+from samples.pinot_flow_meter import SimulatedPulseSource
+
+TIMEOUT = 10.0  # seconds
+
+
+class RecordingPublisher:
+
+    def __init__(self):
+        self.messages = []
+        self.published = threading.Event()
+
+    def publish_message(self, message):
+        self.messages.append(message)
+        self.published.set()
+
+
+class RuntimeConfigTest(TestCase):
+
+    def test_load_sample_config(self):
+        path = os.path.join(os.path.dirname(__file__), '..', 'samples', 'pinot_runtime_config.json')
+        config = RuntimeConfig.load(path)
+        self.assertEqual(['main', 'kitchen', 'garden'], [c.name for c in config.channels])
+        self.assertEqual([5.5, 7.5, 5.5], [c.calibration_factor for c in config.channels])
+        self.assertEqual(60.0, config.reporting_interval)
+
+    def test_invalid_configs(self):
+        with self.assertRaises(ValueError):
+            RuntimeConfig([])
+        with self.assertRaises(ValueError):
+            RuntimeConfig([ChannelConfig('a', 1), ChannelConfig('a', 2)])
+        with self.assertRaises(ValueError):
+            RuntimeConfig([ChannelConfig('a', 1), ChannelConfig('b', 1)])
+        with self.assertRaises(ValueError):
+            RuntimeConfig([ChannelConfig('a', 1)], sample_window=1.0, reporting_interval=0.5)
+
+
+class PinotRuntimeTest(TestCase):
+
+    def test_one_batched_message_per_interval(self):
+        config = RuntimeConfig.from_dict({
+            'sample_window': 0.05,
+            'reporting_interval': 0.25,
+            'channels': [{'name': 'ch{}'.format(i), 'pin': i} for i in range(4)],
+        })
+        backend = SimulatedPulseSource(frequency_hz=100.0)
+        publisher = RecordingPublisher()
+        runtime = PinotRuntime(config, backend, publisher)
+        runtime.start()
+        self.assertTrue(publisher.published.wait(TIMEOUT))
+        runtime.stop()
+        backend.cleanup()
+
+        self.assertEqual(runtime.publish_count, len(publisher.messages))
+        message = publisher.messages[0]
+        self.assertEqual(['ch0', 'ch1', 'ch2', 'ch3'], sorted(message['channels']))
+        self.assertTrue(all(c['pulses'] > 0 for c in message['channels'].values()))
+        # the message must survive the offline queue
+        json.dumps(message)
+
+        total_reported = sum(c['pulses'] for m in publisher.messages for c in m['channels'].values())
+        self.assertEqual(sum(m.total_pulses for m in runtime.meters.values()), total_reported)
+
+    def test_per_channel_calibration(self):
+        config = RuntimeConfig([ChannelConfig('a', 1, 5.5), ChannelConfig('b', 2, 11.0)],
+                               sample_window=60.0, reporting_interval=60.0)
+        backend = SimulatedPulseSource()
+        publisher = RecordingPublisher()
+        runtime = PinotRuntime(config, backend, publisher)
+        runtime.start()
+        runtime.meters['a']._on_pulse(1.0)
+        runtime.meters['b']._on_pulse(1.0)
+        runtime.stop()
+
+        channels = publisher.messages[-1]['channels']
+        self.assertAlmostEqual(channels['a']['volume'], 2 * channels['b']['volume'], places=1)
+
+    def test_idle_stop_publishes_nothing(self):
+        config = RuntimeConfig([ChannelConfig('a', 1)], sample_window=60.0, reporting_interval=60.0)
+        publisher = RecordingPublisher()
+        runtime = PinotRuntime(config, SimulatedPulseSource(), publisher)
+        runtime.start()
+        runtime.stop()
+        self.assertEqual([], publisher.messages)
@@ -0,0 +1,207 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import pickle
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from awsiot import iotidentity
+from awsiot.provisioning import FleetProvisioner, KeyAndCsr, ProvisioningError, generate_key_and_csr
+from test.fake_service import FakeService
+
+TIMEOUT = 10.0  # seconds
+
+CERTIFICATE_ACCEPTED = '$aws/certificates/create-from-csr/json/accepted'
+
+_serials = itertools.count()
+
+
+def fake_keys():
+    n = next(_serials)
+    return KeyAndCsr('KEY-{}'.format(n), 'CSR-{}'.format(n), 'PUB-{}'.format(n).encode())
+
+
+def fake_keys_without_public_key():
+    keys = fake_keys()
+    keys.public_key_der = None
+    return keys
+
+
+def fake_certificate_public_key(certificate_pem):
+    # stands in for parsing the certificate with cryptography
+    return ('PUB-' + certificate_pem[len('CERT-CSR-'):]).encode()
+
+
+class FakeProvisioningService(FakeService):
+    """
+    Answers Fleet Provisioning requests once released, counting how many of a
+    kind awaited a response at once
+    """
+
+    def __init__(self, rejected_serials=(), rejected_certificates=(), certificate_batch=1):
+        super().__init__()
+        self.rejected_serials = set(rejected_serials)
+        # indexes of the certificate requests to reject, in the order they were sent
+        self.rejected_certificates = set(rejected_certificates)
+        # certificate requests are answered in reverse order, this many at a time
+        self.certificate_batch = certificate_batch
+        self.outstanding = {'create-from-csr': 0, 'provision': 0}
+        self.max_outstanding = {'create-from-csr': 0, 'provision': 0}
+        self._lock = threading.Lock()
+        self._certificate_requests = []
+        self._certificates_requested = 0
+        self._hold = threading.Event()
+        self.call(self._hold.wait, TIMEOUT)
+
+    def publish(self, topic, payload, qos, retain=False):
+        kind = topic.split('/')[-2]
+        with self._lock:
+            self.outstanding[kind] += 1
+            self.max_outstanding[kind] = max(self.max_outstanding[kind], self.outstanding[kind])
+        return super().publish(topic, payload, qos, retain)
+
+    def release(self):
+        self._hold.set()
+
+    def close(self):
+        self._hold.set()
+        super().close()
+
+    def handle(self, topic, payload):
+        with self._lock:
+            self.outstanding[topic.split('/')[-2]] -= 1
+        if topic == '$aws/certificates/create-from-csr/json':
+            self._certificate_requests.append((self._certificates_requested, topic, payload))
+            self._certificates_requested += 1
+            if len(self._certificate_requests) == self.certificate_batch:
+                requests, self._certificate_requests = self._certificate_requests, []
+                for index, topic, payload in reversed(requests):
+                    self._create_certificate(index, topic, payload)
+        else:
+            serial = payload['parameters']['SerialNumber']
+            if serial in self.rejected_serials:
+                response = {'statusCode': 400, 'errorCode': 'InvalidParameters', 'errorMessage': serial}
+                self.respond(topic + '/rejected', response)
+            else:
+                self.respond(topic + '/accepted', {
+                    'thingName': 'meter-' + serial,
+                    'deviceConfiguration': {'token': payload['certificateOwnershipToken']},
+                })
+
+    def _create_certificate(self, index, topic, payload):
+        csr = payload['certificateSigningRequest']
+        if index in self.rejected_certificates:
+            self.respond(topic + '/rejected', {'statusCode': 400, 'errorCode': 'InvalidCsr', 'errorMessage': csr})
+        else:
+            self.respond(topic + '/accepted', {'certificateId': csr.lower(), 'certificatePem': 'CERT-' + csr,
+                                               'certificateOwnershipToken': 'TOKEN-' + csr})
+
+
+class FleetProvisionerTest(TestCase):
+
+    def setUp(self):
+        patcher = patch('awsiot.provisioning._certificate_public_key_der', fake_certificate_public_key)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _provisioner(self, service, key_factory=fake_keys, **kwargs):
+        executor = ThreadPoolExecutor(2)
+        provisioner = FleetProvisioner(iotidentity.IotIdentityClient(service), 'MeterTemplate',
+                                       key_factory=key_factory, key_executor=executor, **kwargs)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(service.close)
+        self.addCleanup(provisioner.close)
+        provisioner.start().result(TIMEOUT)
+        return provisioner
+
+    def _check(self, result):
+        # the certificate and key of one device
+        self.assertEqual('CERT-CSR-' + result.private_key_pem[len('KEY-'):], result.certificate_pem)
+        self.assertEqual({'token': 'TOKEN-' + result.certificate_pem[len('CERT-'):]}, result.device_configuration)
+
+    def test_pipelines_requests(self):
+        service = FakeProvisioningService(certificate_batch=3)
+        provisioner = self._provisioner(service, pool_size=4, max_in_flight=3)
+        futures = provisioner.provision_many([{'SerialNumber': str(i)} for i in range(9)])
+        service.release()
+        results = [f.result(TIMEOUT) for f in futures]
+
+        self.assertEqual(['meter-{}'.format(i) for i in range(9)], [r.thing_name for r in results])
+        for result in results:
+            self._check(result)
+        # certificates were requested several at once, but never more than allowed, registrations one at a time
+        self.assertEqual({'create-from-csr': 3, 'provision': 1}, service.max_outstanding)
+
+        stats = provisioner.stats
+        for stage in ('keys', 'certificate', 'register'):
+            self.assertEqual(9, stats[stage].completed)
+            self.assertEqual(0, stats[stage].in_flight)
+        self.assertGreater(stats['register'].mean_latency, 0)
+
+    def test_unmatchable_certificates_one_at_a_time(self):
+        service = FakeProvisioningService()
+        provisioner = self._provisioner(service, key_factory=fake_keys_without_public_key, max_in_flight=3)
+        futures = provisioner.provision_many([{'SerialNumber': str(i)} for i in range(4)])
+        service.release()
+        for future in futures:
+            self._check(future.result(TIMEOUT))
+        self.assertEqual({'create-from-csr': 1, 'provision': 1}, service.max_outstanding)
+
+    def test_unknown_certificate_is_dropped(self):
+        service = FakeProvisioningService()
+        provisioner = self._provisioner(service)
+        service.call(service.respond, CERTIFICATE_ACCEPTED, {
+            'certificateId': 'other', 'certificatePem': 'CERT-CSR-other', 'certificateOwnershipToken': 'TOKEN-other'})
+        future = provisioner.provision({'SerialNumber': '0'})
+        service.release()
+        self._check(future.result(TIMEOUT))
+
+    def test_rejected_certificate_among_several(self):
+        # the rejection comes between the responses to the other two
+        service = FakeProvisioningService(rejected_certificates={1}, certificate_batch=3)
+        provisioner = self._provisioner(service, max_in_flight=3)
+        futures = provisioner.provision_many([{'SerialNumber': str(i)} for i in range(3)])
+        service.release()
+        self._check(futures[0].result(TIMEOUT))
+        with self.assertRaises(ProvisioningError) as context:
+            futures[1].result(TIMEOUT)
+        self.assertEqual('certificate', context.exception.stage)
+        self._check(futures[2].result(TIMEOUT))
+        self.assertEqual(1, provisioner.stats['certificate'].failed)
+
+    def test_rejected_register(self):
+        service = FakeProvisioningService(rejected_serials={'1'})
+        service.release()
+        provisioner = self._provisioner(service)
+        futures = provisioner.provision_many([{'SerialNumber': str(i)} for i in range(3)])
+        self.assertEqual('meter-0', futures[0].result(TIMEOUT).thing_name)
+        with self.assertRaises(ProvisioningError) as context:
+            futures[1].result(TIMEOUT)
+        self.assertEqual('register', context.exception.stage)
+        self.assertEqual('InvalidParameters', context.exception.error_response.error_code)
+        self.assertEqual('meter-2', futures[2].result(TIMEOUT).thing_name)
+        self.assertEqual(1, provisioner.stats['register'].failed)
+
+    def test_timeout_closes(self):
+        service = FakeProvisioningService()
+        provisioner = self._provisioner(service, timeout=0.05, max_in_flight=2)
+        futures = provisioner.provision_many([{'SerialNumber': str(i)} for i in range(3)])
+        for future in futures:
+            with self.assertRaises(TimeoutError):
+                future.result(TIMEOUT)
+        self.assertEqual(3, provisioner.stats['certificate'].failed)
+        with self.assertRaises(RuntimeError):
+            provisioner.provision({'SerialNumber': '3'})
+
+    def test_generate_key_and_csr(self):
+        try:
+            keys = generate_key_and_csr()
+        except ImportError:
+            self.skipTest("cryptography not installed")
+        self.assertIn('BEGIN CERTIFICATE REQUEST', keys.csr_pem)
+        self.assertIn('BEGIN PRIVATE KEY', keys.private_key_pem)
+        copy = pickle.loads(pickle.dumps(keys))
+        self.assertEqual(keys.public_key_der, copy.public_key_der)
@@ -14,7 +14,9 @@ from awscrt.io import (ClientBootstrap, DefaultHostResolver, EventLoopGroup,
                        init_logging, LogLevel)
 from awscrt.eventstream import Header, HeaderType
 from awscrt.eventstream.rpc import MessageType
+import base64
 from datetime import datetime, timezone
+import json
 import logging
 import os
 from queue import Queue
@@ -456,3 +458,69 @@ class RpcTest(TestCase):
 
             # wait for close to complete before attempting reconnect
             close_future.result(TIMEOUT)
+
+
+class BlobPayloadTest(TestCase):
+
+    def _serialize(self, shape):
+        operation = object.__new__(client.EchoMessageOperation)
+        return operation._json_payload_from_shape(shape)
+
+    def test_large_blobs_are_spliced(self):
+        for size in (0, 10, 4095, 4096, 5000, 70001):
+            blob = os.urandom(size)
+            request = model.EchoMessageRequest(message=model.MessageData(
+                string_message='meter', blob_message=blob, string_list_message=['a', 'b']))
+            payload = self._serialize(request)
+            self.assertEqual(json.dumps(request._to_payload()).encode(), payload)
+
+            operation = object.__new__(client.EchoMessageOperation)
+            echoed = operation._shape_from_json_payload(payload, model.EchoMessageRequest)
+            self.assertEqual(blob, echoed.message.blob_message)
+            # the shape itself is left as it was
+            self.assertIs(blob, request.message.blob_message)
+
+    def test_greengrass_messages(self):
+        from awsiot.greengrasscoreipc import model as ipc
+        blobs = [os.urandom(4096), os.urandom(8192)]
+        shapes = [
+            ipc.PublishToTopicRequest(topic='meters/1', publish_message=ipc.PublishMessage(
+                binary_message=ipc.BinaryMessage(message=blobs[0], context=ipc.MessageContext(topic='meters/1')))),
+            ipc.PublishToIoTCoreRequest(topic_name='meters/1', qos='1', payload=blobs[0], correlation_data=blobs[1]),
+            ipc.IoTCoreMessage(message=ipc.MQTTMessage(topic_name='meters/1', payload=blobs[1])),
+            # two blobs in the same nested shape
+            ipc.IoTCoreMessage(message=ipc.MQTTMessage(topic_name='meters/1', payload=blobs[1],
+                                                       correlation_data=blobs[0])),
+        ]
+        for shape in shapes:
+            self.assertEqual(json.dumps(shape._to_payload()).encode(), self._serialize(shape))
+
+    def test_blob_paths(self):
+        from awsiot.greengrasscoreipc import model as ipc
+        self.assertEqual((('message', 'blob_message'),), awsiot.eventstreamrpc._blob_paths(model.EchoMessageRequest))
+        self.assertEqual((('publish_message', 'binary_message', 'message'),),
+                         awsiot.eventstreamrpc._blob_paths(ipc.PublishToTopicRequest))
+        self.assertEqual((('message', 'payload'), ('message', 'correlation_data')),
+                         awsiot.eventstreamrpc._blob_paths(ipc.IoTCoreMessage))
+        self.assertEqual((), awsiot.eventstreamrpc._blob_paths(ipc.JsonMessage))
+
+    def test_greengrass_blob_paths(self):
+        # each path found leads, through nested shapes, to a member serialized as base64
+        from awsiot.greengrasscoreipc import model as ipc
+        blob = os.urandom(4096)
+        paths = 0
+        for shape_type in vars(ipc).values():
+            if not (isinstance(shape_type, type) and issubclass(shape_type, awsiot.eventstreamrpc.Shape)):
+                continue
+            for path in awsiot.eventstreamrpc._blob_paths(shape_type):
+                shape = value = shape_type()
+                for attr in path[:-1]:
+                    # Optional[nested shape type]
+                    setattr(value, attr, type(value).__init__.__annotations__[attr].__args__[0]())
+                    value = getattr(value, attr)
+                setattr(value, path[-1], blob)
+                payload = json.dumps(shape._to_payload()).encode()
+                self.assertIn(base64.b64encode(blob), payload)
+                self.assertEqual(payload, self._serialize(shape))
+                paths += 1
+        self.assertGreater(paths, 10)
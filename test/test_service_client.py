@@ -0,0 +1,332 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import mqtt
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextlib
+import io
+import json
+import threading
+from unittest import TestCase
+
+import awsiot
+from awsiot import codec, iotidentity, iotjobs, iotshadow
+
+TIMEOUT = 10.0  # seconds
+
+
+class FakeConnection(mqtt.Connection):
+    """MQTT connection that records operations instead of talking to a broker"""
+
+    def __init__(self):
+        # deliberately not calling super().__init__(), there is no native connection
+        self.published = []
+        self.subscriptions = {}
+
+    def publish(self, topic, payload, qos, retain=False):
+        self.published.append((topic, payload, qos))
+        future = Future()
+        future.set_result({'packet_id': len(self.published)})
+        return future, len(self.published)
+
+    def subscribe(self, topic, qos, callback=None):
+        self.subscriptions[topic] = callback
+        future = Future()
+        future.set_result({'packet_id': 1, 'topic': topic, 'qos': qos})
+        return future, 1
+
+    def unsubscribe(self, topic):
+        self.subscriptions.pop(topic, None)
+        future = Future()
+        future.set_result({'packet_id': 1})
+        return future, 1
+
+    def deliver(self, topic, payload, subscription=None):
+        """Deliver a message, `subscription` is the topic filter matching `topic` if it isn't `topic` itself"""
+        callback = self.subscriptions[subscription or topic]
+        callback(topic=topic, payload=payload, dup=False, qos=mqtt.QoS.AT_LEAST_ONCE, retain=False)
+
+
+SHADOW_DOCUMENT = {
+    'state': {
+        'reported': {'flowrate': 12.5, 'valve': 'open', 'firmware': '1.4.2', 'channels': [1, 2, 3, 4]},
+        'desired': {'valve': 'open', 'interval': 60},
+    },
+    'version': 42,
+    'clientToken': 'a1b2c3',
+}
+
+
+class CodecTest(TestCase):
+
+    def _round_trip(self, c):
+        encoded = c.encode(SHADOW_DOCUMENT)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(SHADOW_DOCUMENT, c.decode(encoded))
+        return encoded
+
+    def test_json_backends(self):
+        stdlib = self._round_trip(codec.JsonCodec(backend='json'))
+        self.assertEqual(SHADOW_DOCUMENT, json.loads(stdlib))
+        default = self._round_trip(codec.JsonCodec())
+        self.assertEqual(SHADOW_DOCUMENT, json.loads(default))
+
+    def test_orjson_falls_back(self):
+        try:
+            c = codec.JsonCodec(backend='orjson')
+        except ImportError:
+            self.skipTest("orjson not installed")
+        self.assertEqual(c.decode(c.encode({'big': 2 ** 70})), {'big': 2 ** 70})
+
+    def test_decode_buffers(self):
+        encoded = json.dumps(SHADOW_DOCUMENT).encode()
+        for backend in ['json', 'auto']:
+            c = codec.JsonCodec(backend=backend)
+            for buffer in [encoded, bytearray(encoded), memoryview(encoded)]:
+                self.assertEqual(SHADOW_DOCUMENT, c.decode(buffer))
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            codec.JsonCodec(backend='yaml')
+
+    def test_cbor(self):
+        try:
+            c = codec.CborCodec()
+        except ImportError:
+            self.skipTest("cbor2 not installed")
+        self.assertLess(len(self._round_trip(c)), len(json.dumps(SHADOW_DOCUMENT)))
+
+    def test_msgpack(self):
+        try:
+            c = codec.MsgPackCodec()
+        except ImportError:
+            self.skipTest("msgpack not installed")
+        self.assertLess(len(self._round_trip(c)), len(json.dumps(SHADOW_DOCUMENT)))
+
+
+class ServiceClientCodecTest(TestCase):
+
+    def test_default_codec_is_json(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection)
+        self.assertIs(codec.DEFAULT_CODEC, client.codec)
+
+        client.publish_update_shadow(
+            iotshadow.UpdateShadowRequest(
+                thing_name='meter', state=iotshadow.ShadowState(reported={'flowrate': 1.5})),
+            mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        topic, payload, _ = connection.published[0]
+        self.assertEqual('$aws/things/meter/shadow/update', topic)
+        self.assertEqual({'state': {'reported': {'flowrate': 1.5}}}, json.loads(payload))
+
+    def test_empty_payload(self):
+        connection = FakeConnection()
+        client = awsiot.MqttServiceClient(connection)
+        client._publish_operation('a/b', mqtt.QoS.AT_MOST_ONCE, None).result(TIMEOUT)
+        self.assertEqual(b'', connection.published[0][1])
+
+    def test_subscribe_decodes_with_codec(self):
+        connection = FakeConnection()
+        client = iotjobs.IotJobsClient(connection, codec=codec.JsonCodec(backend='json'))
+        received = []
+        future, topic = client.subscribe_to_next_job_execution_changed_events(
+            iotjobs.NextJobExecutionChangedSubscriptionRequest(thing_name='meter'),
+            mqtt.QoS.AT_LEAST_ONCE,
+            received.append)
+        future.result(TIMEOUT)
+
+        connection.deliver(topic, b'{"execution": {"jobId": "ota-1", "status": "QUEUED"}}')
+        connection.deliver(topic, b'not json')
+        self.assertEqual('ota-1', received[0].execution.job_id)
+        self.assertIsNone(received[1])
+
+    def test_cbor_switches_fleet_provisioning_topics(self):
+        try:
+            cbor = codec.CborCodec()
+        except ImportError:
+            self.skipTest("cbor2 not installed")
+        connection = FakeConnection()
+        client = iotidentity.IotIdentityClient(connection, codec=cbor)
+
+        future, topic = client.subscribe_to_register_thing_accepted(
+            iotidentity.RegisterThingSubscriptionRequest(template_name='json'),
+            mqtt.QoS.AT_LEAST_ONCE,
+            lambda response: None)
+        # a template may be called "json", only the format segment changes
+        self.assertEqual('$aws/provisioning-templates/json/provision/cbor/accepted', topic)
+
+        client.publish_create_keys_and_certificate(
+            iotidentity.CreateKeysAndCertificateRequest(), mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        self.assertEqual('$aws/certificates/create/cbor', connection.published[0][0])
+
+        client.publish_register_thing(
+            iotidentity.RegisterThingRequest(template_name='pinot', parameters={'SerialNumber': '1001'}),
+            mqtt.QoS.AT_LEAST_ONCE).result(TIMEOUT)
+        topic, payload, _ = connection.published[1]
+        self.assertEqual('$aws/provisioning-templates/pinot/provision/cbor', topic)
+        self.assertEqual({'parameters': {'SerialNumber': '1001'}}, cbor.decode(payload))
+
+    def test_compact_codec_keeps_other_topics(self):
+        try:
+            msgpack = codec.MsgPackCodec()
+        except ImportError:
+            self.skipTest("msgpack not installed")
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection, codec=msgpack)
+        client.publish_get_shadow(iotshadow.GetShadowRequest(thing_name='json'), 0).result(TIMEOUT)
+        self.assertEqual('$aws/things/json/shadow/get', connection.published[0][0])
+
+    def test_subscribe_decodes_memoryview(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection)
+        received = []
+        future, topic = client.subscribe_to_shadow_delta_updated_events(
+            iotshadow.ShadowDeltaUpdatedSubscriptionRequest(thing_name='meter'),
+            mqtt.QoS.AT_LEAST_ONCE,
+            received.append)
+        future.result(TIMEOUT)
+
+        connection.deliver(topic, memoryview(b'{"state": {"valve": "closed"}, "version": 7}'))
+        self.assertEqual({'valve': 'closed'}, received[0].state)
+        self.assertEqual(7, received[0].version)
+
+    def test_subscribe_raw(self):
+        try:
+            cbor = codec.CborCodec()
+        except ImportError:
+            cbor = None
+        connection = FakeConnection()
+        client = iotidentity.IotIdentityClient(connection, codec=cbor)
+        received = []
+        future, topic = client.subscribe_raw('$aws/certificates/create/json/accepted', 1,
+                                             lambda *args: received.append(args))
+        self.assertEqual(mqtt.QoS.AT_LEAST_ONCE, future.result(TIMEOUT))
+        # the topic is never rewritten for the codec
+        self.assertEqual('$aws/certificates/create/json/accepted', topic)
+
+        payload = b'\xff not decodable'
+        connection.deliver(topic, payload)
+        self.assertEqual([(topic, payload)], received)
+        self.assertIs(payload, received[0][1])
+
+        client.unsubscribe(topic).result(TIMEOUT)
+        self.assertEqual({}, connection.subscriptions)
+
+
+class ServiceClientExecutorTest(TestCase):
+
+    def _subscribe(self, client, thing_name, callback):
+        future, topic = client.subscribe_to_shadow_delta_updated_events(
+            iotshadow.ShadowDeltaUpdatedSubscriptionRequest(thing_name=thing_name),
+            mqtt.QoS.AT_LEAST_ONCE,
+            callback)
+        future.result(TIMEOUT)
+        return topic
+
+    def test_callbacks_run_in_executor_in_order(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection, executor=ThreadPoolExecutor(max_workers=4))
+        received = []
+        threads = set()
+        done = threading.Event()
+
+        def on_delta(event):
+            threads.add(threading.current_thread())
+            received.append(event.version)
+            if event.version == 99:
+                done.set()
+
+        topic = self._subscribe(client, 'meter', on_delta)
+        for i in range(100):
+            connection.deliver(topic, '{{"state": {{}}, "version": {}}}'.format(i).encode())
+        self.assertTrue(done.wait(TIMEOUT))
+        client.shutdown()
+
+        self.assertEqual(list(range(100)), received)
+        self.assertNotIn(threading.current_thread(), threads)
+        stats = client.subscription_stats[topic]
+        self.assertEqual((100, 100, 0, 0), (stats.received, stats.delivered, stats.dropped, stats.pending))
+
+    def _blocked_client(self, drop_policy):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(
+            connection, executor=ThreadPoolExecutor(max_workers=2), max_pending=2, drop_policy=drop_policy)
+        release = threading.Event()
+        started = threading.Event()
+        received = []
+
+        def on_delta(event):
+            started.set()
+            release.wait(TIMEOUT)
+            received.append(event.version)
+
+        topic = self._subscribe(client, 'meter', on_delta)
+        connection.deliver(topic, b'{"version": 0}')
+        self.assertTrue(started.wait(TIMEOUT))
+        for i in range(1, 5):
+            connection.deliver(topic, '{{"version": {}}}'.format(i).encode())
+
+        stats = client.subscription_stats[topic]
+        self.assertEqual((5, 2, 2, 2), (stats.received, stats.dropped, stats.pending, stats.max_pending))
+        release.set()
+        client.shutdown()
+        return received
+
+    def test_drop_oldest(self):
+        self.assertEqual([0, 3, 4], self._blocked_client('drop_oldest'))
+
+    def test_drop_newest(self):
+        self.assertEqual([0, 1, 2], self._blocked_client('drop_newest'))
+
+    def test_slow_subscription_does_not_block_others(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection, executor=True)
+        release = threading.Event()
+        fast = threading.Event()
+
+        slow_topic = self._subscribe(client, 'slow', lambda event: release.wait(TIMEOUT))
+        fast_topic = self._subscribe(client, 'fast', lambda event: fast.set())
+        connection.deliver(slow_topic, b'{"version": 1}')
+        connection.deliver(fast_topic, b'{"version": 1}')
+        self.assertTrue(fast.wait(TIMEOUT))
+        release.set()
+        client.shutdown()
+
+    def test_unsubscribe_forgets_stats(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection, executor=True)
+        topic = self._subscribe(client, 'meter', lambda event: None)
+        self.assertIn(topic, client.subscription_stats)
+        client.unsubscribe(topic).result(TIMEOUT)
+        self.assertEqual({}, client.subscription_stats)
+        client.shutdown()
+
+    def test_messages_after_shutdown_are_dropped(self):
+        connection = FakeConnection()
+        client = iotshadow.IotShadowClient(connection, executor=True)
+        received = []
+        topic = self._subscribe(client, 'meter', received.append)
+        client.shutdown()
+        connection.deliver(topic, b'{"version": 1}')
+        self.assertEqual([], received)
+        self.assertEqual(1, client.subscription_stats[topic].dropped)
+
+    def test_executor_failure_is_not_raised_into_networking_thread(self):
+        connection = FakeConnection()
+        executor = ThreadPoolExecutor(max_workers=1)
+        client = iotshadow.IotShadowClient(connection, executor=executor)
+        received = []
+        topic = self._subscribe(client, 'meter', received.append)
+        # shut down behind the client's back
+        executor.shutdown()
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            connection.deliver(topic, b'{"version": 1}')
+        self.assertIn('RuntimeError', stderr.getvalue())
+        self.assertEqual([], received)
+        self.assertEqual(1, client.subscription_stats[topic].dropped)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            iotshadow.IotShadowClient(FakeConnection(), max_pending=0)
+        with self.assertRaises(ValueError):
+            iotshadow.IotShadowClient(FakeConnection(), drop_policy='block')
@@ -0,0 +1,137 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+from unittest import TestCase
+
+from awsiot import iotshadow
+from awsiot.shadow_cache import ShadowCache, merge_state, state_delta
+from awsiot.shadow_requests import ShadowRequestClient
+from test.test_service_client import FakeConnection
+
+TIMEOUT = 10.0  # seconds
+
+CLASSIC_FILTER = '$aws/things/meter/shadow/+/+'
+SHADOW_TOPIC = '$aws/things/meter/shadow/'
+
+
+class StateTest(TestCase):
+
+    def test_merge_state(self):
+        state = {'valve': 'open', 'config': {'interval': 60, 'unit': 'L'}, 'old': 1}
+        merged = merge_state(state, {'config': {'interval': 30}, 'old': None, 'new': [1, 2]})
+        self.assertEqual({'valve': 'open', 'config': {'interval': 30, 'unit': 'L'}, 'new': [1, 2]}, merged)
+        self.assertEqual(60, state['config']['interval'])
+
+    def test_state_delta(self):
+        desired = {'valve': 'closed', 'config': {'interval': 30, 'unit': 'L'}, 'mode': 'eco'}
+        reported = {'valve': 'open', 'config': {'interval': 30, 'unit': 'L'}, 'mode': 'eco'}
+        self.assertEqual({'valve': 'closed'}, state_delta(desired, reported))
+        self.assertEqual({'config': {'unit': 'L'}}, state_delta({'config': {'unit': 'L'}}, {'config': {}}))
+
+
+class ShadowCacheTest(TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.requests = ShadowRequestClient(iotshadow.IotShadowClient(self.connection))
+        self.changes = []
+        self.cache = ShadowCache(self.requests, 'meter', on_change=lambda cache: self.changes.append(cache.version))
+
+    def tearDown(self):
+        self.cache.close()
+        self.requests.close()
+
+    def _deliver(self, topic, payload):
+        self.connection.deliver(SHADOW_TOPIC + topic, json.dumps(payload).encode(), CLASSIC_FILTER)
+
+    def _respond_to_get(self, index, version, desired, reported):
+        topic, payload, _ = self.connection.published[index]
+        self.assertEqual(SHADOW_TOPIC + 'get', topic)
+        self._deliver('get/accepted', {
+            'state': {'desired': desired, 'reported': reported},
+            'version': version,
+            'clientToken': json.loads(payload)['clientToken'],
+        })
+
+    def _documents(self, version, desired, reported):
+        self._deliver('update/documents', {
+            'previous': {'state': {}, 'version': version - 1},
+            'current': {'state': {'desired': desired, 'reported': reported}, 'version': version},
+        })
+
+    def test_seed_and_documents(self):
+        started = self.cache.start()
+        self.assertIsNone(self.cache.version)
+        self._respond_to_get(0, 5, {'interval': 60}, {'interval': 30})
+        started.result(TIMEOUT)
+        self.assertTrue(self.cache.wait_synced(0))
+        self.assertEqual((5, {'interval': 60}, {'interval': 30}, {'interval': 60}),
+                         (self.cache.version, self.cache.desired, self.cache.reported, self.cache.delta))
+
+        self._documents(6, {'interval': 60}, {'interval': 60})
+        self.assertEqual(6, self.cache.version)
+        self.assertEqual({}, self.cache.delta)
+
+        # stale events are ignored
+        self._documents(4, {'interval': 1}, {})
+        self.assertEqual({'interval': 60}, self.cache.desired)
+        self.assertEqual([5, 6], self.changes)
+        self.assertEqual(1, len(self.connection.published))
+
+    def test_delta(self):
+        self.cache.start()
+        self._respond_to_get(0, 5, {'config': {'interval': 60, 'unit': 'L'}}, {})
+        desired = self.cache.desired
+
+        self._deliver('update/delta', {'state': {'config': {'interval': 30}}, 'version': 6})
+        self.assertEqual(6, self.cache.version)
+        self.assertEqual({'config': {'interval': 30, 'unit': 'L'}}, self.cache.desired)
+        # snapshots handed out before aren't modified
+        self.assertEqual({'config': {'interval': 60, 'unit': 'L'}}, desired)
+
+        # the documents event of the same update still applies
+        self._documents(6, {'config': {'interval': 30, 'unit': 'L'}}, {'config': {'unit': 'L'}})
+        self.assertEqual({'config': {'interval': 30}}, self.cache.delta)
+
+    def test_version_gap_resyncs(self):
+        self.cache.start()
+        self._respond_to_get(0, 5, {'interval': 60}, {})
+
+        self._deliver('update/delta', {'state': {'interval': 10}, 'version': 8})
+        self.assertEqual(1, self.cache.resyncs)
+        self.assertEqual(5, self.cache.version)
+        self.assertEqual(2, len(self.connection.published))
+
+        # events arriving during the resync are applied after it
+        self._deliver('update/delta', {'state': {'interval': 5}, 'version': 9})
+        self._respond_to_get(1, 8, {'interval': 10}, {})
+        self.assertEqual(9, self.cache.version)
+        self.assertEqual({'interval': 5}, self.cache.desired)
+        self.assertEqual(1, self.cache.resyncs)
+
+    def test_missing_shadow_and_delete(self):
+        self.cache.start()
+        _, payload, _ = self.connection.published[0]
+        self._deliver('get/rejected', {'code': 404, 'message': 'No shadow exists',
+                                       'clientToken': json.loads(payload)['clientToken']})
+        self.assertTrue(self.cache.wait_synced(0))
+        self.assertEqual(0, self.cache.version)
+
+        self._documents(1, {'interval': 60}, {})
+        self.assertEqual({'interval': 60}, self.cache.desired)
+        self._deliver('delete/accepted', {'version': 1})
+        self.assertEqual((0, {}), (self.cache.version, self.cache.desired))
+
+    def test_failed_seed_is_retried(self):
+        started = self.cache.start()
+        _, payload, _ = self.connection.published[0]
+        self._deliver('get/rejected', {'code': 500, 'message': 'Internal',
+                                       'clientToken': json.loads(payload)['clientToken']})
+        with self.assertRaises(Exception):
+            started.result(TIMEOUT)
+
+        self._documents(3, {'interval': 60}, {})
+        self.assertIsNone(self.cache.version)
+        self._respond_to_get(1, 3, {'interval': 60}, {})
+        self.assertEqual(3, self.cache.version)
@@ -0,0 +1,144 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+from awscrt import mqtt
+from concurrent.futures import Future, TimeoutError
+import json
+from unittest import TestCase
+
+from awsiot import iotshadow
+from awsiot.shadow_requests import ShadowRequestClient, ShadowRequestError
+from test.test_service_client import FakeConnection
+
+TIMEOUT = 10.0  # seconds
+
+CLASSIC_FILTER = '$aws/things/meter/shadow/+/+'
+
+
+class ShadowRequestClientTest(TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.shadows = ShadowRequestClient(iotshadow.IotShadowClient(self.connection))
+
+    def tearDown(self):
+        self.shadows.close()
+
+    def _respond(self, topic, payload, subscription=CLASSIC_FILTER):
+        self.connection.deliver(topic, json.dumps(payload).encode(), subscription)
+
+    def _published(self, index):
+        topic, payload, _ = self.connection.published[index]
+        return topic, json.loads(payload)
+
+    def test_get_shadow(self):
+        future = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+        self.assertEqual([CLASSIC_FILTER], list(self.connection.subscriptions))
+        topic, payload = self._published(0)
+        self.assertEqual('$aws/things/meter/shadow/get', topic)
+
+        self._respond('$aws/things/meter/shadow/get/accepted', {
+            'state': {'reported': {'valve': 'open'}},
+            'version': 3,
+            'clientToken': payload['clientToken'],
+        })
+        response = future.result(TIMEOUT)
+        self.assertIsInstance(response, iotshadow.GetShadowResponse)
+        self.assertEqual({'valve': 'open'}, response.state.reported)
+        self.assertEqual(3, response.version)
+
+    def test_requests_share_subscription_and_match_by_token(self):
+        first = self.shadows.update_shadow(iotshadow.UpdateShadowRequest(
+            thing_name='meter', state=iotshadow.ShadowState(reported={'n': 1})))
+        second = self.shadows.update_shadow(iotshadow.UpdateShadowRequest(
+            thing_name='meter', state=iotshadow.ShadowState(reported={'n': 2}), client_token='mine'))
+        self.assertEqual(1, len(self.connection.subscriptions))
+        self.assertEqual('mine', self._published(1)[1]['clientToken'])
+
+        # responses in reverse order, plus noise that matches nothing
+        self._respond('$aws/things/meter/shadow/update/accepted', {'version': 5, 'clientToken': 'mine'})
+        self._respond('$aws/things/meter/shadow/update/accepted', {'version': 9, 'clientToken': 'other'})
+        self._respond('$aws/things/meter/shadow/update/delta', {'state': {'n': 3}, 'version': 5})
+        self.assertFalse(first.done())
+        self._respond('$aws/things/meter/shadow/update/accepted', {
+            'version': 4, 'clientToken': self._published(0)[1]['clientToken']})
+
+        self.assertEqual(4, first.result(TIMEOUT).version)
+        self.assertEqual(5, second.result(TIMEOUT).version)
+
+    def test_rejected(self):
+        future = self.shadows.delete_shadow(iotshadow.DeleteShadowRequest(thing_name='meter', client_token='t'))
+        self._respond('$aws/things/meter/shadow/delete/rejected',
+                      {'code': 404, 'message': 'No shadow exists', 'clientToken': 't'})
+        with self.assertRaises(ShadowRequestError) as context:
+            future.result(TIMEOUT)
+        self.assertEqual(404, context.exception.error_response.code)
+
+    def test_response_to_other_operation_is_ignored(self):
+        future = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter', client_token='t'))
+        self._respond('$aws/things/meter/shadow/update/accepted', {'version': 1, 'clientToken': 't'})
+        self.assertFalse(future.done())
+
+    def test_timeout(self):
+        future = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter', client_token='t'), timeout=0.05)
+        slow = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+        with self.assertRaises(TimeoutError):
+            future.result(TIMEOUT)
+        self.assertFalse(slow.done())
+
+        # a late response is dropped and the token can be reused
+        self._respond('$aws/things/meter/shadow/get/accepted', {'version': 1, 'clientToken': 't'})
+        again = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter', client_token='t'))
+        self._respond('$aws/things/meter/shadow/get/accepted', {'version': 2, 'clientToken': 't'})
+        self.assertEqual(2, again.result(TIMEOUT).version)
+
+    def test_named_shadow(self):
+        future = self.shadows.get_shadow(iotshadow.GetNamedShadowRequest(
+            thing_name='meter', shadow_name='valve', client_token='t'))
+        named_filter = '$aws/things/meter/shadow/name/+/+/+'
+        self.assertIn(named_filter, self.connection.subscriptions)
+        self.assertEqual('$aws/things/meter/shadow/name/valve/get', self._published(0)[0])
+        self._respond('$aws/things/meter/shadow/name/valve/get/accepted',
+                      {'version': 7, 'clientToken': 't'}, named_filter)
+        self.assertEqual(7, future.result(TIMEOUT).version)
+
+    def test_per_connection(self):
+        shadows = ShadowRequestClient(iotshadow.IotShadowClient(self.connection), per_connection=True)
+        shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='a'))
+        shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='b'))
+        self.assertEqual(['$aws/things/+/shadow/+/+'], list(self.connection.subscriptions))
+        shadows.close()
+
+    def test_failed_subscribe_is_retried(self):
+        connection = self.connection
+        subscribe = connection.subscribe
+
+        def failing_subscribe(topic, qos, callback=None):
+            future = Future()
+            future.set_exception(RuntimeError('not connected'))
+            return future, 1
+
+        connection.subscribe = failing_subscribe
+        future = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+        with self.assertRaises(RuntimeError):
+            future.result(TIMEOUT)
+        self.assertEqual([], connection.published)
+
+        connection.subscribe = subscribe
+        self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+        self.assertEqual(1, len(connection.published))
+
+    def test_close(self):
+        future = self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+        self.shadows.close()
+        with self.assertRaises(RuntimeError):
+            future.result(TIMEOUT)
+        self.assertEqual({}, self.connection.subscriptions)
+        with self.assertRaises(RuntimeError):
+            self.shadows.get_shadow(iotshadow.GetShadowRequest(thing_name='meter'))
+
+    def test_invalid_requests(self):
+        with self.assertRaises(TypeError):
+            self.shadows.request(iotshadow.ShadowState())
+        with self.assertRaises(ValueError):
+            self.shadows.get_shadow(iotshadow.GetNamedShadowRequest(thing_name='meter'))
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0.
+
+import json
+from unittest import TestCase
+
+from awsiot import iotshadow
+from awsiot.shadow_requests import ShadowRequestClient
+from awsiot.shadow_updates import ReportedStateCoalescer
+from test.test_service_client import FakeConnection
+
+TIMEOUT = 10.0  # seconds
+
+
+class ReportedStateCoalescerTest(TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.shadow_client = iotshadow.IotShadowClient(self.connection)
+
+    def _published(self):
+        return [(topic, json.loads(payload)) for topic, payload, _ in self.connection.published]
+
+    def test_merges_patches_in_window(self):
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', window=3600)
+        futures = [
+            reporter.report({'flowrate': 1.5, 'config': {'unit': 'L'}}),
+            reporter.report({'flowrate': 1.7, 'config': {'interval': 60}}),
+            reporter.report({'valve': 'open'}),
+        ]
+        self.assertEqual([], self.connection.published)
+        reporter.flush()
+
+        self.assertEqual([('$aws/things/meter/shadow/update', {'state': {'reported': {
+            'flowrate': 1.7, 'config': {'unit': 'L', 'interval': 60}, 'valve': 'open'}}})],
+            self._published())
+        for future in futures:
+            self.assertIsNone(future.result(TIMEOUT))
+        self.assertEqual((1, 2), (reporter.sent, reporter.saved))
+
+    def test_drops_unchanged_values(self):
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', shadow_name='flow', window=3600,
+                                          reported={'valve': 'open', 'old': 1})
+        reporter.report({'flowrate': 1.5, 'valve': 'open', 'missing': None})
+        reporter.flush()
+        reporter.report({'flowrate': 1.5, 'old': None})
+        reporter.flush()
+        no_op = reporter.report({'flowrate': 1.5})
+        reporter.flush()
+
+        self.assertEqual([
+            ('$aws/things/meter/shadow/name/flow/update', {'state': {'reported': {'flowrate': 1.5}}}),
+            ('$aws/things/meter/shadow/name/flow/update', {'state': {'reported': {'old': None}}}),
+        ], self._published())
+        self.assertIsNone(no_op.result(TIMEOUT))
+        self.assertEqual({'valve': 'open', 'flowrate': 1.5}, reporter.reported)
+        self.assertEqual((2, 1), (reporter.sent, reporter.saved))
+
+    def test_window_timer(self):
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', window=0.01)
+        reporter.report({'flowrate': 1.5})
+        reporter.report({'flowrate': 2.0}).result(TIMEOUT)
+        self.assertEqual([{'state': {'reported': {'flowrate': 2.0}}}], [p for _, p in self._published()])
+
+    def test_waits_for_accepted(self):
+        requests = ShadowRequestClient(self.shadow_client)
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', window=3600, requests=requests)
+        future = reporter.report({'flowrate': 1.5})
+        reporter.flush()
+        self.assertEqual({}, reporter.reported)
+
+        token = self._published()[0][1]['clientToken']
+        self.connection.deliver('$aws/things/meter/shadow/update/accepted',
+                                json.dumps({'version': 2, 'clientToken': token}).encode(),
+                                '$aws/things/meter/shadow/+/+')
+        self.assertEqual(2, future.result(TIMEOUT).version)
+        self.assertEqual({'flowrate': 1.5}, reporter.reported)
+        requests.close()
+
+    def test_drops_values_of_updates_in_flight(self):
+        requests = ShadowRequestClient(self.shadow_client)
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', window=3600, requests=requests)
+        first = reporter.report({'flowrate': 1.5})
+        reporter.flush()
+        same = reporter.report({'flowrate': 1.5})
+        reporter.flush()
+        changed = reporter.report({'flowrate': 1.5, 'valve': 'open'})
+        reporter.flush()
+
+        self.assertEqual([{'flowrate': 1.5}, {'valve': 'open'}],
+                         [payload['state']['reported'] for _, payload in self._published()])
+        self.assertFalse(same.done())
+        for _, payload in self._published():
+            self.connection.deliver('$aws/things/meter/shadow/update/accepted',
+                                    json.dumps({'version': 2, 'clientToken': payload['clientToken']}).encode(),
+                                    '$aws/things/meter/shadow/+/+')
+        self.assertEqual(2, first.result(TIMEOUT).version)
+        self.assertIsNone(same.result(TIMEOUT))
+        self.assertEqual(2, changed.result(TIMEOUT).version)
+        self.assertEqual({'flowrate': 1.5, 'valve': 'open'}, reporter.reported)
+        requests.close()
+
+    def test_patch_is_copied(self):
+        reporter = ReportedStateCoalescer(self.shadow_client, 'meter', window=3600)
+        patch = {'config': {'unit': 'L'}}
+        reporter.report(patch)
+        patch['config']['unit'] = 'gal'
+        reporter.flush()
+        self.assertEqual({'config': {'unit': 'L'}}, reporter.reported)